@@ -4,10 +4,14 @@ from .models import (
     Country,
     City,
     Flight,
-    FlightEvent
+    FlightEvent,
+    Schedule,
+    Connection,
 )
 
 admin.site.register(Country)
 admin.site.register(City)
 admin.site.register(Flight)
 admin.site.register(FlightEvent)
+admin.site.register(Schedule)
+admin.site.register(Connection)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class JourneysConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.journeys'
+
+    def ready(self):
+        from apps.journeys import checks, signals  # noqa: F401
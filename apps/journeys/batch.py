@@ -0,0 +1,159 @@
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from apps.journeys.cache import cached_searches
+from apps.journeys.connections import schedules_in
+from apps.journeys.graph import MAX_JOURNEY_DURATION, FlightGraph, check_timetable, get_flight_graph
+from apps.journeys.models import FlightEvent
+from apps.journeys.parallel import parallel_searches
+from apps.journeys.registry import get_city_registry
+from apps.journeys.renderers import dumps
+from apps.journeys.utils import (
+    RESULT_OPTIONS,
+    TIME_FILTERS,
+    Search,
+    find_journeys,
+    normalize_search,
+    search_graph,
+    search_key_parts,
+)
+from apps.journeys.validators import (
+    validate_city,
+    validate_date_format,
+    validate_max_connections,
+    validate_max_wait_time_hours,
+    validate_search_options,
+)
+
+
+def normalize_query(query, registry) -> Dict:
+    """
+        Validates a batch query against the city registry, and returns it normalized.
+    """
+    if not isinstance(query, dict):
+        raise ValidationError('Invalid query. Should be an object.')
+    date = query.get('date')
+    from_city = query.get('from')
+    to_city = query.get('to')
+    if not (isinstance(date, str) and isinstance(from_city, str) and isinstance(to_city, str)):
+        raise ValidationError('Invalid query. "date", "from" and "to" are required.')
+    max_wait_time_hours = query.get('max_wait_time_hours', 4)
+    max_connections = query.get('max_connections', 2)
+    options = {name: query[name] for name in TIME_FILTERS + RESULT_OPTIONS if name in query}
+
+    validate_date_format(date)
+    validate_city(from_city, registry)
+    validate_city(to_city, registry)
+    validate_max_wait_time_hours(max_wait_time_hours)
+    validate_max_connections(max_connections)
+    validate_search_options(options)
+    if 'limit' in options:
+        options['limit'] = int(options['limit'])
+    return {
+        'date': date,
+        'from': from_city.upper(),
+        'to': to_city.upper(),
+        'max_wait_time_hours': int(max_wait_time_hours),
+        'max_connections': int(max_connections),
+        **options,
+    }
+
+
+def get_working_set(searches: List[Search]) -> FlightGraph:
+    """
+        Loads, with a single query, every flight event the given searches can use: the ones departing
+            in their departure window or up to 24 hours after it (journeys end within 24 hours of the
+            first departure). The windows are the normalized ones, e.g. arrival-anchored searches
+            start the day before.
+        Like the connections engine it stands in for, it doesn't expand schedules.
+    """
+    windows = sorted({(search.start_date, search.end_date) for search in searches})
+    merged = []
+    for start, end in windows:
+        end += timedelta(seconds=MAX_JOURNEY_DURATION)
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    ranges = reduce(or_, (Q(departure_time__gte=start, departure_time__lt=end) for start, end in merged))
+    return FlightGraph.from_queryset(FlightEvent.objects.filter(ranges), schedules=False)
+
+
+def search_many(searches: List[Search]) -> List[bytes]:
+    """
+        Runs the searches on the process-wide graph (rendered as JSON), across the worker processes
+            if there are enough of them (see `parallel.parallel_searches`).
+    """
+    results = parallel_searches(get_flight_graph(), searches)
+    if results is None:
+        results = [find_journeys(search, rendered=True) for search in searches]
+    return results
+
+
+def search_batch(queries: List) -> bytes:
+    """
+        Runs several searches at once, and returns their results rendered as JSON.
+        ---
+        Parameters:
+            - queries: List of {"date", "from", "to", "max_wait_time_hours", "max_connections", "depart_after",
+                "depart_before", "arrive_by", "sort", "limit"} queries (see `JourneyAPIView`)
+
+        Returns:
+            A JSON list with one item per query, in the same order: {"query", "journeys"} with the
+                normalized query and its journeys (as returned by the search endpoint), or
+                {"query", "error"} with the query as received.
+
+        The cities are validated against the city registry (no queries). With the in-memory graph,
+        every search runs on the process-wide timetable (and its cache), the ones missing from the cache
+        in parallel with `JOURNEYS_PARALLEL_WORKERS`. Otherwise the flight events of all the searches
+        are fetched with a single query, and searched in memory (on the graph too if any schedule is valid
+        in their windows, as the connections table doesn't include them).
+    """
+    registry = get_city_registry()
+    normalized = []
+    for query in queries:
+        try:
+            normalized.append(normalize_query(query, registry))
+        except ValidationError as e:
+            normalized.append(e)
+    valid_queries = [query for query in normalized if not isinstance(query, ValidationError)]
+    searches = [
+        normalize_search(
+            query['date'],
+            query['from'],
+            query['to'],
+            query['max_wait_time_hours'],
+            query['max_connections'],
+            **{name: query[name] for name in TIME_FILTERS + RESULT_OPTIONS if name in query},
+        )
+        for query in valid_queries
+    ]
+
+    check_timetable()
+    if settings.JOURNEYS_SEARCH_ENGINE == 'graph' or (
+        searches and schedules_in(
+            min(search.start_date for search in searches), max(search.end_date for search in searches)
+        ).exists()
+    ):
+        journeys = cached_searches(
+            [(search.day, search_key_parts(search, True)) for search in searches],
+            lambda indexes: search_many([searches[index] for index in indexes]),
+        )
+    else:
+        working_set = get_working_set(searches) if searches else None
+        journeys = [search_graph(working_set, search, rendered=True) for search in searches]
+
+    journeys = iter(journeys)
+    results = []
+    for query, normalized_query in zip(queries, normalized):
+        if isinstance(normalized_query, ValidationError):
+            results.append(dumps({'query': query, 'error': normalized_query.message}))
+            continue
+        results.append(b'{"query":%s,"journeys":%s}' % (dumps(normalized_query), next(journeys)))
+    return b'[%s]' % b','.join(results)
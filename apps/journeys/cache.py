@@ -0,0 +1,159 @@
+import random
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.journeys.coalescing import acoalesce, coalesce
+
+# Scope of the version bumped when a city or a flight changes (it affects every search).
+GLOBAL_SCOPE = 'global'
+
+
+def get_cache():
+    return caches[settings.JOURNEYS_CACHE_ALIAS]
+
+
+def date_scope(day: date) -> str:
+    return f'date:{day.isoformat()}'
+
+
+def search_scopes(day: date, last_day: Optional[date] = None) -> List[str]:
+    """
+        Versions a search departing on `day` (or from `day` to `last_day`) depends on: flights and cities,
+            and the events departing on those days or the next one (connections can't start later than
+            24 hours after the first flight).
+    """
+    days = ((last_day or day) - day).days + 2
+    return [GLOBAL_SCOPE, *(date_scope(day + timedelta(days=offset)) for offset in range(days))]
+
+
+def new_version() -> int:
+    # Random instead of incremental, so a version evicted from the cache can't be reused by mistake.
+    return random.getrandbits(62)
+
+
+def version_key(scope: str) -> str:
+    return f'journeys:version:{scope}'
+
+
+def get_versions(scopes: Iterable[str]) -> List[int]:
+    """
+        Returns the current version of each scope, creating the missing ones.
+    """
+    cache = get_cache()
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        # `add` keeps the version created by another process in the meantime, if any.
+        version = new_version()
+        cache.add(key, version, timeout=None)
+        versions[key] = cache.get(key, version)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(scopes: Iterable[str]) -> List[int]:
+    """
+        Async version of `get_versions`.
+    """
+    cache = get_cache()
+    keys = [version_key(scope) for scope in scopes]
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        version = new_version()
+        await cache.aadd(key, version, timeout=None)
+        versions[key] = await cache.aget(key, version)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(scopes: Iterable[str]):
+    """
+        Invalidates the cached searches depending on the given scopes.
+    """
+    get_cache().set_many({version_key(scope): new_version() for scope in scopes}, timeout=None)
+
+
+def search_key(parts: Iterable[Any], versions: Iterable[int]) -> str:
+    return 'journeys:search:' + ':'.join(str(part) for part in [*parts, *versions])
+
+
+def cached_search(
+    day: date, parts: Iterable[Any], search: Callable[[], Any], last_day: Optional[date] = None
+) -> Any:
+    """
+        Returns the cached result of the search identified by `parts` (normalized parameters)
+            departing on `day` (or from `day` to `last_day`), running `search` on a miss.
+        The key embeds the versions the search depends on, so entries of a changed day are never
+            read again and end up evicted (LRU/TTL) by the cache backend.
+        With `JOURNEYS_COALESCING`, concurrent misses of the same search run it once and share
+            its result (see `coalescing.coalesce`).
+    """
+    timeout = settings.JOURNEYS_CACHE_TIMEOUT
+    coalescing = settings.JOURNEYS_COALESCING
+    if not (timeout or coalescing):
+        return search()
+
+    key = search_key(parts, get_versions(search_scopes(day, last_day)))
+    if not timeout:
+        return coalesce(key, search)
+
+    cache = get_cache()
+    result = cache.get(key)
+    if result is None:
+        def search_and_cache():
+            result = search()
+            cache.set(key, result, timeout=timeout)
+            return result
+
+        result = coalesce(key, search_and_cache) if coalescing else search_and_cache()
+    return result
+
+
+def cached_searches(
+    searches: List[Tuple[date, Iterable[Any]]], search_many: Callable[[List[int]], List[Any]]
+) -> List[Any]:
+    """
+        Batch version of `cached_search`, sharing its entries: returns the results of the searches given
+            as (day, parts), running `search_many` once with the indexes of the missing ones.
+    """
+    timeout = settings.JOURNEYS_CACHE_TIMEOUT
+    if not timeout:
+        return search_many(list(range(len(searches))))
+
+    cache = get_cache()
+    keys = [search_key(parts, get_versions(search_scopes(day))) for day, parts in searches]
+    results = cache.get_many(keys)
+    missing = [index for index, key in enumerate(keys) if key not in results]
+    if missing:
+        found = dict(zip((keys[index] for index in missing), search_many(missing)))
+        cache.set_many(found, timeout=timeout)
+        results.update(found)
+    return [results[key] for key in keys]
+
+
+async def acached_search(day: date, parts: Iterable[Any], search: Callable[[], Awaitable[Any]]) -> Any:
+    """
+        Async version of `cached_search`, sharing its entries (searches are coalesced per event loop).
+    """
+    timeout = settings.JOURNEYS_CACHE_TIMEOUT
+    coalescing = settings.JOURNEYS_COALESCING
+    if not (timeout or coalescing):
+        return await search()
+
+    key = search_key(parts, await aget_versions(search_scopes(day)))
+    if not timeout:
+        return await acoalesce(key, search)
+
+    cache = get_cache()
+    result = await cache.aget(key)
+    if result is None:
+        async def search_and_cache():
+            result = await search()
+            await cache.aset(key, result, timeout=timeout)
+            return result
+
+        result = await (acoalesce(key, search_and_cache) if coalescing else search_and_cache())
+    return result
@@ -0,0 +1,142 @@
+from datetime import date as Date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.journeys import connections
+from apps.journeys.cache import cached_search
+from apps.journeys.graph import MAX_JOURNEY_DURATION, check_timetable, get_flight_graph
+from apps.journeys.instrumentation import record_results, stage
+from apps.journeys.models import FlightEvent
+from apps.journeys.parallel import parallel_calendar
+from apps.journeys.utils import get_day_range, parse_journey
+
+
+def get_calendar(
+    date: str,
+    from_city: str,
+    to_city: str,
+    window: int = 3,
+    max_wait_time_hours: int = 4,
+    max_connections: int = 2,
+) -> List[Dict]:
+    """
+        Summarizes, for every day from `window` days before to `window` days after the given date,
+            the journeys connecting an origin with a destination departing on that day.
+        ---
+        Parameters:
+            - date: Central date in 'YYYY-MM-DD' format
+            - from_city: Origin city code (3 letters)
+            - to_city: Destination city code (3 letters)
+            - window: Number of days before and after the date (3 by default)
+            - max_wait_time_hours: Max. connection time allowed between flights
+            - max_connections: Max. number of flights per journey (2 by default)
+
+        Returns:
+            A list with one item per day, in order:
+            {
+                "date": str,
+                "journeys": int,
+                "duration_minutes": int or null,
+                "shortest": journey or null (in the format returned by `parse_journey`)
+            }
+
+        The days are searched at once, over their whole departure window: a single sweep of the
+        in-memory graph, or a single pair of queries with the connections engine. Each day gets
+        the same journeys as searching it alone.
+    """
+    day = get_day_range(date)[0].date()
+    first_day = day - timedelta(days=int(window))
+    days = [first_day + timedelta(days=offset) for offset in range(2 * int(window) + 1)]
+    # Start of each day and end of the last one (days don't always last 24 hours in local time).
+    boundaries = [get_day_range(other_day.isoformat())[0] for other_day in days]
+    boundaries.append(get_day_range(days[-1].isoformat())[1])
+    from_city = from_city.upper()
+    to_city = to_city.upper()
+    max_wait_time = timedelta(hours=int(max_wait_time_hours))
+    max_legs = int(max_connections)
+
+    parts = ['calendar', first_day, days[-1], from_city, to_city, int(max_wait_time.total_seconds()), max_legs]
+    check_timetable()
+    return cached_search(
+        first_day,
+        parts,
+        lambda: find_calendar(days, boundaries, from_city, to_city, max_wait_time, max_legs),
+        last_day=days[-1],
+    )
+
+
+def find_calendar(
+    days: List[Date],
+    boundaries: List[datetime],
+    from_city: str,
+    to_city: str,
+    max_wait_time: timedelta,
+    max_legs: int,
+) -> List[Dict]:
+    """
+        Uncached search behind `get_calendar`, with normalized parameters.
+    """
+    if settings.JOURNEYS_SEARCH_ENGINE == 'connections' and max_legs == 2:
+        summary = calendar_from_connections(days, boundaries, from_city, to_city, max_wait_time)
+        shortest = [journey for _, journey in summary if journey]
+        durations = [journey[-1].arrival_time - journey[0].departure_time for journey in shortest]
+        with stage('parse'):
+            shortest = parse_journey(shortest)
+    else:
+        graph = get_flight_graph()
+        arguments = (
+            from_city,
+            to_city,
+            [int(boundary.timestamp()) for boundary in boundaries],
+            int(max_wait_time.total_seconds()),
+            max_legs,
+        )
+        with stage('pairing'):
+            summary = parallel_calendar(graph, *arguments)
+            if summary is None:
+                graph = graph.expand_schedules(arguments[2][0], arguments[2][-1] + MAX_JOURNEY_DURATION)
+                summary = graph.calendar(*arguments)
+        shortest = [journey for _, journey in summary if journey]
+        durations = [
+            timedelta(seconds=graph.arrival_times[journey[-1]] - graph.departure_times[journey[0]])
+            for journey in shortest
+        ]
+        with stage('parse'):
+            shortest = graph.parse(shortest)
+    record_results(sum(count for count, _ in summary))
+
+    shortest = iter(zip(shortest, durations))
+    calendar = []
+    for day, (count, journey) in zip(days, summary):
+        journey, duration = next(shortest) if journey else (None, None)
+        calendar.append({
+            'date': day.isoformat(),
+            'journeys': count,
+            'duration_minutes': None if duration is None else int(duration.total_seconds()) // 60,
+            'shortest': journey,
+        })
+    return calendar
+
+
+def calendar_from_connections(
+    days: List[Date],
+    boundaries: List[datetime],
+    from_city: str,
+    to_city: str,
+    max_wait_time: timedelta,
+) -> List[Tuple[int, Optional[List[FlightEvent]]]]:
+    """
+        Same summary as `FlightGraph.calendar`, from the direct flights and precomputed connections
+            departing in the whole window (fetched with one query each).
+    """
+    journeys = connections.find_journeys(boundaries[0], boundaries[-1], from_city, to_city, max_wait_time)
+    summary = {day: [0, None] for day in days}
+    for journey in journeys:
+        day = summary[timezone.localdate(journey[0].departure_time)]
+        day[0] += 1
+        key = (journey[-1].arrival_time - journey[0].departure_time, len(journey), [leg.id for leg in journey])
+        if day[1] is None or key < day[1][0]:
+            day[1] = (key, journey)
+    return [(count, shortest and shortest[1]) for count, shortest in summary.values()]
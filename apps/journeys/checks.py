@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Cache backends that aren't shared between processes.
+PROCESS_CACHES = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+
+
+def uses_process_cache() -> bool:
+    return settings.CACHES[settings.JOURNEYS_CACHE_ALIAS]['BACKEND'] in PROCESS_CACHES
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+        Warns when the cache isn't shared between processes, even with a single worker: the management
+            commands (e.g. `import_timetable`) run in processes of their own.
+        ---
+        The timetable and search versions are kept in the cache (see `graph.get_timetable_version`):
+        a process only sees the rows added or deleted by the other ones through the fingerprint of the
+        database (see `graph.check_timetable`), and never their changes to existing rows.
+    """
+    if uses_process_cache():
+        backend = settings.CACHES[settings.JOURNEYS_CACHE_ALIAS]['BACKEND']
+        return [
+            Warning(
+                f'The "{settings.JOURNEYS_CACHE_ALIAS}" cache ({backend}) is not shared between processes: '
+                f'the workers will not see the timetable changes made through the other ones or by the '
+                f'management commands, except for added or deleted rows (checked every '
+                f'{settings.JOURNEYS_TIMETABLE_CHECK_INTERVAL}s).',
+                hint='Set CACHE_BACKEND and CACHE_LOCATION to a shared cache, e.g. Redis.',
+                id='journeys.W001',
+            )
+        ]
+    return []
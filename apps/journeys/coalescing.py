@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class Call:
+    """
+        A search being run by a thread, that other threads wait for.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls: Dict[str, Call] = {}
+_futures: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+_counters = {'executed': 0, 'coalesced': 0}
+_lock = threading.Lock()
+
+
+def count(name: str):
+    with _lock:
+        _counters[name] += 1
+
+
+def get_counters() -> Dict[str, int]:
+    """
+        Returns the number of searches of this process that were executed, and the ones that got
+            the result of an identical search already running instead (coalesced).
+    """
+    with _lock:
+        return dict(_counters)
+
+
+def reset_counters():
+    with _lock:
+        for name in _counters:
+            _counters[name] = 0
+
+
+def coalesce(key: str, function: Callable[[], Any]) -> Any:
+    """
+        Returns `function()`, unless another thread is already running it for the same key: then waits
+            for it and returns the same result (or raises the same error).
+        ---
+        Only concurrent calls are coalesced: once the result is returned, the next call runs it again
+        (results are kept by the search cache, not here).
+    """
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = Call()
+        _counters['executed' if leader else 'coalesced'] += 1
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = function()
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _calls[key]
+        call.done.set()
+    return call.result
+
+
+async def acoalesce(key: str, function: Callable[[], Awaitable[Any]]) -> Any:
+    """
+        Async version of `coalesce`, for the calls of the same event loop.
+        ---
+        The waiting calls are shielded: cancelling one of them (e.g. a client disconnecting) doesn't
+        cancel the search. If the running call is cancelled instead, the first waiting one runs it.
+    """
+    loop = asyncio.get_running_loop()
+    future = _futures.get((loop, key))
+    if future is not None:
+        count('coalesced')
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            return await acoalesce(key, function)
+
+    future = _futures[loop, key] = loop.create_future()
+    count('executed')
+    try:
+        result = await function()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        # Retrieved, so it isn't logged as unhandled if no call was waiting for it.
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+    finally:
+        del _futures[loop, key]
+    return result
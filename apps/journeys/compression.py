@@ -0,0 +1,111 @@
+from typing import AsyncIterable, Iterable, Set
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Brotli quality for responses compressed on the fly (11, the max., is too slow for that).
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings(header: str) -> Set[str]:
+    """
+        Returns the content codings of an `Accept-Encoding` header, leaving out the ones with `q=0`.
+    """
+    encodings = set()
+    for item in header.split(','):
+        coding, *parameters = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            encodings.add(coding.lower())
+    return encodings
+
+
+def brotli_sequence(sequence: Iterable[bytes]) -> Iterable[bytes]:
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in sequence:
+        # Flushed chunk by chunk, so streamed lines reach the client as they are produced.
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def abrotli_sequence(sequence: AsyncIterable[bytes]) -> AsyncIterable[bytes]:
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    async for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def agzip_sequence(sequence: AsyncIterable[bytes]) -> AsyncIterable[bytes]:
+    async for chunk in sequence:
+        yield compress_string(chunk)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+        Compresses the responses of at least `JOURNEYS_COMPRESSION_MIN_SIZE` bytes (and the streamed ones)
+            with brotli, if it's installed and the client accepts it, or gzip.
+        ---
+        Like Django's `GZipMiddleware`, with a configurable threshold (smaller responses would barely
+        shrink, and cost CPU time on both ends) and brotli, which compresses JSON ~15-20% better.
+        Disabled with a threshold of 0.
+    """
+
+    def process_response(self, request, response):
+        min_size = settings.JOURNEYS_COMPRESSION_MIN_SIZE
+        if not min_size or response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        patch_vary_headers(response, ['Accept-Encoding'])
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in encodings:
+            encoding = 'br'
+        elif 'gzip' in encodings:
+            encoding = 'gzip'
+        else:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                compress = abrotli_sequence if encoding == 'br' else agzip_sequence
+            else:
+                compress = brotli_sequence if encoding == 'br' else compress_sequence
+            response.streaming_content = compress(response.streaming_content)
+            # The compressed size is only known once streamed.
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            else:
+                content = compress_string(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+
+        # The compressed representation isn't byte-identical anymore: strong ETags become weak
+        # (`If-None-Match` compares them weakly, so revalidation still works).
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
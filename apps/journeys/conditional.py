@@ -0,0 +1,56 @@
+from hashlib import blake2b
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from apps.journeys.cache import aget_versions, get_versions, search_scopes
+from apps.journeys.graph import acheck_timetable, check_timetable
+from apps.journeys.utils import Search, search_key_parts
+
+
+def make_etag(search: Search, media_type: str, versions: Iterable[int]) -> str:
+    key = ':'.join(str(part) for part in [media_type, *search_key_parts(search, True), *versions])
+    return '"%s"' % blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def get_search_etag(search: Search, media_type: str) -> str:
+    """
+        Returns the ETag of the response to a search: a hash of its normalized parameters, the media type
+            of the response and the versions of the timetable it depends on (see `cache.search_scopes`).
+        ---
+        Responses are rendered deterministically from the timetable, so the ETag is strong: it only
+        changes when a flight event of the search days, a flight or a city changes.
+    """
+    check_timetable()
+    return make_etag(search, media_type, get_versions(search_scopes(search.day)))
+
+
+async def aget_search_etag(search: Search, media_type: str) -> str:
+    """
+        Async version of `get_search_etag`.
+    """
+    await acheck_timetable()
+    return make_etag(search, media_type, await aget_versions(search_scopes(search.day)))
+
+
+def add_caching_headers(response: HttpResponse, etag: str) -> HttpResponse:
+    """
+        Adds the ETag of the response and lets shared caches (CDNs, proxies) keep it for
+            `JOURNEYS_HTTP_MAX_AGE` seconds, revalidating it with `If-None-Match` afterwards.
+    """
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.JOURNEYS_HTTP_MAX_AGE)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def not_modified(request, etag: str) -> Optional[HttpResponse]:
+    """
+        Returns a 304 response if the request's `If-None-Match` matches the ETag, None otherwise.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        add_caching_headers(response, etag)
+    return response
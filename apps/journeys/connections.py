@@ -0,0 +1,297 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.utils import timezone
+
+from apps.journeys.graph import MAX_JOURNEY_DURATION, FlightGraph
+from apps.journeys.instrumentation import stage
+from apps.journeys.models import Connection, FlightEvent, Schedule
+from apps.journeys.registry import CityRegistry, aget_city_registry, get_city_registry
+
+MAX_DURATION = timedelta(seconds=MAX_JOURNEY_DURATION)
+
+EVENT_RELATED_FIELDS = ['flight', 'departure_city', 'arrival_city']
+
+# Orderings of the direct flights and of the connections by each sort (see `FlightGraph.search`),
+# before their primary keys.
+DIRECT_FLIGHT_ORDERINGS = {
+    'departure': ['departure_time'],
+    'arrival': ['arrival_time'],
+    'duration': [ExpressionWrapper(F('arrival_time') - F('departure_time'), output_field=DurationField())],
+    'connections': [],
+}
+CONNECTION_ORDERINGS = {
+    'departure': ['first_leg__departure_time'],
+    'arrival': ['second_leg__arrival_time'],
+    'duration': ['total_duration'],
+    'connections': [],
+}
+
+
+def build_connection(first_leg: FlightEvent, second_leg: FlightEvent) -> Connection:
+    return Connection(
+        first_leg_id=first_leg.id,
+        second_leg_id=second_leg.id,
+        departure_city_id=first_leg.departure_city_id,
+        arrival_city_id=second_leg.arrival_city_id,
+        departure_date=timezone.localdate(first_leg.departure_time),
+        wait_time=second_leg.departure_time - first_leg.arrival_time,
+        total_duration=second_leg.arrival_time - first_leg.departure_time,
+    )
+
+
+def update_connections(flight_event: FlightEvent) -> int:
+    """
+        Recomputes the connections where the given flight event is the first or the second leg.
+        ---
+        Returns:
+            The number of connections created.
+    """
+    Connection.objects.filter(first_leg=flight_event).delete()
+    Connection.objects.filter(second_leg=flight_event).delete()
+
+    # Flights that can follow the given one: departing from its arrival city, after it lands.
+    next_legs = FlightEvent.objects.filter(
+        departure_city_id=flight_event.arrival_city_id,
+        departure_time__gt=flight_event.arrival_time,
+        arrival_time__lte=flight_event.departure_time + MAX_DURATION,
+    ).exclude(arrival_city_id=flight_event.arrival_city_id)
+    # Flights that can precede the given one: arriving to its departure city, before it departs.
+    previous_legs = FlightEvent.objects.filter(
+        arrival_city_id=flight_event.departure_city_id,
+        arrival_time__lt=flight_event.departure_time,
+        departure_time__gte=flight_event.arrival_time - MAX_DURATION,
+    )
+    if flight_event.departure_city_id == flight_event.arrival_city_id:
+        previous_legs = previous_legs.none()
+
+    connections = [build_connection(flight_event, second_leg) for second_leg in next_legs]
+    connections += [build_connection(first_leg, flight_event) for first_leg in previous_legs]
+    Connection.objects.bulk_create(connections)
+    return len(connections)
+
+
+@transaction.atomic
+def rebuild_connections(batch_size: int = 1000) -> int:
+    """
+        Deletes and recomputes every connection, pairing the flight events in memory.
+        ---
+        Returns:
+            The number of connections created.
+    """
+    Connection.objects.all().delete()
+
+    graph = FlightGraph.from_queryset(schedules=False)
+    city_ids = graph.city_ids
+    departure_cities = graph.departure_cities
+    arrival_cities = graph.arrival_cities
+    departure_times = graph.departure_times
+    arrival_times = graph.arrival_times
+    tz = timezone.get_current_timezone()
+
+    batch = []
+    total = 0
+    for first_leg in range(len(graph)):
+        connection_city = arrival_cities[first_leg]
+        departure = departure_times[first_leg]
+        arrival = arrival_times[first_leg]
+        for second_leg in graph.departures(connection_city, arrival + 1, departure + MAX_JOURNEY_DURATION + 1):
+            if (
+                arrival_cities[second_leg] == connection_city
+                or arrival_times[second_leg] - departure > MAX_JOURNEY_DURATION
+            ):
+                continue
+            batch.append(Connection(
+                first_leg_id=graph.event_ids[first_leg],
+                second_leg_id=graph.event_ids[second_leg],
+                departure_city_id=city_ids[departure_cities[first_leg]],
+                arrival_city_id=city_ids[arrival_cities[second_leg]],
+                departure_date=datetime.fromtimestamp(departure, tz).date(),
+                wait_time=timedelta(seconds=departure_times[second_leg] - arrival),
+                total_duration=timedelta(seconds=arrival_times[second_leg] - departure),
+            ))
+            if len(batch) >= batch_size:
+                Connection.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+    Connection.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+def journey_querysets(
+    registry: CityRegistry,
+    start_date: datetime,
+    end_date: datetime,
+    from_city: str,
+    to_city: str,
+    max_wait_time: timedelta,
+    arrive_by: Optional[datetime] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    arrive_after: Optional[datetime] = None,
+):
+    """
+        Returns the direct flights and the connections querysets of a search (see `find_journeys`).
+        Cities are resolved to their ids with the registry, so the queries don't join `City`.
+        With a `limit`, each query only returns its best `limit` rows by `sort`: the best journeys
+            are among them.
+    """
+    from_city_id = registry.get_id(from_city)
+    to_city_id = registry.get_id(to_city)
+    direct_flights = FlightEvent.objects.filter(
+        departure_city_id=from_city_id,
+        arrival_city_id=to_city_id,
+        departure_time__gte=start_date,
+        departure_time__lt=end_date,
+    ).select_related(*EVENT_RELATED_FIELDS).order_by('id')
+    connections = Connection.objects.filter(
+        departure_city_id=from_city_id,
+        arrival_city_id=to_city_id,
+        # Local departure dates of the window (a single one, unless searching several days at once).
+        departure_date__range=(start_date.date(), (end_date - timedelta(microseconds=1)).date()),
+        wait_time__lte=max_wait_time,
+        first_leg__departure_time__gte=start_date,
+        first_leg__departure_time__lt=end_date,
+    )
+    if arrive_by is not None:
+        direct_flights = direct_flights.filter(arrival_time__lte=arrive_by)
+        connections = connections.filter(second_leg__arrival_time__lte=arrive_by)
+    if arrive_after is not None:
+        direct_flights = direct_flights.filter(arrival_time__gte=arrive_after)
+        connections = connections.filter(second_leg__arrival_time__gte=arrive_after)
+    connections = connections.select_related(
+        *[f'first_leg__{field}' for field in EVENT_RELATED_FIELDS],
+        *[f'second_leg__{field}' for field in EVENT_RELATED_FIELDS],
+    ).order_by(*CONNECTION_ORDERINGS[sort or 'connections'], 'first_leg_id', 'second_leg_id')
+    direct_flights = direct_flights.order_by(*DIRECT_FLIGHT_ORDERINGS[sort or 'connections'], 'id')
+    if limit is not None:
+        direct_flights = direct_flights.filter(arrival_time__lte=F('departure_time') + MAX_DURATION)[:limit]
+        connections = connections[:limit]
+    return direct_flights, connections
+
+
+def build_journeys(
+    direct_flights: Iterable[FlightEvent],
+    connections: Iterable[Connection],
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[List[FlightEvent]]:
+    journeys = [
+        [flight]
+        for flight in direct_flights
+        if flight.get_duration() <= MAX_DURATION
+    ]
+    journeys += [[connection.first_leg, connection.second_leg] for connection in connections]
+    if sort is None:
+        return journeys[:limit]
+
+    # Same order as `FlightGraph.search`: by `sort`, then number of flights, then primary keys.
+    def key(journey):
+        if sort == 'departure':
+            rank = journey[0].departure_time
+        elif sort == 'arrival':
+            rank = journey[-1].arrival_time
+        elif sort == 'duration':
+            rank = journey[-1].arrival_time - journey[0].departure_time
+        else:
+            rank = len(journey)
+        return rank, len(journey), [flight.id for flight in journey]
+
+    if limit is None:
+        return sorted(journeys, key=key)
+    return heapq.nsmallest(limit, journeys, key=key)
+
+
+def schedules_in(start_date: datetime, end_date: datetime):
+    """
+        Returns the schedules valid on the days the journeys departing in `[start_date, end_date)` can use.
+        The connections table doesn't include them, so searches overlapping any are left to the graph.
+    """
+    return Schedule.objects.filter(
+        valid_from__lte=timezone.localdate(end_date + MAX_DURATION),
+        valid_until__gte=timezone.localdate(start_date),
+    )
+
+
+def find_journeys(
+    start_date: datetime,
+    end_date: datetime,
+    from_city: str,
+    to_city: str,
+    max_wait_time: timedelta,
+    arrive_by: Optional[datetime] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    arrive_after: Optional[datetime] = None,
+) -> List[List[FlightEvent]]:
+    """
+        Searches direct and 2-flight journeys using the precomputed connections.
+        ---
+        Parameters:
+            - start_date, end_date: Departure window, as a half-open range of aware datetimes
+            - from_city: Origin city code (3 letters, uppercase)
+            - to_city: Destination city code (3 letters, uppercase)
+            - max_wait_time: Max. connection time allowed between flights
+            - arrive_by: Latest arrival of the last flight (optional)
+            - sort, limit: Order and max. number of journeys (optional, see `FlightGraph.search`)
+            - arrive_after: Earliest arrival of the last flight (optional)
+
+        Returns:
+            A list of journeys, where each journey is a list of `FlightEvent`,
+                in the same order as the graph search.
+    """
+    querysets = journey_querysets(
+        get_city_registry(),
+        start_date,
+        end_date,
+        from_city,
+        to_city,
+        max_wait_time,
+        arrive_by,
+        sort,
+        limit,
+        arrive_after,
+    )
+    with stage('fetch'):
+        direct_flights, connections = [list(queryset) for queryset in querysets]
+    with stage('pairing'):
+        return build_journeys(direct_flights, connections, sort, limit)
+
+
+async def afind_journeys(
+    start_date: datetime,
+    end_date: datetime,
+    from_city: str,
+    to_city: str,
+    max_wait_time: timedelta,
+    arrive_by: Optional[datetime] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    arrive_after: Optional[datetime] = None,
+) -> List[List[FlightEvent]]:
+    """
+        Async version of `find_journeys`, fetching the direct flights and the connections concurrently.
+    """
+    async def fetch(queryset):
+        return [instance async for instance in queryset]
+
+    querysets = journey_querysets(
+        await aget_city_registry(),
+        start_date,
+        end_date,
+        from_city,
+        to_city,
+        max_wait_time,
+        arrive_by,
+        sort,
+        limit,
+        arrive_after,
+    )
+    with stage('fetch'):
+        direct_flights, connections = await asyncio.gather(*[fetch(queryset) for queryset in querysets])
+    with stage('pairing'):
+        return build_journeys(direct_flights, connections, sort, limit)
@@ -0,0 +1,1089 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import UTC, date, datetime, timedelta
+from itertools import chain, islice
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from apps.journeys.cache import GLOBAL_SCOPE, aget_versions, bump_versions, get_cache, get_versions, version_key
+from apps.journeys.checks import uses_process_cache
+from apps.journeys.instrumentation import stage
+from apps.journeys.models import City, Flight, FlightEvent, Schedule
+from apps.journeys.registry import invalidate_city_registry
+from apps.journeys.renderers import render_journey, render_leg
+from apps.journeys.snapshot import read_snapshot, read_snapshot_header, read_snapshot_version, write_snapshot
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Max. total duration of a journey (and of a single flight), in seconds.
+MAX_JOURNEY_DURATION = 24 * 60 * 60
+
+# Scope of the version bumped when the timetable (events, flights or cities) changes.
+TIMETABLE_SCOPE = 'timetable'
+
+# Graphs of schedules expanded for a window of days kept by each graph (see `FlightGraph.expand_schedules`).
+EXPANDED_WINDOWS = 32
+
+# Epoch seconds are below this, so (city, time) pairs can be packed in a single int64 as `city * TIME_SPAN + time`.
+TIME_SPAN = 2 ** 40
+
+logger = logging.getLogger(__name__)
+
+Journey = Tuple[int, ...]
+# (flight, departure city, arrival city, local departure time in seconds, duration in seconds, ISO weekdays,
+#  first day, last day), with the same indexes as the events and the days as ordinals.
+ScheduleRow = Tuple[int, int, int, int, int, str, int, int]
+
+
+class FlightGraph:
+    """
+        Compact in-memory view of the `FlightEvent` timetable, used to search journeys
+            without hitting the database.
+        ---
+        Events are stored column-wise in `array`s, indexed by their position in primary key
+        order (so sorting event indexes is the same as sorting by `FlightEvent.id`).
+        Cities are mapped to dense integer ids and times to epoch seconds.
+
+        Departures are grouped per city (CSR layout): the departures of city `c` are
+        `adj_events[adj_offsets[c]:adj_offsets[c + 1]]`, sorted by departure time, with their
+        departure times in the parallel `adj_times` array so they can be bisected.
+        Arrivals are grouped the same way, by arrival city and time, on first use (see `arrivals`).
+
+        Columns can be any sequence of integers: `array`s when loaded from the database, memory
+        mapped ones when loaded from a snapshot (see `from_snapshot`).
+
+        Schedules are kept as they are, and expanded into events for the days of each search
+        (see `expand_schedules`).
+    """
+
+    def __init__(
+        self,
+        city_ids: List[int],
+        city_codes: List[str],
+        flight_numbers: List[str],
+        event_ids: array,
+        event_flights: array,
+        departure_cities: array,
+        arrival_cities: array,
+        departure_times: array,
+        arrival_times: array,
+        adjacency: Optional[Sequence[Sequence[int]]] = None,
+        version: Optional[int] = None,
+        schedules: Sequence[ScheduleRow] = (),
+        fingerprint: Optional[List[int]] = None,
+    ):
+        self.city_ids = city_ids
+        self.city_codes = city_codes
+        self.flight_numbers = flight_numbers
+        self.event_ids = event_ids
+        self.event_flights = event_flights
+        self.departure_cities = departure_cities
+        self.arrival_cities = arrival_cities
+        self.departure_times = departure_times
+        self.arrival_times = arrival_times
+        self.schedules = schedules
+
+        self.city_index = {city_id: index for index, city_id in enumerate(city_ids)}
+        self.code_index = {code: index for index, code in enumerate(city_codes)}
+        self._inbound_cities = None
+        self._arrivals = None
+        self._columns = None
+        self._expanded = OrderedDict()
+        self._expanded_lock = threading.Lock()
+        self._fragments = [None] * len(event_ids)
+        # The timetable version it was loaded at, and the fingerprint of the database then
+        # (see `get_timetable_fingerprint`).
+        self.version = version
+        self.fingerprint = fingerprint
+        if adjacency is None:
+            self._build_adjacency()
+        else:
+            self.adj_offsets, self.adj_events, self.adj_times = adjacency
+
+    def __len__(self):
+        return len(self.event_ids)
+
+    @classmethod
+    def from_queryset(cls, queryset=None, schedules: bool = True) -> 'FlightGraph':
+        """
+            Builds a graph from the given `FlightEvent` queryset (all events by default) and all
+                the schedules (unless `schedules` is False), using a query for the cities, one for
+                the events and one for the schedules.
+        """
+        if queryset is None:
+            queryset = FlightEvent.objects.all()
+
+        cities = list(City.objects.order_by('id').values_list('id', 'code'))
+        city_ids = [city_id for city_id, _ in cities]
+        city_codes = [code for _, code in cities]
+        city_index = {city_id: index for index, city_id in enumerate(city_ids)}
+
+        flight_numbers = []
+        flight_index = {}
+        event_ids = array('q')
+        event_flights = array('l')
+        departure_cities = array('l')
+        arrival_cities = array('l')
+        departure_times = array('q')
+        arrival_times = array('q')
+
+        rows = queryset.order_by('id').values_list(
+            'id',
+            'flight__number',
+            'departure_city_id',
+            'arrival_city_id',
+            'departure_time',
+            'arrival_time',
+        )
+        for event_id, number, departure_city, arrival_city, departure_time, arrival_time in rows:
+            if number not in flight_index:
+                flight_index[number] = len(flight_numbers)
+                flight_numbers.append(number)
+            event_ids.append(event_id)
+            event_flights.append(flight_index[number])
+            departure_cities.append(city_index[departure_city])
+            arrival_cities.append(city_index[arrival_city])
+            departure_times.append(int(departure_time.timestamp()))
+            arrival_times.append(int(arrival_time.timestamp()))
+
+        schedule_rows = []
+        rows = Schedule.objects.order_by('id').values_list(
+            'flight__number',
+            'departure_city_id',
+            'arrival_city_id',
+            'departure_time',
+            'duration',
+            'weekdays',
+            'valid_from',
+            'valid_until',
+        )
+        for number, departure_city, arrival_city, departure_time, duration, weekdays, valid_from, valid_until in (
+            rows if schedules else ()
+        ):
+            if number not in flight_index:
+                flight_index[number] = len(flight_numbers)
+                flight_numbers.append(number)
+            schedule_rows.append((
+                flight_index[number],
+                city_index[departure_city],
+                city_index[arrival_city],
+                departure_time.hour * 3600 + departure_time.minute * 60 + departure_time.second,
+                int(duration.total_seconds()),
+                weekdays,
+                valid_from.toordinal(),
+                valid_until.toordinal(),
+            ))
+
+        return cls(
+            city_ids,
+            city_codes,
+            flight_numbers,
+            event_ids,
+            event_flights,
+            departure_cities,
+            arrival_cities,
+            departure_times,
+            arrival_times,
+            schedules=schedule_rows,
+        )
+
+    @classmethod
+    def from_snapshot(cls, path: str) -> 'FlightGraph':
+        """
+            Loads a graph saved with `snapshot.write_snapshot`, without any query nor copying its columns.
+        """
+        header, columns = read_snapshot(path)
+        return cls(
+            header['city_ids'],
+            header['city_codes'],
+            header['flight_numbers'],
+            columns['event_ids'],
+            columns['event_flights'],
+            columns['departure_cities'],
+            columns['arrival_cities'],
+            columns['departure_times'],
+            columns['arrival_times'],
+            adjacency=(columns['adj_offsets'], columns['adj_events'], columns['adj_times']),
+            version=header['version'],
+            schedules=[tuple(schedule) for schedule in header['schedules']],
+            fingerprint=header['fingerprint'],
+        )
+
+    def save_snapshot(self, path: str):
+        write_snapshot(self, path, self.version)
+
+    def _build_adjacency(self):
+        self.adj_offsets, self.adj_events, self.adj_times = self._group_events(
+            self.departure_cities, self.departure_times
+        )
+
+    def _group_events(self, cities: Sequence[int], times: Sequence[int]) -> Tuple[array, array, array]:
+        """
+            Returns the CSR layout of the events grouped by the given cities, sorted by the given times.
+        """
+        order = sorted(range(len(self.event_ids)), key=lambda index: (cities[index], times[index], index))
+
+        offsets = array('q', [0] * (len(self.city_codes) + 1))
+        for index in order:
+            offsets[cities[index] + 1] += 1
+        for city in range(len(self.city_codes)):
+            offsets[city + 1] += offsets[city]
+        return offsets, array('q', order), array('q', (times[index] for index in order))
+
+    def expand_schedules(self, start: int, end: int) -> 'FlightGraph':
+        """
+            Returns a graph of the events departing in `[start, end)`, extended to whole local days, with
+                the schedules expanded into events for those days. Or this graph if it has no schedules.
+            ---
+            A scheduled flight isn't expanded on the days an event of the same flight departs from the same
+            city (it overrides it). The events keep their order, followed by the expanded ones (by schedule
+            and day), so journeys are still sorted deterministically.
+            The graphs of the last `EXPANDED_WINDOWS` windows are kept, so the searches of the same days
+            reuse them (and their rendered legs). Their cost grows with the events and schedules of the
+            window, not with the days each schedule is valid for.
+        """
+        if not self.schedules:
+            return self
+        first_day = timezone.localdate(datetime.fromtimestamp(start, UTC))
+        last_day = timezone.localdate(datetime.fromtimestamp(max(end, start + 1) - 1, UTC))
+        key = (first_day, last_day)
+        with self._expanded_lock:
+            graph = self._expanded.get(key)
+            if graph is not None:
+                self._expanded.move_to_end(key)
+                return graph
+
+        graph = self._expand_days(first_day, last_day)
+        with self._expanded_lock:
+            self._expanded[key] = graph
+            while len(self._expanded) > EXPANDED_WINDOWS:
+                self._expanded.popitem(last=False)
+        return graph
+
+    def _expand_days(self, first_day: date, last_day: date) -> 'FlightGraph':
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        boundaries = [
+            int(timezone.make_aware(datetime.combine(day, datetime.min.time())).timestamp())
+            for day in [*days, last_day + timedelta(days=1)]
+        ]
+        events = sorted(
+            event
+            for city in range(len(self.city_codes))
+            for event in self.departures(city, boundaries[0], boundaries[-1])
+        )
+        overridden = {
+            (
+                self.event_flights[event],
+                self.departure_cities[event],
+                bisect_right(boundaries, self.departure_times[event]) - 1,
+            )
+            for event in events
+        }
+
+        event_ids = array('q', (self.event_ids[event] for event in events))
+        event_flights = array('l', (self.event_flights[event] for event in events))
+        departure_cities = array('l', (self.departure_cities[event] for event in events))
+        arrival_cities = array('l', (self.arrival_cities[event] for event in events))
+        departure_times = array('q', (self.departure_times[event] for event in events))
+        arrival_times = array('q', (self.arrival_times[event] for event in events))
+        for flight, departure_city, arrival_city, departure_time, duration, weekdays, valid_from, valid_until in (
+            self.schedules
+        ):
+            for index, day in enumerate(days):
+                if (
+                    not valid_from <= day.toordinal() <= valid_until
+                    or str(day.isoweekday()) not in weekdays
+                    or (flight, departure_city, index) in overridden
+                ):
+                    continue
+                departure = datetime.combine(day, datetime.min.time()) + timedelta(seconds=departure_time)
+                departure = int(timezone.make_aware(departure).timestamp())
+                # Expanded events don't have an id.
+                event_ids.append(0)
+                event_flights.append(flight)
+                departure_cities.append(departure_city)
+                arrival_cities.append(arrival_city)
+                departure_times.append(departure)
+                arrival_times.append(departure + duration)
+
+        return FlightGraph(
+            self.city_ids,
+            self.city_codes,
+            self.flight_numbers,
+            event_ids,
+            event_flights,
+            departure_cities,
+            arrival_cities,
+            departure_times,
+            arrival_times,
+        )
+
+    def departures(self, city: int, start: int, end: int) -> array:
+        """
+            Returns the events departing from `city` in the half-open window `[start, end)`,
+                sorted by departure time.
+        """
+        lo = self.adj_offsets[city]
+        hi = self.adj_offsets[city + 1]
+        first = bisect_left(self.adj_times, start, lo, hi)
+        last = bisect_left(self.adj_times, end, first, hi)
+        return self.adj_events[first:last]
+
+    def arrivals(self, city: int, start: int, end: int) -> array:
+        """
+            Returns the events arriving to `city` in the half-open window `[start, end)`,
+                sorted by arrival time.
+        """
+        if self._arrivals is None:
+            self._arrivals = self._group_events(self.arrival_cities, self.arrival_times)
+        offsets, events, times = self._arrivals
+        first = bisect_left(times, start, offsets[city], offsets[city + 1])
+        last = bisect_left(times, end, first, offsets[city + 1])
+        return events[first:last]
+
+    def legs_to(
+        self,
+        destination: int,
+        start: int,
+        latest: int,
+        max_wait: int,
+        max_legs: int,
+        arrive_after: Optional[int] = None,
+    ) -> Dict[int, int]:
+        """
+            Backward search from the destination: returns, for every event that can reach it by `latest`
+                (and after `arrive_after`) with up to `max_legs` flights, the min. number of flights needed
+                (including its own).
+            ---
+            Round `k` marks the flights arriving to the departure city of a flight of round `k - 1`
+            at most `max_wait` before it departs (and after `start`). Like `hops_to`, it's a lower bound
+            (it doesn't check the journey duration nor revisited cities), but a timed one.
+        """
+        departure_cities = self.departure_cities
+        departure_times = self.departure_times
+        frontier = self.arrivals(destination, start if arrive_after is None else max(start, arrive_after), latest + 1)
+        legs = dict.fromkeys(frontier, 1)
+        for round_legs in range(2, max_legs + 1):
+            # Arrival windows of each city, `[departure - max_wait, departure)` for each departure of the
+            # frontier, merged so every arrival is only looked at once.
+            windows = {}
+            for event in frontier:
+                windows.setdefault(departure_cities[event], []).append(departure_times[event])
+            marked = set()
+            for city, departures in windows.items():
+                departures.sort()
+                window_start = window_end = None
+                for departure in departures:
+                    if window_end is None or departure - max_wait > window_end:
+                        if window_end is not None:
+                            marked.update(self.arrivals(city, window_start, window_end))
+                        window_start = max(departure - max_wait, start)
+                    window_end = departure
+                marked.update(self.arrivals(city, window_start, window_end))
+            frontier = marked.difference(legs)
+            legs.update(dict.fromkeys(frontier, round_legs))
+        return legs
+
+    def hops_to(self, city: int, max_hops: int) -> List[int]:
+        """
+            Returns, for every city, the min. number of flights needed to reach `city`
+                (ignoring times), or `max_hops + 1` if it takes more than `max_hops`.
+            It is a lower bound used to stop expanding paths that can't reach the destination.
+        """
+        if self._inbound_cities is None:
+            inbound = [set() for _ in self.city_codes]
+            for departure_city, arrival_city in zip(self.departure_cities, self.arrival_cities):
+                inbound[arrival_city].add(departure_city)
+            self._inbound_cities = inbound
+
+        hops = [max_hops + 1] * len(self.city_codes)
+        hops[city] = 0
+        frontier = [city]
+        for hop in range(1, max_hops + 1):
+            next_frontier = []
+            for current in frontier:
+                for previous in self._inbound_cities[current]:
+                    if hops[previous] > hop:
+                        hops[previous] = hop
+                        next_frontier.append(previous)
+            frontier = next_frontier
+        return hops
+
+    def search(
+        self,
+        from_city: str,
+        to_city: str,
+        start: int,
+        end: int,
+        max_wait: int,
+        max_legs: int = 2,
+        arrive_by: Optional[int] = None,
+        sort: Optional[str] = None,
+        limit: Optional[int] = None,
+        arrive_after: Optional[int] = None,
+        bidirectional: bool = False,
+    ) -> List[Journey]:
+        """
+            Searches journeys (sequences of up to `max_legs` events) from `from_city` to `to_city`
+                whose first flight departs in `[start, end)`.
+            ---
+            The search is round based: round `k` extends the paths of `k - 1` flights with the
+            flights departing from their last city after the arrival and within `max_wait`.
+            A journey can't last more than 24 hours, arrive after `arrive_by` (or before `arrive_after`)
+            nor visit a city twice.
+
+            Journeys of 1 and 2 flights are searched exhaustively. Paths of 2 or more flights are
+            only extended if they aren't dominated at their last city (see `_prune_dominated`): the journeys
+            left out are the ones as good as or worse than a journey returned, taking the same last flights.
+            Cities that can't reach the destination with the remaining flights
+            are never expanded, and neither are paths that can't reach it by `arrive_by`: only the
+            connections departing before it are looked up.
+
+            With a `limit`, only the best `limit` journeys are kept (see `top_journeys`).
+
+            A `bidirectional` search also searches backward from the destination first (see `legs_to`), and
+            the forward search only takes the connections that can still reach it in time: the two searches
+            meet at the intermediate cities. It explores far fewer paths when most of them lead away from the
+            destination (e.g. through hubs), at the cost of the backward search. It finds the same journeys:
+            the paths it leaves out can't reach the destination, so they can't dominate a path that can
+            (a path only dominates paths arriving at the same city and time, with as many flights or more).
+            ---
+            Parameters:
+                - from_city: Origin city code (3 letters, uppercase)
+                - to_city: Destination city code (3 letters, uppercase)
+                - start, end: Departure window, in epoch seconds
+                - max_wait: Max. connection time allowed between flights, in seconds
+                - max_legs: Max. number of flights per journey
+                - arrive_by: Latest arrival of the last flight, in epoch seconds (optional)
+                - sort: 'departure', 'arrival', 'duration' or 'connections' (optional)
+                - limit: Max. number of journeys returned (optional)
+                - arrive_after: Earliest arrival of the last flight, in epoch seconds (optional)
+                - bidirectional: Whether to prune the search with a backward search from the destination
+
+            Returns:
+                A list of journeys, where each journey is a tuple of event indexes.
+                Journeys are sorted by `sort` if given, then by number of flights, then in
+                    primary key order.
+        """
+        origin = self.code_index.get(from_city)
+        destination = self.code_index.get(to_city)
+        if origin is None or destination is None:
+            return []
+
+        arguments = (origin, destination, start, end, max_wait, max_legs, arrive_by, arrive_after, bidirectional)
+        if sort is None or sort == 'connections':
+            # The journeys are found in this order already: stop as soon as there are enough.
+            journeys = self._journeys(*arguments)
+            return list(journeys if limit is None else islice(journeys, limit))
+        if limit is None:
+            rank = self.rank_key(sort)
+            return sorted(self._journeys(*arguments), key=lambda journey: (rank(journey), len(journey), journey))
+        return self.top_journeys(arguments, sort, limit)
+
+    def rank_key(self, sort: str) -> Callable[[Journey], int]:
+        """
+            Returns the function ranking journeys (or paths) by `sort`, lower first.
+        """
+        departure_times = self.departure_times
+        arrival_times = self.arrival_times
+        if sort == 'departure':
+            return lambda path: departure_times[path[0]]
+        if sort == 'arrival':
+            return lambda path: arrival_times[path[-1]]
+        if sort == 'duration':
+            return lambda path: arrival_times[path[-1]] - departure_times[path[0]]
+        return len
+
+    def top_journeys(self, arguments: Tuple, sort: str, limit: int) -> List[Journey]:
+        """
+            Returns the `limit` best journeys by (`sort`, number of flights, primary key order), keeping
+                only them in a bounded heap while searching, instead of sorting all of them.
+            ---
+            Arrivals and durations only grow as a path is extended, so when sorting by them, paths that
+            already rank worse than the worst journey kept (with a full heap) aren't extended either.
+            That can't change the results: the journeys their descendants would have pruned as dominated
+            rank even worse. Departures don't grow, so every path is extended when sorting by them.
+        """
+        rank = self.rank_key(sort)
+        # Entries are the negated ranking keys (with the journey last), so the heap top is the worst journey.
+        heap = []
+
+        prune = None
+        if sort in ('arrival', 'duration'):
+            def prune(path):
+                return len(heap) == limit and rank(path) > -heap[0][0]
+
+        for journey in self._journeys(*arguments, prune=prune):
+            entry = (-rank(journey), -len(journey), tuple(-event for event in journey), journey)
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+        return [entry[-1] for entry in sorted(heap, reverse=True)]
+
+    def reachable(
+        self,
+        from_city: str,
+        start: int,
+        end: int,
+        max_wait: int,
+        max_legs: int = 2,
+    ) -> Dict[int, Journey]:
+        """
+            Searches the journeys to every city at once, in a single sweep from the origin, and returns
+                the best one of each city reachable from it (by city index): the one arriving first,
+                then as sorted by `search` (by number of flights, then in primary key order).
+            ---
+            Same rules and rounds as `search` (see `_sweep`), without a destination: every path is
+            a journey to its last city, and the paths are extended until they reach `max_legs` flights.
+            Paths that are dominated at their last city aren't extended, as in `search`.
+
+            Parameters:
+                - from_city, start, end, max_wait, max_legs: Same as `search`
+
+            Returns:
+                A dict of the best journey to each reachable city, by city index (the origin isn't included).
+        """
+        origin = self.code_index.get(from_city)
+        if origin is None:
+            return {}
+
+        arrival_cities = self.arrival_cities
+        departure_times = self.departure_times
+        arrival_times = self.arrival_times
+        latest = end + MAX_JOURNEY_DURATION
+        paths = [
+            (flight,)
+            for flight in sorted(self.departures(origin, start, end))
+            if arrival_cities[flight] != origin
+            and arrival_times[flight] - departure_times[flight] <= MAX_JOURNEY_DURATION
+            and arrival_times[flight] <= latest
+        ]
+
+        best = {}
+        # Every path is a journey to its last city, even the dominated ones.
+        for path in chain(paths, self._sweep(origin, None, paths, max_wait, max_legs, latest)):
+            city = arrival_cities[path[-1]]
+            key = (arrival_times[path[-1]], len(path), path)
+            if city not in best or key < best[city]:
+                best[city] = key
+        return {city: key[-1] for city, key in best.items()}
+
+    def calendar(
+        self,
+        from_city: str,
+        to_city: str,
+        boundaries: Sequence[int],
+        max_wait: int,
+        max_legs: int = 2,
+    ) -> List[Tuple[int, Optional[Journey]]]:
+        """
+            Searches the journeys departing on several consecutive days at once, in a single sweep
+                over their whole departure window, and summarizes them by day.
+            ---
+            Parameters:
+                - from_city, to_city, max_wait, max_legs: Same as `search`
+                - boundaries: Start of each day and end of the last one, in epoch seconds
+
+            Returns:
+                For each day, the number of journeys departing on it and the shortest one (by duration,
+                    then as sorted by `search`), or None if there aren't any.
+                The journeys of a day are the same as searching that day alone: paths only dominate
+                    the ones departing on the same day.
+        """
+        days = len(boundaries) - 1
+        counts = [0] * days
+        shortest = [None] * days
+        origin = self.code_index.get(from_city)
+        destination = self.code_index.get(to_city)
+        if origin is None or destination is None:
+            return list(zip(counts, shortest))
+
+        departure_times = self.departure_times
+
+        def day_of(path: Journey) -> int:
+            return bisect_right(boundaries, departure_times[path[0]]) - 1
+
+        duration = self.rank_key('duration')
+        journeys = self._journeys(
+            origin, destination, boundaries[0], boundaries[-1], max_wait, max_legs, partition=day_of
+        )
+        for journey in journeys:
+            day = day_of(journey)
+            counts[day] += 1
+            key = (duration(journey), len(journey), journey)
+            if shortest[day] is None or key < shortest[day]:
+                shortest[day] = key
+        return [(count, key and key[-1]) for count, key in zip(counts, shortest)]
+
+    def _journeys(
+        self,
+        origin: int,
+        destination: int,
+        start: int,
+        end: int,
+        max_wait: int,
+        max_legs: int,
+        arrive_by: Optional[int] = None,
+        arrive_after: Optional[int] = None,
+        bidirectional: bool = False,
+        prune: Optional[Callable[[Journey], bool]] = None,
+        partition: Optional[Callable[[Journey], int]] = None,
+    ) -> Iterator[Journey]:
+        """
+            Yields the journeys of `search` in its default order, round by round. Paths for which
+                `prune` returns True aren't extended. With a `partition` of the paths, only paths
+                of the same part can dominate each other.
+        """
+        arrival_cities = self.arrival_cities
+        departure_times = self.departure_times
+        arrival_times = self.arrival_times
+        # No journey departing in the window can arrive later than this.
+        latest = end + MAX_JOURNEY_DURATION if arrive_by is None else min(arrive_by, end + MAX_JOURNEY_DURATION)
+
+        initial_flights = sorted(self.departures(origin, start, end))
+        yield from (
+            (flight,)
+            for flight in initial_flights
+            if arrival_cities[flight] == destination
+            and arrival_times[flight] - departure_times[flight] <= MAX_JOURNEY_DURATION
+            and arrival_times[flight] <= latest
+            and (arrive_after is None or arrival_times[flight] >= arrive_after)
+        )
+        if max_legs < 2:
+            return
+        min_flights = settings.JOURNEYS_VECTORIZED_MIN_FLIGHTS
+        if max_legs == 2 and numpy is not None and 0 < min_flights <= len(initial_flights):
+            yield from self._pair_legs(initial_flights, destination, start, latest, max_wait, arrive_after)
+            return
+
+        hops = self.hops_to(destination, max_legs)
+        # Min. number of flights from each flight to the destination, for the ones that can make it in time
+        # (the first flights are checked by looking at their connections, so there's one round less).
+        reach = None
+        if bidirectional:
+            reach = self.legs_to(destination, start, latest, max_wait, max_legs - 1, arrive_after)
+        paths = [
+            (flight,)
+            for flight in initial_flights
+            if arrival_cities[flight] != destination
+            and hops[arrival_cities[flight]] < max_legs
+            and arrival_times[flight] < latest
+        ]
+
+        def extend(path: Journey, legs: int) -> bool:
+            return hops[arrival_cities[path[-1]]] <= max_legs - legs and (
+                reach is None or reach.get(path[-1], max_legs) <= max_legs - legs + 1
+            )
+
+        yield from (
+            journey
+            for journey in self._sweep(origin, destination, paths, max_wait, max_legs, latest, extend, prune, partition)
+            if arrive_after is None or arrival_times[journey[-1]] >= arrive_after
+        )
+
+    def _sweep(
+        self,
+        origin: int,
+        destination: Optional[int],
+        paths: List[Journey],
+        max_wait: int,
+        max_legs: int,
+        latest: int,
+        extend: Optional[Callable[[Journey, int], bool]] = None,
+        prune: Optional[Callable[[Journey], bool]] = None,
+        partition: Optional[Callable[[Journey], int]] = None,
+    ) -> Iterator[Journey]:
+        """
+            Extends the paths departing from the origin round by round, up to `max_legs` flights, and yields
+                the new journeys to `destination` (or every new path, without a destination) as they are found.
+            ---
+            Round `k` extends the paths of `k - 1` flights with the flights departing from their last city
+            after the arrival and within `max_wait`, that don't make the journey last more than 24 hours,
+            arrive after `latest` nor visit a city twice. The paths reaching the destination aren't extended,
+            and neither are the ones for which `extend(path, legs)` returns False, the ones dominated at their
+            last city (see `_prune_dominated`) nor the ones for which `prune` returns True. With a `partition`
+            of the paths, only paths of the same part can dominate each other.
+        """
+        arrival_cities = self.arrival_cities
+        departure_times = self.departure_times
+        arrival_times = self.arrival_times
+        if partition is None:
+            def partition(path):
+                return 0
+
+        # Non-dominated (departure, legs, cities) labels of the paths expanded so far, per part, city and arrival.
+        labels = {}
+        for path in paths:
+            labels.setdefault((partition(path), arrival_cities[path[0]], arrival_times[path[0]]), []).append(
+                (departure_times[path[0]], 1, frozenset())
+            )
+
+        for legs in range(2, max_legs + 1):
+            next_paths = []
+            for path in paths:
+                if prune is not None and prune(path):
+                    continue
+                departure = departure_times[path[0]]
+                arrival = arrival_times[path[-1]]
+                visited = {arrival_cities[flight] for flight in path}
+                visited.add(origin)
+                # Next flights depart strictly after the arrival, at most `max_wait` later, and before `latest`.
+                connections = sorted(
+                    self.departures(arrival_cities[path[-1]], arrival + 1, min(arrival + max_wait, latest) + 1)
+                )
+                for flight in connections:
+                    if arrival_times[flight] - departure > MAX_JOURNEY_DURATION or arrival_times[flight] > latest:
+                        continue
+                    city = arrival_cities[flight]
+                    if city == destination:
+                        yield path + (flight,)
+                    elif city not in visited:
+                        new_path = path + (flight,)
+                        if destination is None:
+                            yield new_path
+                        if extend is None or extend(new_path, legs):
+                            next_paths.append(new_path)
+
+            paths = self._prune_dominated(next_paths, labels, legs, partition)
+
+    def columns(self) -> Dict[str, 'numpy.ndarray']:
+        """
+            Returns NumPy views of the event columns, sharing their memory (also when memory mapped).
+        """
+        if self._columns is None:
+            self._columns = {
+                name: numpy.asarray(memoryview(getattr(self, name))).astype(numpy.int64, copy=False)
+                for name in ['departure_cities', 'arrival_cities', 'departure_times', 'arrival_times']
+            }
+        return self._columns
+
+    def _pair_legs(
+        self,
+        initial_flights: List[int],
+        destination: int,
+        start: int,
+        latest: int,
+        max_wait: int,
+        arrive_after: Optional[int] = None,
+    ) -> Iterator[Journey]:
+        """
+            Yields the 2-flight journeys of `_journeys`, in the same order, joining the first and second
+                flights with NumPy instead of checking them pair by pair.
+            ---
+            The second flights (the ones arriving to the destination in time) are sorted by departure city
+            and time, so the connections of each first flight are a contiguous range, found with
+            `searchsorted`: the ones departing from its arrival city in `(arrival, arrival + max_wait]`.
+            The duration and arrival rules are then applied to all the pairs at once, and only
+            the valid ones are turned into journeys.
+        """
+        columns = self.columns()
+        departure_cities = columns['departure_cities']
+        arrival_cities = columns['arrival_cities']
+        departure_times = columns['departure_times']
+        arrival_times = columns['arrival_times']
+
+        first = numpy.asarray(initial_flights, dtype=numpy.int64)
+        first = first[(arrival_cities[first] != destination) & (arrival_times[first] < latest)]
+        second = numpy.asarray(self.arrivals(destination, start, latest + 1), dtype=numpy.int64)
+        if not len(first) or not len(second):
+            return
+
+        keys = departure_cities[second] * TIME_SPAN + departure_times[second]
+        order = numpy.argsort(keys, kind='stable')
+        second = second[order]
+        keys = keys[order]
+
+        arrival = arrival_times[first]
+        city = arrival_cities[first] * TIME_SPAN
+        lo = numpy.searchsorted(keys, city + arrival, side='right')
+        hi = numpy.searchsorted(keys, city + numpy.minimum(arrival + max_wait, latest), side='right')
+        counts = hi - lo
+        total = int(counts.sum())
+        if not total:
+            return
+
+        # Every (first, second) pair of the ranges, flattened.
+        pair_first = numpy.repeat(first, counts)
+        pair_second = second[
+            numpy.arange(total) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + numpy.repeat(lo, counts)
+        ]
+        arrival = arrival_times[pair_second]
+        valid = arrival - departure_times[pair_first] <= MAX_JOURNEY_DURATION
+        if arrive_after is not None:
+            valid &= arrival >= arrive_after
+        pair_first = pair_first[valid]
+        pair_second = pair_second[valid]
+        order = numpy.lexsort((pair_second, pair_first))
+        yield from zip(pair_first[order].tolist(), pair_second[order].tolist())
+
+    def _prune_dominated(
+        self,
+        paths: List[Journey],
+        labels: Dict[Tuple[int, int, int], List],
+        legs: int,
+        partition: Callable[[Journey], int],
+    ) -> List[Journey]:
+        """
+            Drops the paths whose label is dominated at their last city, and records the labels
+                of the remaining ones. Returns the remaining paths in primary key order.
+            ---
+            A path dominates another one if it arrived at the same time (so it can take the same connections
+            within the max. wait), departed later (or at the same time), took fewer (or as many) flights and
+            didn't go through any city the other one didn't (so it can fly to every city the other one can).
+            Every journey extending the dropped path then has a journey extending the other one, with the
+            same last flights, that is as good or better.
+        """
+        arrival_cities = self.arrival_cities
+        departure_times = self.departure_times
+        arrival_times = self.arrival_times
+
+        # Potential dominators first, so a single pass is enough within a round.
+        paths = sorted(paths, key=lambda path: (-departure_times[path[0]], path))
+        kept = []
+        for path in paths:
+            departure = departure_times[path[0]]
+            cities = frozenset(arrival_cities[flight] for flight in path[:-1])
+            arrival_labels = labels.setdefault(
+                (partition(path), arrival_cities[path[-1]], arrival_times[path[-1]]), []
+            )
+            if any(
+                other_departure >= departure and other_legs <= legs and other_cities <= cities
+                for other_departure, other_legs, other_cities in arrival_labels
+            ):
+                continue
+            arrival_labels.append((departure, legs, cities))
+            kept.append(path)
+        return sorted(kept)
+
+    def format_time(self, timestamp: int) -> str:
+        return time.strftime('%Y-%m-%d %H:%M', time.gmtime(timestamp))
+
+    def parse(self, journeys: List[Journey]) -> List[Dict]:
+        """
+            Same output as `utils.parse_journey`, built from event indexes instead of `FlightEvent`s.
+        """
+        flight_numbers = self.flight_numbers
+        city_codes = self.city_codes
+        format_time = self.format_time
+        return [
+            {
+                "connections": 0 if len(journey) == 1 else len(journey),
+                "path": [
+                    {
+                        "flight_number": flight_numbers[self.event_flights[event]],
+                        "_from": city_codes[self.departure_cities[event]],
+                        "to": city_codes[self.arrival_cities[event]],
+                        "departure_time": format_time(self.departure_times[event]),
+                        "arrival_time": format_time(self.arrival_times[event]),
+                    }
+                    for event in journey
+                ]
+            }
+            for journey in journeys
+        ]
+
+    def fragment(self, event: int) -> bytes:
+        """
+            Returns the rendered JSON of an event as a journey leg, rendering it on first use.
+        """
+        fragment = self._fragments[event]
+        if fragment is None:
+            fragment = self._fragments[event] = render_leg(
+                self.flight_numbers[self.event_flights[event]],
+                self.city_codes[self.departure_cities[event]],
+                self.city_codes[self.arrival_cities[event]],
+                self.format_time(self.departure_times[event]),
+                self.format_time(self.arrival_times[event]),
+            )
+        return fragment
+
+    def render(self, journeys: List[Journey]) -> bytes:
+        """
+            Same bytes as `renderers.render_journeys(self.parse(journeys))`, from the rendered legs.
+        """
+        fragment = self.fragment
+        return b'[%s]' % b','.join(
+            render_journey(0 if len(journey) == 1 else len(journey), (fragment(event) for event in journey))
+            for journey in journeys
+        )
+
+
+_graph: Optional[FlightGraph] = None
+_graph_generation = 0
+_graph_lock = threading.Lock()
+# Whether this process already looked up the timetable version (see `get_timetable_version`).
+_version_checked = False
+# The database fingerprint this process last saw, and when (see `check_timetable`), in `time.monotonic` seconds.
+_fingerprint: Optional[List[int]] = None
+_fingerprint_checked_at = float('-inf')
+
+
+def get_timetable_fingerprint() -> List[int]:
+    """
+        Returns the number of rows and the greatest id of the cities, flights, events and schedules, with a
+            single query.
+        ---
+        It changes whenever rows are added or deleted, by any process and even without signals (e.g. an import,
+        `loaddata` or SQL), so it tells whether a snapshot or this process are outdated, whatever the cache.
+        Changes to existing rows are only seen through the timetable version (see `signals.timetable_changed`).
+    """
+    models = [City, Flight, FlightEvent, Schedule]
+    query = ' UNION ALL '.join(
+        f'SELECT {index}, COUNT(*), MAX(id) FROM {connection.ops.quote_name(model._meta.db_table)}'
+        for index, model in enumerate(models)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        rows = sorted(cursor.fetchall())
+    return [value or 0 for _, count, last_id in rows for value in (count, last_id)]
+
+
+def get_timetable_version() -> int:
+    """
+        Returns the current timetable version, shared by all the processes through the cache.
+        ---
+        On the first lookup of a process, a missing version (e.g. the in-process cache of a new worker)
+        is set to the one of the snapshot, if it has the fingerprint of the database, so new workers
+        start from it instead of the database.
+    """
+    global _version_checked
+    path = settings.JOURNEYS_SNAPSHOT_PATH
+    if path and not _version_checked:
+        cache = get_cache()
+        key = version_key(TIMETABLE_SCOPE)
+        header = read_snapshot_header(path)
+        if header is not None and cache.get(key) is None and header['fingerprint'] == get_timetable_fingerprint():
+            cache.add(key, header['version'], timeout=None)
+    _version_checked = True
+    version, = get_versions([TIMETABLE_SCOPE])
+    return version
+
+
+def load_flight_graph(version: int) -> FlightGraph:
+    """
+        Loads the graph of the given timetable version: from the snapshot (`JOURNEYS_SNAPSHOT_PATH`)
+            if it was saved at that version, otherwise from the database, saving it as the new snapshot.
+    """
+    path = settings.JOURNEYS_SNAPSHOT_PATH
+    with stage('fetch'):
+        if path and read_snapshot_version(path) == version:
+            try:
+                return FlightGraph.from_snapshot(path)
+            except (OSError, ValueError):
+                logger.exception('Invalid timetable snapshot %s, loading the timetable from the database.', path)
+        # Before the timetable, so a snapshot of rows changed while loading it doesn't look current.
+        fingerprint = get_timetable_fingerprint()
+        graph = FlightGraph.from_queryset()
+    graph.version = version
+    graph.fingerprint = fingerprint
+    if path:
+        try:
+            graph.save_snapshot(path)
+        except OSError:
+            logger.exception('Could not save the timetable snapshot %s.', path)
+    return graph
+
+
+def check_timetable():
+    """
+        Invalidates the timetable, the cached searches and the city registry of this process if the
+            fingerprint of the database changed since it last saw it, checking it at most every
+            `JOURNEYS_TIMETABLE_CHECK_INTERVAL` seconds. Only with a cache that isn't shared between processes.
+        ---
+        That's a change made by a process whose version bumps don't reach this one (e.g. `import_timetable`
+        with the in-process cache), as well as the rows added or deleted by this one, which invalidate all
+        its searches then (not only the ones of their days).
+    """
+    global _fingerprint, _fingerprint_checked_at
+    now = time.monotonic()
+    if not uses_process_cache() or now - _fingerprint_checked_at < settings.JOURNEYS_TIMETABLE_CHECK_INTERVAL:
+        return
+    _fingerprint_checked_at = now
+    fingerprint = get_timetable_fingerprint()
+    if _fingerprint is not None and fingerprint != _fingerprint:
+        logger.info('The timetable changed in the database, invalidating it.')
+        invalidate_flight_graph()
+        bump_versions([GLOBAL_SCOPE])
+        invalidate_city_registry()
+    _fingerprint = fingerprint
+
+
+async def acheck_timetable():
+    """
+        Async version of `check_timetable`: the (throttled) check runs in a thread, not to block the event loop.
+    """
+    if uses_process_cache() and (
+        time.monotonic() - _fingerprint_checked_at >= settings.JOURNEYS_TIMETABLE_CHECK_INTERVAL
+    ):
+        await sync_to_async(check_timetable)()
+
+
+def get_flight_graph() -> FlightGraph:
+    """
+        Returns the process-wide graph, (re)loading it if the timetable changed since it was loaded
+            (by this process or any other one, see `check_timetable`).
+    """
+    global _graph
+    check_timetable()
+    version = get_timetable_version()
+    graph = _graph
+    if graph is None or graph.version != version:
+        with _graph_lock:
+            graph = _graph
+            if graph is None or graph.version != version:
+                generation = _graph_generation
+                graph = load_flight_graph(version)
+                # Don't keep a graph that was invalidated while it was being loaded.
+                if generation == _graph_generation:
+                    _graph = graph
+    return graph
+
+
+async def aget_flight_graph() -> FlightGraph:
+    """
+        Async version of `get_flight_graph`: the (rare) load runs in a thread, not to block the event loop.
+    """
+    await acheck_timetable()
+    graph = _graph
+    if graph is not None:
+        version, = await aget_versions([TIMETABLE_SCOPE])
+        if graph.version == version:
+            return graph
+    return await sync_to_async(get_flight_graph)()
+
+
+def invalidate_flight_graph():
+    """
+        Drops the graph of every process, so their next search reloads it, and the snapshot, so
+            a new worker doesn't start from it.
+        ---
+        A change to existing rows doesn't change the fingerprint (see `get_timetable_fingerprint`):
+        without removing the snapshot, a worker started before any search saved a new one would
+        take it as current.
+    """
+    global _graph, _graph_generation
+    _graph_generation += 1
+    _graph = None
+    bump_versions([TIMETABLE_SCOPE])
+    path = settings.JOURNEYS_SNAPSHOT_PATH
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.exception('Could not remove the outdated timetable snapshot %s.', path)
@@ -0,0 +1,162 @@
+import csv
+import json
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, IO, Iterable, Iterator, List, Set
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.journeys.cache import bump_versions, date_scope
+from apps.journeys.connections import rebuild_connections
+from apps.journeys.graph import invalidate_flight_graph
+from apps.journeys.models import Flight, FlightEvent
+from apps.journeys.registry import get_city_registry
+
+FIELDS = ['flight_number', 'from', 'to', 'departure_time', 'arrival_time']
+FLIGHT_NUMBER = re.compile(r'^[A-Z]{2}\d{4}$')
+MAX_DURATION = timedelta(hours=24)
+
+
+def read_csv(file: IO) -> Iterator[Dict]:
+    return csv.DictReader(file)
+
+
+def read_ndjson(file: IO) -> Iterator[Dict]:
+    for line in file:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield {}
+
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+}
+
+
+def parse_datetime(value) -> datetime:
+    value = datetime.fromisoformat(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+class TimetableImporter:
+    """
+        Imports flight events in chunks: each chunk is validated as a whole, its missing flights
+            are created with one query and its events inserted with another, in a transaction.
+        ---
+        Rows are {flight_number, from, to, departure_time, arrival_time} with ISO 8601 times
+        (naive ones are in the current time zone). Rows that don't pass the `FlightEvent` rules
+        (unknown city, invalid flight number or times, zero or more than 24 hours duration) are
+        rejected and counted by reason.
+        `bulk_create` doesn't send the model signals, so `finish` does their work once for the whole import
+        (or for the chunks imported before one that fails).
+    """
+
+    def __init__(self, batch_size: int = 5000):
+        self.batch_size = batch_size
+        self.cities = get_city_registry()
+        self.flights = dict(Flight.objects.values_list('number', 'id'))
+        self.imported = 0
+        self.rejected = Counter()
+        self.departure_dates: Set = set()
+
+    def run(self, rows: Iterable[Dict]):
+        rows = iter(rows)
+        try:
+            while True:
+                chunk = list(islice(rows, self.batch_size))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
+        finally:
+            # Also when a chunk fails: the previous ones are already committed.
+            self.finish()
+
+    def finish(self):
+        """
+            Invalidates the in-memory timetable and the cached searches of the imported days, and
+                rebuilds the precomputed connections when they are used by the search.
+            ---
+            The invalidation only reaches the processes sharing the cache: the others (e.g. the server,
+            with the in-process cache) see the imported rows on their next check of the database
+            fingerprint (see `graph.check_timetable`).
+        """
+        if not self.imported:
+            return
+        invalidate_flight_graph()
+        bump_versions({date_scope(day) for day in self.departure_dates})
+        if settings.JOURNEYS_SEARCH_ENGINE == 'connections':
+            rebuild_connections()
+
+    def validate_chunk(self, chunk: List[Dict]) -> List[tuple]:
+        """
+            Returns the valid rows as (flight_number, departure_city_id, arrival_city_id, departure_time,
+                arrival_time) tuples, counting the rejected ones.
+        """
+        cities = self.cities.cities
+        valid = []
+        for row in chunk:
+            if not isinstance(row, dict) or any(not isinstance(row.get(field), str) for field in FIELDS):
+                self.rejected['missing fields'] += 1
+                continue
+            flight_number = row['flight_number'].strip().upper()
+            departure_city = cities.get(row['from'].strip().upper())
+            arrival_city = cities.get(row['to'].strip().upper())
+            if not FLIGHT_NUMBER.match(flight_number):
+                self.rejected['invalid flight number'] += 1
+                continue
+            if departure_city is None or arrival_city is None:
+                self.rejected['unknown city'] += 1
+                continue
+            try:
+                departure_time = parse_datetime(row['departure_time'])
+                arrival_time = parse_datetime(row['arrival_time'])
+            except ValueError:
+                self.rejected['invalid time'] += 1
+                continue
+            valid.append((flight_number, departure_city.id, arrival_city.id, departure_time, arrival_time))
+
+        # The same rules as `FlightEvent.clean`, on the whole chunk at once.
+        durations = [arrival_time - departure_time for *_, departure_time, arrival_time in valid]
+        checked = []
+        for row, duration in zip(valid, durations):
+            if duration < timedelta(0):
+                self.rejected['departure after arrival'] += 1
+            elif duration == timedelta(0):
+                self.rejected['zero duration'] += 1
+            elif duration > MAX_DURATION:
+                self.rejected['duration over 24 hours'] += 1
+            else:
+                checked.append(row)
+        return checked
+
+    @transaction.atomic
+    def import_chunk(self, chunk: List[Dict]):
+        rows = self.validate_chunk(chunk)
+
+        missing = {flight_number for flight_number, *_ in rows if flight_number not in self.flights}
+        if missing:
+            Flight.objects.bulk_create([Flight(number=number) for number in missing], ignore_conflicts=True)
+            self.flights.update(Flight.objects.filter(number__in=missing).values_list('number', 'id'))
+
+        FlightEvent.objects.bulk_create([
+            FlightEvent(
+                flight_id=self.flights[flight_number],
+                departure_city_id=departure_city_id,
+                arrival_city_id=arrival_city_id,
+                departure_time=departure_time,
+                arrival_time=arrival_time,
+            )
+            for flight_number, departure_city_id, arrival_city_id, departure_time, arrival_time in rows
+        ])
+        self.imported += len(rows)
+        self.departure_dates.update(timezone.localdate(row[3]) for row in rows)
@@ -0,0 +1,197 @@
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Histogram buckets (upper bounds, inclusive) of each kind of metric.
+DURATION_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+COUNT_BUCKETS = [0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+class RequestMetrics:
+    """
+        What a request spent its time on: DB queries, search stages (in seconds) and the number
+            of results of the search.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.stages: Dict[str, float] = {}
+        self.results: Optional[int] = None
+
+    def server_timing(self, total: float) -> str:
+        metrics = [f'db;dur={self.query_time * 1000:.2f};desc="{self.queries} queries"']
+        metrics += [f'{name};dur={duration * 1000:.2f}' for name, duration in self.stages.items()]
+        if self.results is not None:
+            metrics.append(f'results;desc="{self.results}"')
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+# Metrics of the current request, only set when the instrumentation is enabled.
+_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar('journeys_metrics', default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """
+        Adds the time spent in the block to the given stage of the current request, if instrumented.
+    """
+    metrics = _metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.stages[name] = metrics.stages.get(name, 0.0) + perf_counter() - start
+
+
+def record_results(count: int):
+    """
+        Records the number of results of the search of the current request, if instrumented.
+    """
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics.results = count
+
+
+def record_query(execute, sql, params, many, context):
+    """
+        Database execute wrapper, counting and timing the queries of instrumented requests.
+    """
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_time += perf_counter() - start
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        # The last count is for the values over the last bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> Dict:
+        return {
+            'buckets': [*self.buckets, 'inf'],
+            'counts': self.counts,
+            'count': self.count,
+            'sum': round(self.sum, 3),
+        }
+
+
+_histograms: Dict[str, Dict[str, Histogram]] = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(view: str, metrics: RequestMetrics, total: float):
+    values = [
+        ('total_ms', DURATION_BUCKETS, total * 1000),
+        ('db_ms', DURATION_BUCKETS, metrics.query_time * 1000),
+        ('queries', COUNT_BUCKETS, metrics.queries),
+        *[(f'{name}_ms', DURATION_BUCKETS, duration * 1000) for name, duration in metrics.stages.items()],
+    ]
+    if metrics.results is not None:
+        values.append(('results', COUNT_BUCKETS, metrics.results))
+    with _histograms_lock:
+        histograms = _histograms.setdefault(view, {})
+        for name, buckets, value in values:
+            if name not in histograms:
+                histograms[name] = Histogram(buckets)
+            histograms[name].observe(value)
+
+
+def get_histograms() -> Dict[str, Dict[str, Dict]]:
+    """
+        Returns the histograms of this process, by view name and metric.
+    """
+    with _histograms_lock:
+        return {
+            view: {name: histogram.to_dict() for name, histogram in histograms.items()}
+            for view, histograms in _histograms.items()
+        }
+
+
+def reset_histograms():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class InstrumentationMiddleware:
+    """
+        Records the DB queries, search stages and results of each request, returning them in a
+            `Server-Timing` header and aggregating them in histograms (see `JourneyMetricsAPIView`).
+        ---
+        Opt-in with `JOURNEYS_INSTRUMENTATION`: when disabled, the middleware removes itself and the
+        `stage`/`record_results` calls of the search only read an unset context variable.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.JOURNEYS_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Connections are per thread: record the queries of the existing ones and of the new ones.
+        connection_created.connect(install_query_recorder, dispatch_uid='journeys_instrumentation')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        return self.process_response(request, response, metrics, perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        return self.process_response(request, response, metrics, perf_counter() - start)
+
+    def process_response(self, request, response, metrics: RequestMetrics, total: float):
+        response['Server-Timing'] = metrics.server_timing(total)
+        resolver_match = getattr(request, 'resolver_match', None)
+        observe(resolver_match.view_name if resolver_match else 'unresolved', metrics, total)
+        return response
@@ -0,0 +1,42 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.journeys.graph import (
+    FlightGraph,
+    get_timetable_fingerprint,
+    get_timetable_version,
+    invalidate_flight_graph,
+)
+
+
+class Command(BaseCommand):
+    help = 'Saves the timetable as a binary snapshot, memory-mapped by the workers instead of querying it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=settings.JOURNEYS_SNAPSHOT_PATH,
+            help='Snapshot file (default: JOURNEYS_SNAPSHOT_PATH).',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path:
+            raise CommandError('Set JOURNEYS_SNAPSHOT_PATH or give a --path.')
+
+        start = perf_counter()
+        # A new version, so the workers sharing the cache switch to the new snapshot too. The others (with
+        # the in-process cache) keep their graph, and reload it when the database fingerprint changes.
+        invalidate_flight_graph()
+        version = get_timetable_version()
+        fingerprint = get_timetable_fingerprint()
+        graph = FlightGraph.from_queryset()
+        graph.version = version
+        graph.fingerprint = fingerprint
+        graph.save_snapshot(path)
+        elapsed = perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved a snapshot of {len(graph)} flight events to {path} in {elapsed:.2f}s.'
+        ))
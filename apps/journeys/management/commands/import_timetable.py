@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.journeys.importer import READERS, TimetableImporter
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports flight events from a CSV or NDJSON file with the columns flight_number, from, to, '
+        'departure_time and arrival_time (ISO 8601). Missing flights are created.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - to read from the standard input.')
+        parser.add_argument(
+            '--format',
+            choices=list(READERS),
+            help='Input format (default: guessed from the file extension).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of rows validated and inserted per transaction (default: 5000).',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or Path(path).suffix.lstrip('.').lower()
+        if input_format not in READERS:
+            raise CommandError('Unknown input format, use --format csv or --format ndjson.')
+
+        importer = TimetableImporter(batch_size=options['batch_size'])
+        start = perf_counter()
+        if path == '-':
+            importer.run(READERS[input_format](sys.stdin))
+        else:
+            try:
+                with open(path, newline='', encoding='utf-8-sig') as file:
+                    importer.run(READERS[input_format](file))
+            except OSError as e:
+                raise CommandError(str(e))
+        elapsed = perf_counter() - start
+
+        rejected = sum(importer.rejected.values())
+        rows = importer.imported + rejected
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.imported} flight events in {elapsed:.2f}s '
+            f'({rows / elapsed if elapsed else 0:.0f} rows/s), rejected {rejected}.'
+        ))
+        for reason, count in importer.rejected.most_common():
+            self.stdout.write(f'  {reason}: {count}')
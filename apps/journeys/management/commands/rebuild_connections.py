@@ -0,0 +1,23 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from apps.journeys.connections import rebuild_connections
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the precomputed connections table from all the flight events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of connections inserted per query (default: 1000).',
+        )
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        total = rebuild_connections(batch_size=options['batch_size'])
+        elapsed = perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} connections in {elapsed:.2f}s.'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journeys', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Connection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departure_date', models.DateField()),
+                ('wait_time', models.DurationField()),
+                ('total_duration', models.DurationField()),
+                ('arrival_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='journeys.city')),
+                ('departure_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='journeys.city')),
+                ('first_leg', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='first_leg_connections', to='journeys.flightevent')),
+                ('second_leg', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='second_leg_connections', to='journeys.flightevent')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['departure_city', 'arrival_city', 'departure_date'], name='journeys_co_departu_82545d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('first_leg', 'second_leg'), name='unique_connection')],
+            },
+        ),
+    ]
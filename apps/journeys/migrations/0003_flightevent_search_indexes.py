@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journeys', '0002_connection'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flightevent',
+            index=models.Index(fields=['departure_city', 'departure_time'], name='flightevent_departure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightevent',
+            index=models.Index(fields=['departure_city', 'arrival_city', 'departure_time'], name='flightevent_route_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journeys', '0003_flightevent_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flightevent',
+            index=models.Index(fields=['departure_time', 'id'], name='flightevent_listing_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:10
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journeys', '0004_flightevent_listing_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Schedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departure_time', models.TimeField(help_text='Local time (TIME_ZONE)')),
+                ('duration', models.DurationField()),
+                ('weekdays', models.CharField(default='1234567', help_text='ISO weekdays it operates on (1 = Monday, 7 = Sunday), e.g. 135', max_length=7, validators=[django.core.validators.RegexValidator(message='Weekdays must be digits from 1 (Monday) to 7 (Sunday)', regex='^[1-7]{1,7}$')])),
+                ('valid_from', models.DateField()),
+                ('valid_until', models.DateField()),
+                ('arrival_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='journeys.city')),
+                ('departure_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='journeys.city')),
+                ('flight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='journeys.flight')),
+            ],
+        ),
+    ]
@@ -75,6 +75,15 @@ class FlightEvent(models.Model):
     departure_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='departure_city')
     arrival_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='arrival_city')
 
+    class Meta:
+        indexes = [
+            # Departures from a city in a time range, and the same restricted to a destination.
+            models.Index(fields=['departure_city', 'departure_time'], name='flightevent_departure_idx'),
+            models.Index(fields=['departure_city', 'arrival_city', 'departure_time'], name='flightevent_route_idx'),
+            # Keyset pagination of the listing.
+            models.Index(fields=['departure_time', 'id'], name='flightevent_listing_idx'),
+        ]
+
     def __str__(self):
         return f'{self.flight.number} - {self.departure_city.code} - {self.arrival_city.code}'
 
@@ -90,3 +99,71 @@ class FlightEvent(models.Model):
 
         if self.get_duration() > timedelta(hours=24):
             raise ValidationError('Flight duration cannot exceed 24 hours.')
+
+
+class Schedule(models.Model):
+    """
+        A flight operated on the same route, at the same local time, on some days of the week during
+            a date range. The search expands it into flight events for the days it searches, so a
+            route takes a single row instead of one per day.
+        ---
+        A `FlightEvent` of the same flight departing from the same city on one of those days
+        overrides it on that day (e.g. a delayed or rescheduled operation).
+    """
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE)
+    departure_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+')
+    arrival_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+')
+    departure_time = models.TimeField(help_text='Local time (TIME_ZONE)')
+    duration = models.DurationField()
+    weekdays = models.CharField(
+        max_length=7,
+        default='1234567',
+        help_text='ISO weekdays it operates on (1 = Monday, 7 = Sunday), e.g. 135',
+        validators=[
+            RegexValidator(
+                regex='^[1-7]{1,7}$',
+                message='Weekdays must be digits from 1 (Monday) to 7 (Sunday)',
+            )
+        ]
+    )
+    valid_from = models.DateField()
+    valid_until = models.DateField()
+
+    def __str__(self):
+        return f'{self.flight.number} - {self.departure_city.code} - {self.arrival_city.code} - {self.weekdays}'
+
+    def clean(self):
+        if self.valid_from > self.valid_until:
+            raise ValidationError('Valid from cannot be later than valid until.')
+
+        if self.duration <= timedelta(seconds=0):
+            raise ValidationError('Flight duration must be positive.')
+
+        if self.duration > timedelta(hours=24):
+            raise ValidationError('Flight duration cannot exceed 24 hours.')
+
+
+class Connection(models.Model):
+    """
+        A valid pair of flight events (the second one departs from the arrival city of the first one,
+            after it lands, and the journey lasts at most 24 hours), precomputed to answer
+            2-flight searches with a single indexed query.
+    """
+    first_leg = models.ForeignKey(FlightEvent, on_delete=models.CASCADE, related_name='first_leg_connections')
+    second_leg = models.ForeignKey(FlightEvent, on_delete=models.CASCADE, related_name='second_leg_connections')
+    departure_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+')
+    arrival_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+')
+    departure_date = models.DateField()
+    wait_time = models.DurationField()
+    total_duration = models.DurationField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['departure_city', 'arrival_city', 'departure_date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['first_leg', 'second_leg'], name='unique_connection'),
+        ]
+
+    def __str__(self):
+        return f'{self.first_leg} -> {self.second_leg}'
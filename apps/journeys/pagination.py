@@ -0,0 +1,76 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class FlightEventKeysetPagination(BasePagination):
+    """
+        Keyset pagination of flight events ordered by (departure_time, id).
+        ---
+        The cursor encodes the last (departure_time, id) of the page, and the next page is
+        fetched with `(departure_time, id) > cursor`, so every page costs the same regardless
+        of its position (unlike OFFSET).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    ordering = ('departure_time', 'id')
+
+    @classmethod
+    def is_requested(cls, request) -> bool:
+        return cls.cursor_query_param in request.query_params or cls.page_size_query_param in request.query_params
+
+    def encode_cursor(self, instance) -> str:
+        value = f'{instance.departure_time.isoformat()}|{instance.id}'
+        return urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, cursor: str):
+        try:
+            departure_time, event_id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(departure_time), int(event_id)
+        except ValueError:
+            raise ValidationError('Invalid cursor.')
+
+    def get_page_size(self, request) -> int:
+        page_size = request.query_params.get(self.page_size_query_param, self.page_size)
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise ValidationError(f'Invalid {self.page_size_query_param}. Should be an integer.')
+        if not 1 <= page_size <= self.max_page_size:
+            raise ValidationError(f'Invalid {self.page_size_query_param}. Should be between 1 and {self.max_page_size}.')
+        return page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            departure_time, event_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(departure_time__gt=departure_time) | Q(departure_time=departure_time, id__gt=event_id)
+            )
+
+        # One extra row tells whether there is a next page.
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = self.encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+        return page[:page_size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -0,0 +1,157 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import django
+from django.conf import settings
+
+from apps.journeys.graph import FlightGraph, Journey
+from apps.journeys.utils import Search, search_graph
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+# The graph of a worker process, mapped from the snapshot.
+_worker_graph: Optional[FlightGraph] = None
+
+
+class StaleSnapshotError(Exception):
+    """
+        The snapshot a worker process mapped isn't at the timetable version of the search anymore.
+    """
+
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    """
+        Returns the pool of `JOURNEYS_PARALLEL_WORKERS` processes of this worker, starting it on first use,
+            or None if parallel searches are disabled (they also need `JOURNEYS_SNAPSHOT_PATH`).
+        ---
+        The processes are spawned (forking a process with threads, like the ASGI workers, isn't safe)
+        and map the timetable snapshot, so they share its memory with each other and with the workers.
+    """
+    global _executor
+    workers = settings.JOURNEYS_PARALLEL_WORKERS
+    if not (workers and settings.JOURNEYS_SNAPSHOT_PATH):
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+            )
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+
+
+def get_worker_graph(path: str, version: int) -> FlightGraph:
+    global _worker_graph
+    if _worker_graph is None or _worker_graph.version != version:
+        try:
+            graph = FlightGraph.from_snapshot(path)
+        except FileNotFoundError:
+            # Removed by a timetable change (see `graph.invalidate_flight_graph`).
+            raise StaleSnapshotError(f'The snapshot of version {version} was removed.')
+        if graph.version != version:
+            raise StaleSnapshotError(f'The snapshot is at version {graph.version}, not {version}.')
+        _worker_graph = graph
+    return _worker_graph
+
+
+def search_chunk(path: str, version: int, searches: List[Search]) -> List[bytes]:
+    graph = get_worker_graph(path, version)
+    return [search_graph(graph, search, rendered=True) for search in searches]
+
+
+def calendar_chunk(path: str, version: int, arguments: Tuple) -> List[Tuple[int, Optional[Journey]]]:
+    return get_worker_graph(path, version).calendar(*arguments)
+
+
+def split(items: Sequence, parts: int) -> List[Sequence]:
+    """
+        Splits the items in up to `parts` contiguous chunks of (almost) the same size.
+    """
+    size, extra = divmod(len(items), parts)
+    chunks = []
+    start = 0
+    for part in range(parts):
+        end = start + size + (part < extra)
+        if end > start:
+            chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def runs_in_parallel(searches: int) -> bool:
+    return bool(settings.JOURNEYS_PARALLEL_WORKERS) and searches >= max(settings.JOURNEYS_PARALLEL_MIN_SEARCHES, 1)
+
+
+def run_parallel(graph: FlightGraph, function: Callable, chunks: List) -> Optional[List]:
+    """
+        Runs `function(path, version, chunk)` for every chunk in the worker processes, and returns
+            their results in the order of the chunks, or None if they can't run them (disabled,
+            a graph that isn't the timetable's, or an outdated snapshot).
+    """
+    executor = get_executor()
+    if executor is None or graph.version is None:
+        return None
+    path = settings.JOURNEYS_SNAPSHOT_PATH
+    try:
+        futures = [executor.submit(function, path, graph.version, chunk) for chunk in chunks]
+        return [future.result() for future in futures]
+    except StaleSnapshotError:
+        logger.warning('The timetable snapshot %s is outdated, searching in-process.', path)
+    except BrokenProcessPool:
+        logger.exception('The search processes died, searching in-process.')
+        shutdown_executor()
+    return None
+
+
+def parallel_searches(graph: FlightGraph, searches: List[Search]) -> Optional[List[bytes]]:
+    """
+        Runs the searches (rendered as JSON) across the worker processes, or returns None if there are
+            less than `JOURNEYS_PARALLEL_MIN_SEARCHES` of them (not worth the IPC) or they can't run them.
+        ---
+        Each process gets a contiguous chunk of the searches, and the results are merged back in order.
+    """
+    if not runs_in_parallel(len(searches)):
+        return None
+    chunks = split(searches, settings.JOURNEYS_PARALLEL_WORKERS)
+    results = run_parallel(graph, search_chunk, chunks)
+    return None if results is None else [result for chunk in results for result in chunk]
+
+
+def parallel_calendar(
+    graph: FlightGraph,
+    from_city: str,
+    to_city: str,
+    boundaries: List[int],
+    max_wait: int,
+    max_legs: int,
+) -> Optional[List[Tuple[int, Optional[Journey]]]]:
+    """
+        Same summary as `FlightGraph.calendar`, with each worker process sweeping a contiguous range of days,
+            or None if there are less than `JOURNEYS_PARALLEL_MIN_SEARCHES` days or they can't run it.
+        ---
+        Paths only dominate the ones departing on the same day, so splitting by day gives the same result.
+        Timetables with schedules are searched in-process: the journeys of each process would be events
+        of its own expanded graph (see `FlightGraph.expand_schedules`).
+    """
+    days = len(boundaries) - 1
+    if graph.schedules or not runs_in_parallel(days):
+        return None
+    chunks = [
+        (from_city, to_city, boundaries[day_range.start:day_range.stop + 1], max_wait, max_legs)
+        for day_range in split(range(days), settings.JOURNEYS_PARALLEL_WORKERS)
+    ]
+    results = run_parallel(graph, calendar_chunk, chunks)
+    return None if results is None else [day for chunk in results for day in chunk]
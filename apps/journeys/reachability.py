@@ -0,0 +1,77 @@
+from datetime import timedelta
+from typing import Dict, List
+
+from apps.journeys.cache import cached_search
+from apps.journeys.graph import MAX_JOURNEY_DURATION, check_timetable, get_flight_graph
+from apps.journeys.instrumentation import record_results, stage
+from apps.journeys.utils import get_day_range
+
+
+def get_reachable(
+    date: str,
+    from_city: str,
+    max_wait_time_hours: int = 4,
+    max_connections: int = 2,
+) -> List[Dict]:
+    """
+        Searches every city reachable from an origin with a journey departing on a given date, and
+            the best journey to each one.
+        ---
+        Parameters:
+            - date: Departure date in 'YYYY-MM-DD' format
+            - from_city: Origin city code (3 letters)
+            - max_wait_time_hours: Max. connection time allowed between flights
+            - max_connections: Max. number of flights per journey (2 by default)
+
+        Returns:
+            A list with one item per reachable city, by arrival time (then by city code):
+            {
+                "to": str,
+                "legs": int,
+                "arrival_time": str,
+                "journey": journey (in the format returned by `parse_journey`)
+            }
+            The journey is the one arriving first, as `/journeys/search` with `sort=arrival` and `limit=1`.
+
+        All the cities are searched at once, in a single sweep of the in-memory graph from the origin,
+        instead of one search per destination.
+    """
+    day, end = get_day_range(date)
+    from_city = from_city.upper()
+    max_wait_time = timedelta(hours=int(max_wait_time_hours))
+    max_legs = int(max_connections)
+
+    parts = ['reachable', day.date(), from_city, int(max_wait_time.total_seconds()), max_legs]
+    check_timetable()
+    return cached_search(
+        day.date(),
+        parts,
+        lambda: find_reachable(int(day.timestamp()), int(end.timestamp()), from_city, max_wait_time, max_legs),
+    )
+
+
+def find_reachable(start: int, end: int, from_city: str, max_wait_time: timedelta, max_legs: int) -> List[Dict]:
+    """
+        Uncached search behind `get_reachable`, with normalized parameters.
+    """
+    graph = get_flight_graph()
+    with stage('pairing'):
+        graph = graph.expand_schedules(start, end + MAX_JOURNEY_DURATION)
+        reachable = graph.reachable(from_city, start, end, int(max_wait_time.total_seconds()), max_legs)
+    record_results(len(reachable))
+
+    city_codes = graph.city_codes
+    arrival_times = graph.arrival_times
+    cities = sorted(reachable, key=lambda city: (arrival_times[reachable[city][-1]], city_codes[city]))
+    journeys = [reachable[city] for city in cities]
+    with stage('parse'):
+        parsed = graph.parse(journeys)
+    return [
+        {
+            'to': city_codes[city],
+            'legs': len(journey),
+            'arrival_time': graph.format_time(arrival_times[journey[-1]]),
+            'journey': parsed_journey,
+        }
+        for city, journey, parsed_journey in zip(cities, journeys, parsed)
+    ]
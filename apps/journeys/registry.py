@@ -0,0 +1,92 @@
+import threading
+from typing import Dict, NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+
+from apps.journeys.cache import aget_versions, bump_versions, get_versions
+from apps.journeys.models import City
+
+# Scope of the version bumped when a city or a country changes.
+CITIES_SCOPE = 'cities'
+
+
+class RegisteredCity(NamedTuple):
+    id: int
+    code: str
+    country_code: str
+
+
+class CityRegistry:
+    """
+        Process-wide map of city codes to their id and country, so validating and searching
+            cities doesn't need any query.
+        ---
+        It is tagged with the version of the cities scope it was loaded at (see `cache.get_versions`),
+        so a change made by any worker (which bumps that version) is seen by all of them.
+    """
+
+    def __init__(self, cities: Dict[str, RegisteredCity], version: Optional[int] = None):
+        self.cities = cities
+        self.version = version
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.cities
+
+    def __len__(self):
+        return len(self.cities)
+
+    def get(self, code: str) -> Optional[RegisteredCity]:
+        return self.cities.get(code)
+
+    def get_id(self, code: str) -> Optional[int]:
+        city = self.cities.get(code)
+        return None if city is None else city.id
+
+    @classmethod
+    def load(cls, version: Optional[int] = None) -> 'CityRegistry':
+        return cls(
+            {
+                code: RegisteredCity(city_id, code, country_code)
+                for city_id, code, country_code in City.objects.values_list('id', 'code', 'country__code')
+            },
+            version,
+        )
+
+
+_registry: Optional[CityRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_city_registry() -> CityRegistry:
+    """
+        Returns the process-wide registry, (re)loading it if the cities changed since it was loaded.
+    """
+    global _registry
+    version, = get_versions([CITIES_SCOPE])
+    registry = _registry
+    if registry is None or registry.version != version:
+        with _registry_lock:
+            registry = _registry
+            if registry is None or registry.version != version:
+                registry = _registry = CityRegistry.load(version)
+    return registry
+
+
+async def aget_city_registry() -> CityRegistry:
+    """
+        Async version of `get_city_registry`: the (rare) load runs in a thread.
+    """
+    version, = await aget_versions([CITIES_SCOPE])
+    registry = _registry
+    if registry is None or registry.version != version:
+        registry = await sync_to_async(get_city_registry)()
+    return registry
+
+
+def invalidate_city_registry():
+    """
+        Drops the registry of every process.
+    """
+    global _registry
+    _registry = None
+    bump_versions([CITIES_SCOPE])
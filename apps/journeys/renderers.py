@@ -0,0 +1,123 @@
+import json
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data) -> bytes:
+    """
+        Compact JSON, as rendered by DRF's `JSONRenderer`, with `orjson` when it's installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+
+
+def render_leg(flight_number: str, from_city: str, to_city: str, departure_time: str, arrival_time: str) -> bytes:
+    # Same keys and order as `FlightEventSerializer` (sorted, with `_from` renamed to `from`).
+    return dumps({
+        'arrival_time': arrival_time,
+        'departure_time': departure_time,
+        'flight_number': flight_number,
+        'from': from_city,
+        'to': to_city,
+    })
+
+
+def render_journey(connections: int, legs: Iterable[bytes]) -> bytes:
+    return b'{"connections":%d,"path":[%s]}' % (connections, b','.join(legs))
+
+
+def render_journeys(journeys: List[Dict]) -> bytes:
+    """
+        Renders journeys in the format returned by `utils.parse_journey` to the same bytes as
+            `JSONRenderer().render(Journeys(journeys, many=True).data)`, without DRF's field machinery.
+    """
+    return b'[%s]' % b','.join(
+        render_journey(
+            journey['connections'],
+            (
+                render_leg(leg['flight_number'], leg['_from'], leg['to'], leg['departure_time'], leg['arrival_time'])
+                for leg in journey['path']
+            )
+        )
+        for journey in journeys
+    )
+
+
+def compact_journeys(journeys: List[Dict]) -> Dict:
+    """
+        Converts journeys in the format returned by `utils.parse_journey` to the compact format: the
+            distinct legs, column by column, and each journey as the list of the indexes of its legs.
+        ---
+        {
+            "legs": {"flight_number": [...], "from": [...], "to": [...], "departure_time": [...], "arrival_time": [...]},
+            "journeys": [[int, ...], ...]
+        }
+        A leg shared by several journeys is only sent once. The number of connections of a journey is
+        0 for a direct flight, the number of legs otherwise.
+    """
+    columns = {'flight_number': [], 'from': [], 'to': [], 'departure_time': [], 'arrival_time': []}
+    indexes = {}
+    compact = []
+    for journey in journeys:
+        legs = []
+        for leg in journey['path']:
+            key = (leg['flight_number'], leg['_from'], leg['to'], leg['departure_time'], leg['arrival_time'])
+            index = indexes.get(key)
+            if index is None:
+                index = indexes[key] = len(indexes)
+                for column, value in zip(columns.values(), key):
+                    column.append(value)
+            legs.append(index)
+        compact.append(legs)
+    return {'legs': columns, 'journeys': compact}
+
+
+class CompactJSONRenderer(BaseRenderer):
+    """
+        Compact columnar JSON of search results (see `compact_journeys`), for bandwidth-bound clients.
+    """
+    media_type = 'application/vnd.airlink.compact+json'
+    format = 'compact'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+        Newline delimited JSON: one compact JSON document per line.
+        A list is rendered as one line per item; anything else as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    @staticmethod
+    def render_line(item) -> bytes:
+        return json.dumps(item, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, list):
+            return b''.join(self.render_line(item) for item in data)
+        return self.render_line(data)
+
+    def stream(self, items: Iterable) -> Iterable[bytes]:
+        for item in items:
+            yield self.render_line(item)
+
+    async def astream(self, items: AsyncIterable) -> AsyncIterator[bytes]:
+        async for item in items:
+            yield self.render_line(item)
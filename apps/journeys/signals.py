@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.journeys.cache import GLOBAL_SCOPE, bump_versions, date_scope
+from apps.journeys.connections import update_connections
+from apps.journeys.graph import invalidate_flight_graph
+from apps.journeys.models import City, Country, Flight, FlightEvent, Schedule
+from apps.journeys.registry import invalidate_city_registry
+
+
+@receiver(post_save, sender=FlightEvent)
+@receiver(post_delete, sender=FlightEvent)
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+def timetable_changed(sender, **kwargs):
+    """
+        Invalidates the in-memory timetable whenever an event, flight, city or schedule changes.
+        It is invalidated again on commit, in case a search reloaded it before the
+            transaction was visible.
+    """
+    invalidate_flight_graph()
+    transaction.on_commit(invalidate_flight_graph)
+
+
+@receiver(post_save, sender=FlightEvent)
+def flight_event_saved(sender, instance, **kwargs):
+    """
+        Keeps the precomputed connections up to date when they are used by the search.
+        Deleted events take their connections with them (cascade).
+    """
+    if settings.JOURNEYS_SEARCH_ENGINE == 'connections':
+        update_connections(instance)
+
+
+@receiver(pre_save, sender=FlightEvent)
+def flight_event_saving(sender, instance, raw=False, **kwargs):
+    # Remember the departure time being replaced, its day is affected by the change too.
+    instance._previous_departure_time = None
+    if instance.pk and not raw:
+        instance._previous_departure_time = (
+            FlightEvent.objects.filter(pk=instance.pk).values_list('departure_time', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=FlightEvent)
+@receiver(post_delete, sender=FlightEvent)
+def flight_event_changed(sender, instance, **kwargs):
+    """
+        Invalidates the cached searches of the days the event departs (or departed) on.
+        They are invalidated again on commit, in case a search cached them before the transaction was visible.
+    """
+    departure_times = [instance.departure_time, getattr(instance, '_previous_departure_time', None)]
+    scopes = {
+        date_scope(timezone.localdate(departure_time))
+        for departure_time in departure_times
+        if departure_time is not None
+    }
+    bump_versions(scopes)
+    transaction.on_commit(lambda: bump_versions(scopes))
+
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+def flight_or_city_changed(sender, **kwargs):
+    """
+        Flight numbers and city codes are part of every result, so all the cached searches are invalidated.
+        So are they when a schedule changes, as it can operate on any day.
+        They are invalidated again on commit, in case a search cached them before the transaction was visible.
+    """
+    bump_versions([GLOBAL_SCOPE])
+    transaction.on_commit(lambda: bump_versions([GLOBAL_SCOPE]))
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def city_or_country_changed(sender, **kwargs):
+    """
+        Reloads the city registry, in this process now and in the others on their next request.
+        It is invalidated again on commit, in case a request reloaded it before the transaction was visible.
+    """
+    invalidate_city_registry()
+    transaction.on_commit(invalidate_city_registry)
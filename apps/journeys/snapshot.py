@@ -0,0 +1,120 @@
+import json
+import mmap
+import os
+import sys
+import tempfile
+from array import array
+from typing import Dict, Optional, Tuple
+
+MAGIC = b'ALTTSNAP'
+FORMAT = 3
+# Array columns of the graph, stored as native 64-bit integers.
+COLUMNS = [
+    'event_ids',
+    'event_flights',
+    'departure_cities',
+    'arrival_cities',
+    'departure_times',
+    'arrival_times',
+    'adj_offsets',
+    'adj_events',
+    'adj_times',
+]
+ITEM_SIZE = 8
+
+
+def write_snapshot(graph, path: str, version: int):
+    """
+        Saves a `FlightGraph`, tagged with the timetable version and fingerprint it was loaded at, as a
+            binary file that `FlightGraph.from_snapshot` maps into memory instead of querying the database.
+        ---
+        Layout: `MAGIC`, the length of the JSON header (8 bytes, little-endian), the header (format,
+        version, fingerprint, cities, flight numbers, schedules, and the offset and length of each column),
+        then the columns, aligned to 8 bytes (offsets are relative to the end of the header, aligned too).
+        The file is replaced atomically, so readers never see a partial one.
+    """
+    columns = [array('q', getattr(graph, name)).tobytes() for name in COLUMNS]
+    offsets = {}
+    offset = 0
+    for name, column in zip(COLUMNS, columns):
+        offsets[name] = [offset, len(column) // ITEM_SIZE]
+        offset = align(offset + len(column))
+    header = json.dumps({
+        'format': FORMAT,
+        'byteorder': sys.byteorder,
+        'version': version,
+        'fingerprint': graph.fingerprint,
+        'city_ids': graph.city_ids,
+        'city_codes': graph.city_codes,
+        'flight_numbers': graph.flight_numbers,
+        'schedules': list(graph.schedules),
+        'columns': offsets,
+    }).encode()
+    data_start = align(len(MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(MAGIC)
+            file.write(len(header).to_bytes(8, 'little'))
+            file.write(header)
+            for name, column in zip(COLUMNS, columns):
+                file.seek(data_start + offsets[name][0])
+                file.write(column)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def align(offset: int) -> int:
+    return (offset + ITEM_SIZE - 1) // ITEM_SIZE * ITEM_SIZE
+
+
+def read_header(file) -> Dict:
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a timetable snapshot.')
+    size = int.from_bytes(file.read(8), 'little')
+    header = json.loads(file.read(size))
+    if header['format'] != FORMAT or header['byteorder'] != sys.byteorder:
+        raise ValueError('Incompatible timetable snapshot.')
+    header['data_start'] = align(len(MAGIC) + 8 + size)
+    return header
+
+
+def read_snapshot_header(path: str) -> Optional[Dict]:
+    """
+        Returns the header of the snapshot, or None if there isn't a valid one.
+    """
+    try:
+        with open(path, 'rb') as file:
+            return read_header(file)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def read_snapshot_version(path: str) -> Optional[int]:
+    """
+        Returns the timetable version of the snapshot, or None if there isn't a valid one.
+    """
+    header = read_snapshot_header(path)
+    return None if header is None else header['version']
+
+
+def read_snapshot(path: str) -> Tuple[Dict, Dict[str, memoryview]]:
+    """
+        Returns the header and the columns of the snapshot. Columns are backed by a read-only memory
+            map of the file, so the processes reading the same snapshot share its pages (OS page cache).
+    """
+    with open(path, 'rb') as file:
+        header = read_header(file)
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(buffer)
+    start = header['data_start']
+    columns = {
+        name: view[start + offset:start + offset + length * ITEM_SIZE].cast('q')
+        for name, (offset, length) in header['columns'].items()
+    }
+    return header, columns
@@ -1,9 +1,19 @@
 from django.urls import path
 
 from apps.journeys.views import (
+    AsyncJourneyView,
     JourneyAPIView,
+    JourneyBatchAPIView,
+    JourneyCalendarAPIView,
+    JourneyMetricsAPIView,
+    JourneyReachableAPIView,
 )
 
 urlpatterns = [
     path('search', JourneyAPIView.as_view(), name='journey-search'),
+    path('search/batch', JourneyBatchAPIView.as_view(), name='journey-search-batch'),
+    path('search/calendar', JourneyCalendarAPIView.as_view(), name='journey-search-calendar'),
+    path('search/reachable', JourneyReachableAPIView.as_view(), name='journey-search-reachable'),
+    path('search/async', AsyncJourneyView.as_view(), name='journey-search-async'),
+    path('metrics', JourneyMetricsAPIView.as_view(), name='journey-metrics'),
 ]
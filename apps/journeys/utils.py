@@ -1,9 +1,31 @@
-from datetime import datetime, timedelta
+from datetime import date as Date, datetime, timedelta
 
-from typing import List, Dict
+from typing import List, Dict, NamedTuple, Optional, Union
+from django.conf import settings
 from django.utils import timezone
 
+from apps.journeys import connections
+from apps.journeys.cache import acached_search, cached_search
+from apps.journeys.graph import (
+    MAX_JOURNEY_DURATION,
+    FlightGraph,
+    acheck_timetable,
+    aget_flight_graph,
+    check_timetable,
+    get_flight_graph,
+)
+from apps.journeys.instrumentation import record_results, stage
 from apps.journeys.models import FlightEvent
+from apps.journeys.renderers import render_journeys
+
+# Optional time constraints of a search, 'HH:MM' (on the search date) or 'YYYY-MM-DD HH:MM', and
+# whether the search date is the one of the departure (default) or of the arrival (`ANCHORS`).
+TIME_FILTERS = ['depart_after', 'depart_before', 'arrive_by', 'anchor']
+ANCHORS = ['departure', 'arrival']
+# Orders of the search results (see `FlightGraph.search`).
+SORTS = ['departure', 'arrival', 'duration', 'connections']
+# Optional order and max. number of the search results.
+RESULT_OPTIONS = ['sort', 'limit']
 
 
 def parse_journey(journeys: List[List[FlightEvent]]) -> List[Dict]:
@@ -47,9 +69,58 @@ def parse_journey(journeys: List[List[FlightEvent]]) -> List[Dict]:
     return parsed_journeys
 
 
-def get_journeys(date: str, from_city: str, to_city: str, max_wait_time_hours: int) -> List[FlightEvent]:
+def get_day_range(date: str):
+    """
+        Returns the given day ('YYYY-MM-DD') as a half-open range `[start, end)` of aware datetimes,
+            so filters on `departure_time` can use its indexes (unlike `departure_time__date`).
+    """
+    day = datetime.strptime(date, '%Y-%m-%d')
+    return timezone.make_aware(day), timezone.make_aware(day + timedelta(days=1))
+
+
+def parse_time(value: str, date: str) -> datetime:
+    """
+        Returns a time given as 'HH:MM' (on the given date) or 'YYYY-MM-DD HH:MM', as an aware datetime.
     """
-        Searches for "journeys" (sequences of 1 or 2 flight events) connecting
+    if ' ' not in value:
+        value = f'{date} {value}'
+    return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d %H:%M'))
+
+
+class Search(NamedTuple):
+    """
+        Normalized parameters of a search (see `normalize_search`).
+    """
+    day: Date
+    # Departure window of the first flight, half-open.
+    start_date: datetime
+    end_date: datetime
+    from_city: str
+    to_city: str
+    max_wait_time: timedelta
+    max_legs: int
+    arrive_by: Optional[datetime] = None
+    sort: Optional[str] = None
+    limit: Optional[int] = None
+    arrive_after: Optional[datetime] = None
+
+
+def get_journeys(
+    date: str,
+    from_city: str,
+    to_city: str,
+    max_wait_time_hours: int,
+    max_connections: int = 2,
+    rendered: bool = False,
+    depart_after: Optional[str] = None,
+    depart_before: Optional[str] = None,
+    arrive_by: Optional[str] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    anchor: Optional[str] = None,
+) -> Union[List[Dict], bytes]:
+    """
+        Searches for "journeys" (sequences of 1 to `max_connections` flight events) connecting
             an origin with a destination, departing on a given date.
         ---
         Parameters:
@@ -57,54 +128,229 @@ def get_journeys(date: str, from_city: str, to_city: str, max_wait_time_hours: i
             - from_city: Origin city code (3 letters)
             - to_city: Destination city code (3 letters)
             - max_wait_time_hours: Max. connection time allowed between flights
+            - max_connections: Max. number of flights per journey (2 by default)
+            - rendered: Whether to return the journeys rendered as JSON
+            - depart_after, depart_before: Departure window of the first flight within the date,
+                as 'HH:MM' or 'YYYY-MM-DD HH:MM' (`depart_after` included, `depart_before` excluded)
+            - arrive_by: Latest arrival of the last flight, as 'HH:MM' (on the date) or 'YYYY-MM-DD HH:MM'
+            - sort: Order of the journeys, by 'departure', 'arrival', 'duration' or 'connections' (ties
+                are sorted by number of flights, then by flight event ids). By number of flights by default.
+            - limit: Max. number of journeys, the first ones in that order
+            - anchor: 'arrival' to search the journeys arriving on the date instead (departing up to
+                24 hours before), 'departure' by default
 
         Returns:
-            A list of journeys, where each journey is a list of `FlightEvent`.
+            A list of journeys, in the format returned by `parse_journey`, or its JSON (bytes)
+                if `rendered`, the same as rendering it through the `Journeys` serializer.
+    """
+    search = normalize_search(
+        date,
+        from_city,
+        to_city,
+        max_wait_time_hours,
+        max_connections,
+        depart_after,
+        depart_before,
+        arrive_by,
+        sort,
+        limit,
+        anchor,
+    )
+    check_timetable()
+    return cached_search(search.day, search_key_parts(search, rendered), lambda: find_journeys(search, rendered))
+
+
+async def aget_journeys(
+    date: str,
+    from_city: str,
+    to_city: str,
+    max_wait_time_hours: int,
+    max_connections: int = 2,
+    rendered: bool = False,
+    depart_after: Optional[str] = None,
+    depart_before: Optional[str] = None,
+    arrive_by: Optional[str] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    anchor: Optional[str] = None,
+) -> Union[List[Dict], bytes]:
+    """
+        Async version of `get_journeys`, sharing its cache.
     """
-    # Data normalization
-    start_date = timezone.make_aware(
-        datetime.strptime(date, '%Y-%m-%d')
+    search = normalize_search(
+        date,
+        from_city,
+        to_city,
+        max_wait_time_hours,
+        max_connections,
+        depart_after,
+        depart_before,
+        arrive_by,
+        sort,
+        limit,
+        anchor,
+    )
+    await acheck_timetable()
+    return await acached_search(
+        search.day, search_key_parts(search, rendered), lambda: afind_journeys(search, rendered)
     )
-    from_city = from_city.upper()
-    to_city = to_city.upper()
-    max_wait_time = timedelta(hours=int(max_wait_time_hours))
-    journeys = []
-
-    # 1. We look for all events departing on the given date from the origin city.
-    initial_flights = FlightEvent.objects.filter(
-        departure_time__date=start_date,
-        departure_city__code=from_city
+
+
+def normalize_search(
+    date: str,
+    from_city: str,
+    to_city: str,
+    max_wait_time_hours: int,
+    max_connections: int,
+    depart_after: Optional[str] = None,
+    depart_before: Optional[str] = None,
+    arrive_by: Optional[str] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    anchor: Optional[str] = None,
+) -> Search:
+    start_date, end_date = get_day_range(date)
+    arrive_by = parse_time(arrive_by, date) if arrive_by else None
+    arrive_after = None
+    if anchor == 'arrival':
+        # Journeys arriving on the date depart on it or up to 24 hours before.
+        arrive_after = start_date
+        arrive_by = min(arrive_by or end_date, end_date - timedelta(seconds=1))
+        start_date -= timedelta(seconds=MAX_JOURNEY_DURATION)
+    day = timezone.localdate(start_date)
+    if depart_after:
+        start_date = max(start_date, parse_time(depart_after, date))
+    if depart_before:
+        end_date = min(end_date, parse_time(depart_before, date))
+    return Search(
+        day,
+        start_date,
+        end_date,
+        from_city.upper(),
+        to_city.upper(),
+        timedelta(hours=int(max_wait_time_hours)),
+        int(max_connections),
+        arrive_by,
+        sort or None,
+        int(limit) if limit else None,
+        arrive_after,
     )
 
-    # 2. Direct flights: events going from origin to destination.
-    direct_flights = initial_flights.filter(arrival_city__code=to_city)
-    for flight in direct_flights:
-        if flight.get_duration() <= timedelta(hours=24):
-            journeys.append([flight])
-
-    """
-        3. Connecting flights: for each flight departing from 'from_city' and NOT going directly to the destination,
-            we look for a second flight that meets the connection conditions.
-        Direct flights are excluded to avoid duplicates.
-    """
-    connecting_flights = initial_flights.exclude(arrival_city__code=to_city)
-    for flight1 in connecting_flights:
-        """
-            We look for flights where:
-                - The second flight departs from the arrival city of the first flight.
-                - The second flight arrives at the destination city.
-                - The second flight departs after the arrival of the first one.
-        """
-        potential_connections = FlightEvent.objects.filter(
-            departure_city=flight1.arrival_city,
-            arrival_city__code=to_city,
-            departure_time__gt=flight1.arrival_time,
+
+def search_key_parts(search: Search, rendered: bool) -> List:
+    return [
+        'json' if rendered else 'list',
+        search.day,
+        int(search.start_date.timestamp()),
+        int(search.end_date.timestamp()),
+        search.from_city,
+        search.to_city,
+        int(search.max_wait_time.total_seconds()),
+        search.max_legs,
+        int(search.arrive_by.timestamp()) if search.arrive_by else '',
+        search.sort or '',
+        search.limit or '',
+        int(search.arrive_after.timestamp()) if search.arrive_after else '',
+    ]
+
+
+def find_journeys(search: Search, rendered: bool = False) -> Union[List[Dict], bytes]:
+    """
+        Uncached search behind `get_journeys`, with normalized parameters.
+    """
+    if search.start_date >= search.end_date:
+        # Empty departure window.
+        return parse_connections([], rendered)
+
+    if (
+        settings.JOURNEYS_SEARCH_ENGINE == 'connections'
+        and search.max_legs == 2
+        and not connections.schedules_in(search.start_date, search.end_date).exists()
+    ):
+        # Direct flights and precomputed connections, one indexed query each (the table doesn't include
+        # the schedules, searches they apply to run on the graph).
+        journeys = connections.find_journeys(
+            search.start_date,
+            search.end_date,
+            search.from_city,
+            search.to_city,
+            search.max_wait_time,
+            search.arrive_by,
+            search.sort,
+            search.limit,
+            arrive_after=search.arrive_after,
+        )
+        return parse_connections(journeys, rendered)
+
+    return search_graph(get_flight_graph(), search, rendered)
+
+
+async def afind_journeys(search: Search, rendered: bool = False) -> Union[List[Dict], bytes]:
+    """
+        Async version of `find_journeys`.
+    """
+    if search.start_date >= search.end_date:
+        return parse_connections([], rendered)
+
+    if (
+        settings.JOURNEYS_SEARCH_ENGINE == 'connections'
+        and search.max_legs == 2
+        and not await connections.schedules_in(search.start_date, search.end_date).aexists()
+    ):
+        journeys = await connections.afind_journeys(
+            search.start_date,
+            search.end_date,
+            search.from_city,
+            search.to_city,
+            search.max_wait_time,
+            search.arrive_by,
+            search.sort,
+            search.limit,
+            arrive_after=search.arrive_after,
+        )
+        return parse_connections(journeys, rendered)
+
+    return search_graph(await aget_flight_graph(), search, rendered)
+
+
+def parse_connections(journeys: List[List[FlightEvent]], rendered: bool = False) -> Union[List[Dict], bytes]:
+    record_results(len(journeys))
+    with stage('parse'):
+        journeys = parse_journey(journeys)
+    if not rendered:
+        return journeys
+    with stage('serialize'):
+        return render_journeys(journeys)
+
+
+def search_graph(graph: FlightGraph, search: Search, rendered: bool = False) -> Union[List[Dict], bytes]:
+    """
+        The search runs on the in-memory timetable graph: direct flights departing in the window,
+            then connections departing from the arrival city of the previous flight after it lands,
+            within the max. wait time, a total duration of 24 hours and the arrival deadline.
+        Schedules are expanded for the days the journeys can depart on.
+    """
+    start = int(search.start_date.timestamp())
+    end = int(search.end_date.timestamp())
+    with stage('pairing'):
+        graph = graph.expand_schedules(start, end + MAX_JOURNEY_DURATION)
+        journeys = graph.search(
+            search.from_city,
+            search.to_city,
+            start,
+            end,
+            int(search.max_wait_time.total_seconds()),
+            search.max_legs,
+            int(search.arrive_by.timestamp()) if search.arrive_by else None,
+            search.sort,
+            search.limit,
+            int(search.arrive_after.timestamp()) if search.arrive_after else None,
+            bidirectional=0 < settings.JOURNEYS_BIDIRECTIONAL_MIN_LEGS <= search.max_legs,
         )
-        for flight2 in potential_connections:
-            wait_time = flight2.departure_time - flight1.arrival_time
-            total_duration = flight2.arrival_time - flight1.departure_time
-            if wait_time <= max_wait_time and total_duration <= timedelta(hours=24):
-                journeys.append([flight1, flight2])
-    # journeys = sorted(journeys, key=lambda journey: journey[0].departure_time)
-
-    return parse_journey(journeys)
+    record_results(len(journeys))
+    # Rendering straight from the graph reuses the JSON of each leg across searches.
+    if rendered:
+        with stage('serialize'):
+            return graph.render(journeys)
+    with stage('parse'):
+        return graph.parse(journeys)
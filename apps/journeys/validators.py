@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
-from datetime import datetime
+from datetime import date as Date, datetime, timedelta
 
-from apps.journeys.models import City
+from apps.journeys.registry import aget_city_registry, get_city_registry
+from apps.journeys.utils import ANCHORS, SORTS
 
 
 def validate_date_format(date, format: str = '%Y-%m-%d'):
@@ -10,9 +12,102 @@ def validate_date_format(date, format: str = '%Y-%m-%d'):
         datetime.strptime(date, format)
     except ValueError:
         raise ValidationError(f'Invalid date format. Should be {format}.')
+    validate_date_range(date)
 
 
-def validate_city(city_code: str):
+def validate_date_range(date: str, window: int = 0):
+    """
+        Checks the days a search around the date looks at (`window` days before and after it, and the
+            days before and after those, for journeys arriving on another day) are valid dates.
+    """
+    window = int(window)
+    day = datetime.strptime(date, '%Y-%m-%d').date()
+    first_day = Date.min + timedelta(days=window + 1)
+    last_day = Date.max - timedelta(days=window + 2)
+    if not first_day <= day <= last_day:
+        raise ValidationError(f'Invalid date. Should be between {first_day} and {last_day}.')
+
+
+def validate_city(city_code: str, registry=None):
     city_code = city_code.upper()
-    if not City.objects.filter(code=city_code).exists():
+    if registry is None:
+        registry = get_city_registry()
+    if city_code not in registry:
         raise ValidationError(f'City with code "{city_code}" does not exist.')
+
+
+async def avalidate_city(city_code: str):
+    validate_city(city_code, await aget_city_registry())
+
+
+def parse_integer(value, name: str) -> int:
+    # JSON booleans and floats (e.g. batch queries) would be silently converted by int().
+    if isinstance(value, (bool, float)):
+        raise ValidationError(f'Invalid {name}. Should be an integer.')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f'Invalid {name}. Should be an integer.')
+
+
+def validate_max_connections(max_connections):
+    limit = settings.JOURNEYS_MAX_CONNECTIONS
+    max_connections = parse_integer(max_connections, 'max_connections')
+    if not 1 <= max_connections <= limit:
+        raise ValidationError(f'Invalid max_connections. Should be between 1 and {limit}.')
+
+
+def validate_max_wait_time_hours(max_wait_time_hours):
+    limit = settings.JOURNEYS_MAX_WAIT_TIME_HOURS
+    max_wait_time_hours = parse_integer(max_wait_time_hours, 'max_wait_time_hours')
+    if not 0 <= max_wait_time_hours <= limit:
+        raise ValidationError(f'Invalid max_wait_time_hours. Should be between 0 and {limit}.')
+
+
+def validate_window(window):
+    limit = settings.JOURNEYS_CALENDAR_MAX_WINDOW
+    window = parse_integer(window, 'window')
+    if not 0 <= window <= limit:
+        raise ValidationError(f'Invalid window. Should be between 0 and {limit}.')
+
+
+def validate_time(value, name: str):
+    for format in ['%H:%M', '%Y-%m-%d %H:%M']:
+        try:
+            datetime.strptime(value, format)
+            return
+        except (TypeError, ValueError):
+            pass
+    raise ValidationError(f'Invalid {name}. Should be HH:MM or YYYY-MM-DD HH:MM.')
+
+
+def validate_anchor(anchor):
+    if anchor not in ANCHORS:
+        raise ValidationError(f'Invalid anchor. Should be one of {", ".join(ANCHORS)}.')
+
+
+def validate_sort(sort):
+    if sort not in SORTS:
+        raise ValidationError(f'Invalid sort. Should be one of {", ".join(SORTS)}.')
+
+
+def validate_limit(limit):
+    max_limit = settings.JOURNEYS_SEARCH_MAX_LIMIT
+    limit = parse_integer(limit, 'limit')
+    if not 1 <= limit <= max_limit:
+        raise ValidationError(f'Invalid limit. Should be between 1 and {max_limit}.')
+
+
+def validate_search_options(options: dict):
+    """
+        Validates the optional parameters of a search (`TIME_FILTERS` and `RESULT_OPTIONS`).
+    """
+    for name, value in options.items():
+        if name == 'sort':
+            validate_sort(value)
+        elif name == 'limit':
+            validate_limit(value)
+        elif name == 'anchor':
+            validate_anchor(value)
+        else:
+            validate_time(value, name)
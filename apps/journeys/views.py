@@ -1,10 +1,34 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from apps.journeys.batch import search_batch
+from apps.journeys.calendar import get_calendar
+from apps.journeys.coalescing import get_counters
+from apps.journeys.conditional import add_caching_headers, aget_search_etag, get_search_etag, not_modified
+from apps.journeys.instrumentation import get_histograms, stage
 from apps.journeys.models import FlightEvent
+from apps.journeys.pagination import FlightEventKeysetPagination
+from apps.journeys.reachability import get_reachable
+from apps.journeys.renderers import CompactJSONRenderer, NDJSONRenderer, compact_journeys, dumps
 from apps.journeys.serializers import FlightEventModelSerializer, Journeys
-from apps.journeys.utils import get_journeys
-from apps.journeys.validators import validate_date_format, validate_city
+from apps.journeys.utils import RESULT_OPTIONS, TIME_FILTERS, aget_journeys, get_journeys, normalize_search
+from apps.journeys.validators import (
+    avalidate_city,
+    validate_date_format,
+    validate_date_range,
+    validate_city,
+    validate_max_connections,
+    validate_max_wait_time_hours,
+    validate_search_options,
+    validate_window,
+)
 
 
 class JourneyAPIView(APIView):
@@ -16,33 +40,287 @@ class JourneyAPIView(APIView):
         - from (str): The departure city.
         - to (str): The destination city.
         - max_wait_time_hours (int, optional): The maximum wait time in hours. Defaults to 4.
+        - max_connections (int, optional): The maximum number of flights per journey. Defaults to 2.
+        - depart_after, depart_before (str, optional): Departure window of the first flight,
+            'HH:MM' or 'YYYY-MM-DD HH:MM' (`depart_after` included, `depart_before` excluded).
+        - arrive_by (str, optional): Latest arrival of the last flight, 'HH:MM' or 'YYYY-MM-DD HH:MM'.
+        - sort (str, optional): Order of the journeys: 'departure', 'arrival', 'duration' or
+            'connections' (the default). Ties by number of flights, then by flight event ids.
+        - limit (int, optional): Max. number of journeys, the first ones in that order.
+        - format (str, optional): 'compact' for the compact columnar format (see `renderers.compact_journeys`).
 
         Returns:
-        - Response: A JSON response containing journey data.
+        - Response: A JSON response containing journey data. JSON search results carry an ETag (see
+            `conditional.get_search_etag`): requests with a matching `If-None-Match` get a 304.
 
         If 'date', 'from', and 'to' parameters are provided and valid, it retrieves journeys
-        based on the provided parameters. Otherwise, it retrieves all flight events for display.
+        based on the provided parameters. Otherwise, it retrieves all flight events for display:
+        - With 'cursor' and/or 'page_size', paginated by (departure_time, id).
+        - With 'format=ndjson' (or `Accept: application/x-ndjson`), streamed one event per line.
     """
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer, CompactJSONRenderer]
 
     def get(self, request):
         date = request.query_params.get('date')
         from_city = request.query_params.get('from')
         to_city = request.query_params.get('to')
         if date and from_city and to_city:
+            max_wait_time_hours = request.query_params.get('max_wait_time_hours', 4)
+            max_connections = request.query_params.get('max_connections', 2)
+            options = {
+                name: request.query_params[name]
+                for name in TIME_FILTERS + RESULT_OPTIONS
+                if request.query_params.get(name)
+            }
             try:
                 validate_date_format(date)
                 validate_city(from_city)
                 validate_city(to_city)
+                validate_max_wait_time_hours(max_wait_time_hours)
+                validate_max_connections(max_connections)
+                validate_search_options(options)
             except Exception as e:
                 return Response(
                     {
                         'error': e.message
                     }, status=400
                 )
-            max_wait_time_hours = request.query_params.get('max_wait_time_hours', 4)
-            journeys = get_journeys(date, from_city, to_city, max_wait_time_hours)
-            serializer = Journeys(journeys, many=True)
+            if isinstance(request.accepted_renderer, (JSONRenderer, CompactJSONRenderer)):
+                media_type = request.accepted_renderer.media_type
+                search = normalize_search(date, from_city, to_city, max_wait_time_hours, max_connections, **options)
+                etag = get_search_etag(search, media_type)
+                # Unchanged timetable: the client already has the response, don't even search.
+                response = not_modified(request, etag)
+                if response is not None:
+                    return add_caching_headers(response, etag)
+                if isinstance(request.accepted_renderer, CompactJSONRenderer):
+                    journeys = get_journeys(date, from_city, to_city, max_wait_time_hours, max_connections, **options)
+                    with stage('serialize'):
+                        content = dumps(compact_journeys(journeys))
+                else:
+                    # Fast path: the same JSON the serializer would render, built from pre-rendered legs.
+                    content = get_journeys(
+                        date, from_city, to_city, max_wait_time_hours, max_connections, rendered=True, **options
+                    )
+                return add_caching_headers(HttpResponse(content, content_type=media_type), etag)
+            journeys = get_journeys(date, from_city, to_city, max_wait_time_hours, max_connections, **options)
+            with stage('serialize'):
+                return Response(Journeys(journeys, many=True).data)
         else:
-            flight_events = FlightEvent.objects.all()
+            if isinstance(request.accepted_renderer, CompactJSONRenderer):
+                return Response(
+                    {
+                        'error': 'The compact format is only available for journey searches.'
+                    }, status=400
+                )
+            flight_events = FlightEvent.objects.select_related('flight', 'departure_city', 'arrival_city')
+            if isinstance(request.accepted_renderer, NDJSONRenderer):
+                return self.stream_flight_events(flight_events, request, request.accepted_renderer)
+            if FlightEventKeysetPagination.is_requested(request):
+                return self.paginate_flight_events(flight_events, request)
             serializer = FlightEventModelSerializer(flight_events, many=True)
         return Response(serializer.data)
+
+    def paginate_flight_events(self, flight_events, request):
+        paginator = FlightEventKeysetPagination()
+        try:
+            page = paginator.paginate_queryset(flight_events, request, view=self)
+        except ValidationError as e:
+            return Response(
+                {
+                    'error': e.message
+                }, status=400
+            )
+        serializer = FlightEventModelSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def stream_flight_events(self, flight_events, request, renderer):
+        # Constant memory: events are fetched in chunks and serialized one by one.
+        serializer = FlightEventModelSerializer()
+        flight_events = flight_events.order_by(*FlightEventKeysetPagination.ordering)
+        chunk_size = settings.JOURNEYS_STREAM_CHUNK_SIZE
+        if isinstance(request._request, ASGIRequest):
+            # The ASGI handler buffers sync iterators whole before sending them: give it an async one.
+            async def events():
+                async for flight_event in flight_events.aiterator(chunk_size=chunk_size):
+                    yield serializer.to_representation(flight_event)
+
+            content = renderer.astream(events())
+        else:
+            content = renderer.stream(
+                serializer.to_representation(flight_event)
+                for flight_event in flight_events.iterator(chunk_size=chunk_size)
+            )
+        return StreamingHttpResponse(content, content_type=renderer.media_type)
+
+
+class JourneyBatchAPIView(APIView):
+    """
+        Handles POST requests to run several journey searches at once.
+        ---
+        Body:
+        - queries (list): Searches with the same parameters as `JourneyAPIView`:
+            {"date", "from", "to", "max_wait_time_hours" (optional), "max_connections" (optional), ...}.
+
+        Returns:
+        - Response: A JSON list with, for each query and in the same order, either
+            {"query", "journeys"} or {"query", "error"} if that query is invalid.
+    """
+
+    def post(self, request):
+        queries = request.data.get('queries') if isinstance(request.data, dict) else None
+        if not isinstance(queries, list):
+            return Response(
+                {
+                    'error': 'Invalid body. Should be an object with a list of "queries".'
+                }, status=400
+            )
+        limit = settings.JOURNEYS_BATCH_MAX_QUERIES
+        if len(queries) > limit:
+            return Response(
+                {
+                    'error': f'Too many queries. Should be at most {limit}.'
+                }, status=400
+            )
+        return HttpResponse(search_batch(queries), content_type='application/json')
+
+
+class JourneyCalendarAPIView(APIView):
+    """
+        Handles GET requests to summarize the journeys of the days around a date.
+        ---
+        Query Parameters:
+        - date (str): The central date in 'YYYY-MM-DD' format.
+        - from (str): The departure city.
+        - to (str): The destination city.
+        - window (int, optional): The number of days before and after the date. Defaults to 3.
+        - max_wait_time_hours (int, optional): The maximum wait time in hours. Defaults to 4.
+        - max_connections (int, optional): The maximum number of flights per journey. Defaults to 2.
+
+        Returns:
+        - Response: A JSON list with, for each day in order, {"date", "journeys", "duration_minutes",
+            "shortest"}: the number of journeys departing on it, and the shortest one (in the same format
+            as the search, or null).
+    """
+
+    def get(self, request):
+        date = request.query_params.get('date')
+        from_city = request.query_params.get('from')
+        to_city = request.query_params.get('to')
+        window = request.query_params.get('window', 3)
+        max_wait_time_hours = request.query_params.get('max_wait_time_hours', 4)
+        max_connections = request.query_params.get('max_connections', 2)
+        try:
+            if not (date and from_city and to_city):
+                raise ValidationError('The date, from and to parameters are required.')
+            validate_date_format(date)
+            validate_city(from_city)
+            validate_city(to_city)
+            validate_window(window)
+            validate_date_range(date, window)
+            validate_max_wait_time_hours(max_wait_time_hours)
+            validate_max_connections(max_connections)
+        except ValidationError as e:
+            return Response(
+                {
+                    'error': e.message
+                }, status=400
+            )
+        calendar = get_calendar(date, from_city, to_city, window, max_wait_time_hours, max_connections)
+        with stage('serialize'):
+            return Response([
+                {**day, 'shortest': day['shortest'] and Journeys(day['shortest']).data} for day in calendar
+            ])
+
+
+class JourneyReachableAPIView(APIView):
+    """
+        Handles GET requests to find every city reachable from an origin on a date.
+        ---
+        Query Parameters:
+        - date (str): The date of the journeys in 'YYYY-MM-DD' format.
+        - from (str): The departure city.
+        - max_wait_time_hours (int, optional): The maximum wait time in hours. Defaults to 4.
+        - max_connections (int, optional): The maximum number of flights per journey. Defaults to 2.
+
+        Returns:
+        - Response: A JSON list with, for each reachable city by arrival time, {"to", "legs", "arrival_time",
+            "journey"}: the journey arriving there first (in the same format as the search) and its flights.
+    """
+
+    def get(self, request):
+        date = request.query_params.get('date')
+        from_city = request.query_params.get('from')
+        max_wait_time_hours = request.query_params.get('max_wait_time_hours', 4)
+        max_connections = request.query_params.get('max_connections', 2)
+        try:
+            if not (date and from_city):
+                raise ValidationError('The date and from parameters are required.')
+            validate_date_format(date)
+            validate_city(from_city)
+            validate_max_wait_time_hours(max_wait_time_hours)
+            validate_max_connections(max_connections)
+        except ValidationError as e:
+            return Response(
+                {
+                    'error': e.message
+                }, status=400
+            )
+        reachable = get_reachable(date, from_city, max_wait_time_hours, max_connections)
+        with stage('serialize'):
+            return Response([{**city, 'journey': Journeys(city['journey']).data} for city in reachable])
+
+
+class AsyncJourneyView(View):
+    """
+        Async-native version of the journey search of `JourneyAPIView`, for the ASGI deployment.
+        ---
+        Same query parameters and response. The cities are validated against the city registry
+        and the search uses the async cache and ORM, so nothing blocks the event loop.
+    """
+
+    async def get(self, request):
+        date = request.GET.get('date')
+        from_city = request.GET.get('from')
+        to_city = request.GET.get('to')
+        if not (date and from_city and to_city):
+            return JsonResponse({'error': 'The date, from and to parameters are required.'}, status=400)
+
+        max_wait_time_hours = request.GET.get('max_wait_time_hours', 4)
+        max_connections = request.GET.get('max_connections', 2)
+        options = {name: request.GET[name] for name in TIME_FILTERS + RESULT_OPTIONS if request.GET.get(name)}
+        try:
+            validate_date_format(date)
+            await avalidate_city(from_city)
+            await avalidate_city(to_city)
+            validate_max_wait_time_hours(max_wait_time_hours)
+            validate_max_connections(max_connections)
+            validate_search_options(options)
+        except ValidationError as e:
+            return JsonResponse({'error': e.message}, status=400)
+
+        search = normalize_search(date, from_city, to_city, max_wait_time_hours, max_connections, **options)
+        etag = await aget_search_etag(search, 'application/json')
+        response = not_modified(request, etag)
+        if response is None:
+            journeys = await aget_journeys(
+                date, from_city, to_city, max_wait_time_hours, max_connections, rendered=True, **options
+            )
+            response = HttpResponse(journeys, content_type='application/json')
+        return add_caching_headers(response, etag)
+
+
+class JourneyMetricsAPIView(APIView):
+    """
+        Handles GET requests to retrieve the search counters of this worker process, and the request
+            histograms recorded by the instrumentation middleware (when `JOURNEYS_INSTRUMENTATION` is enabled).
+        ---
+        Returns:
+        - Response: The search counters: {"searches": {"executed", "coalesced"}} (see `coalescing.coalesce`).
+            And the histograms, by view name and metric:
+            {"<view>": {"<metric>": {"buckets", "counts", "count", "sum"}}}. Durations are in ms.
+    """
+
+    def get(self, request):
+        histograms = get_histograms() if settings.JOURNEYS_INSTRUMENTATION else {}
+        return Response({**histograms, 'searches': get_counters()})
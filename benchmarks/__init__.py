@@ -0,0 +1,30 @@
+"""
+    Standalone benchmarks, run as modules from the project root, e.g.:
+        python -m benchmarks.indexes
+"""
+import os
+
+
+def setup_django():
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    django.setup()
+
+
+def create_benchmark_database(verbosity: int = 0):
+    """
+        Creates a throwaway test database (in memory for SQLite), so benchmarks never touch
+            the configured one. Returns a callable that destroys it.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+
+    def destroy():
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+    return destroy
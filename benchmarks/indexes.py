@@ -0,0 +1,128 @@
+"""
+    Query plans and latencies of the FlightEvent search queries, before and after the composite
+        indexes of migration 0003 and the half-open `departure_time` range filters.
+    ---
+    Usage:
+        python -m benchmarks.indexes [--events 1000000] [--cities 200] [--days 30] [--queries 200]
+
+    It runs on a throwaway test database filled with a synthetic timetable. Three scenarios
+    are measured on the same data:
+        - before: only the FK indexes, with the original `departure_time__date` filter.
+        - date filter: composite indexes, but still the `__date` filter (which can't use them).
+        - after: composite indexes and half-open range filters.
+"""
+import argparse
+import random
+import statistics
+from datetime import timedelta
+from time import perf_counter
+
+from benchmarks import create_benchmark_database, setup_django
+
+
+def run_queries(name, build_queries):
+    """
+        Runs every query, printing the plan of the first one and the latency stats (in ms).
+    """
+    queries = build_queries()
+    print(f'\n=== {name}')
+    for label, querysets in queries.items():
+        print(f'--- {label}')
+        print(querysets[0].explain())
+        timings = []
+        for queryset in querysets:
+            start = perf_counter()
+            list(queryset.values_list('id', flat=True))
+            timings.append((perf_counter() - start) * 1000)
+        timings.sort()
+        print(
+            f'queries={len(timings)} '
+            f'mean={statistics.mean(timings):.2f}ms '
+            f'p50={timings[len(timings) // 2]:.2f}ms '
+            f'p95={timings[int(len(timings) * 0.95)]:.2f}ms'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.utils import timezone
+
+    from apps.journeys.models import FlightEvent
+    from apps.journeys.utils import get_day_range
+    from benchmarks.synthetic import generate_timetable
+
+    destroy = create_benchmark_database()
+    try:
+        start = perf_counter()
+        cities = generate_timetable(cities=args.cities, events=args.events, days=args.days, seed=args.seed)
+        print(f'Generated {args.events} flight events in {perf_counter() - start:.1f}s ({connection.vendor}).')
+
+        rng = random.Random(args.seed)
+        first_day = timezone.localdate(FlightEvent.objects.order_by('departure_time').first().departure_time)
+        samples = []
+        for _ in range(args.queries):
+            from_city, to_city = rng.sample(cities, 2)
+            date = (first_day + timedelta(days=rng.randrange(args.days))).isoformat()
+            start_date, end_date = get_day_range(date)
+            arrival = start_date + timedelta(minutes=rng.randrange(0, 24 * 60, 5))
+            samples.append((from_city, to_city, date, start_date, end_date, arrival))
+
+        def date_filter_queries():
+            return {
+                'initial flights (departure_city, departure_time__date)': [
+                    FlightEvent.objects.filter(departure_time__date=start_date, departure_city=from_city)
+                    for from_city, _, _, start_date, _, _ in samples
+                ],
+                'connections (departure_city, arrival_city, departure_time__gt)': [
+                    FlightEvent.objects.filter(
+                        departure_city=from_city, arrival_city=to_city, departure_time__gt=arrival
+                    )
+                    for from_city, to_city, _, _, _, arrival in samples
+                ],
+            }
+
+        def range_filter_queries():
+            return {
+                'initial flights (departure_city, departure_time range)': [
+                    FlightEvent.objects.filter(
+                        departure_city=from_city, departure_time__gte=start_date, departure_time__lt=end_date
+                    )
+                    for from_city, _, _, start_date, end_date, _ in samples
+                ],
+                'connections (departure_city, arrival_city, departure_time range)': [
+                    FlightEvent.objects.filter(
+                        departure_city=from_city,
+                        arrival_city=to_city,
+                        departure_time__gt=arrival,
+                        departure_time__lte=arrival + timedelta(hours=4),
+                    )
+                    for from_city, to_city, _, _, _, arrival in samples
+                ],
+            }
+
+        indexes = FlightEvent._meta.indexes
+        with connection.schema_editor() as schema_editor:
+            for index in indexes:
+                schema_editor.remove_index(FlightEvent, index)
+        run_queries('before: FK indexes, date filter', date_filter_queries)
+
+        with connection.schema_editor() as schema_editor:
+            for index in indexes:
+                schema_editor.add_index(FlightEvent, index)
+        run_queries('composite indexes, date filter', date_filter_queries)
+        run_queries('after: composite indexes, range filter', range_filter_queries)
+    finally:
+        destroy()
+
+
+if __name__ == '__main__':
+    main()
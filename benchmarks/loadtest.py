@@ -0,0 +1,101 @@
+"""
+    Requests/sec of the sync search view (`/journeys/search`) vs. the async-native one
+        (`/journeys/search/async`), served in-process by a single ASGI worker.
+    ---
+    Usage:
+        python -m benchmarks.loadtest [--requests 2000] [--concurrency 50] [--engine graph] [--cache]
+
+    Requests go through Django's ASGI request handling (the test `AsyncClient`), as they would in a
+    `UvicornWorker`: the sync view is run through the sync-to-async thread adapter, the async one
+    in the event loop. The search cache is disabled unless `--cache` is given.
+
+    Note that with SQLite the async ORM still runs its queries in a thread; the difference grows
+    with a database and cache backend that are natively async.
+"""
+import argparse
+import asyncio
+import random
+from time import perf_counter
+
+from benchmarks import create_benchmark_database, setup_django
+
+
+async def run(client, url, queries, concurrency):
+    pending = list(queries)
+    latencies = []
+
+    async def worker():
+        while pending:
+            query = pending.pop()
+            start = perf_counter()
+            response = await client.get(url, query)
+            latencies.append(perf_counter() - start)
+            assert response.status_code == 200, response.content
+
+    start = perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = perf_counter() - start
+    latencies.sort()
+    return {
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--engine', choices=['graph', 'connections'], default='graph')
+    parser.add_argument('--cache', action='store_true', help='Keep the search cache enabled.')
+    parser.add_argument('--events', type=int, default=20_000)
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import AsyncClient
+    from django.urls import reverse
+
+    from apps.journeys.connections import rebuild_connections
+    from benchmarks.synthetic import generate_timetable
+
+    settings.JOURNEYS_SEARCH_ENGINE = args.engine
+    if not args.cache:
+        settings.JOURNEYS_CACHE_TIMEOUT = 0
+
+    destroy = create_benchmark_database()
+    try:
+        cities = generate_timetable(cities=args.cities, events=args.events, days=args.days, seed=args.seed)
+        if args.engine == 'connections':
+            rebuild_connections()
+
+        rng = random.Random(args.seed)
+        queries = []
+        for _ in range(args.requests):
+            from_city, to_city = rng.sample(cities, 2)
+            queries.append({
+                'date': f'2025-03-{rng.randrange(1, args.days + 1):02d}',
+                'from': from_city.code,
+                'to': to_city.code,
+            })
+
+        client = AsyncClient()
+        for name in ['journey-search', 'journey-search-async']:
+            url = reverse(name)
+            # Warm up (loads the in-memory timetable).
+            asyncio.run(run(client, url, queries[:args.concurrency], args.concurrency))
+            stats = asyncio.run(run(client, url, queries, args.concurrency))
+            print(
+                f'{url:<24} {stats["requests_per_second"]:8.1f} req/s  '
+                f'p50={stats["p50_ms"]:.1f}ms  p95={stats["p95_ms"]:.1f}ms'
+            )
+    finally:
+        destroy()
+
+
+if __name__ == '__main__':
+    main()
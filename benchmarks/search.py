@@ -0,0 +1,191 @@
+"""
+    Latency, queries per request and peak memory of `/journeys/search` on a hub-and-spoke
+        timetable, by workload, saved as JSON to track regressions across commits.
+    ---
+    Usage:
+        python -m benchmarks.search [--cities 200] [--hubs 8] [--flights-per-day 2000] [--days 30]
+            [--requests 300] [--engine graph] [--cache] [--output PATH]
+
+    Workloads (the same seeded queries on every run):
+        - direct: cities linked by a route, most journeys have a single flight.
+        - hub: spoke to spoke without a route but sharing a hub, every journey connects through a hub.
+        - no_result: destinations without any flight.
+
+    Requests go through the test client (the full Django request/response cycle). The search cache
+    is disabled unless `--cache` is given. Memory is measured on a separate pass with `tracemalloc`
+    (which slows Python code down), and includes loading the in-memory timetable.
+"""
+import argparse
+import json
+import random
+import subprocess
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+from time import perf_counter
+
+from benchmarks import create_benchmark_database, setup_django
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def build_workloads(network, requests, days, start, seed):
+    rng = random.Random(seed)
+    first_day = date.fromisoformat(start)
+    # Leave the last day out, journeys starting on it may need flights of the next one.
+    dates = [(first_day + timedelta(days=day)).isoformat() for day in range(max(days - 1, 1))]
+    routes = sorted(network.routes)
+    spokes = [city.code for city in network.spokes]
+    isolated = [city.code for city in network.isolated]
+
+    hubs = [city.code for city in network.hubs]
+    connected = sorted(
+        (from_city, to_city)
+        for from_city in spokes
+        for to_city in spokes
+        if from_city != to_city
+        and (from_city, to_city) not in network.routes
+        and any((from_city, hub) in network.routes and (hub, to_city) in network.routes for hub in hubs)
+    )
+
+    pairs = {
+        'direct': lambda: rng.choice(routes),
+        'hub': lambda: rng.choice(connected),
+        'no_result': lambda: (rng.choice(spokes), rng.choice(isolated)),
+    }
+    return {
+        name: [
+            dict(zip(['from', 'to'], pair()), date=rng.choice(dates), max_wait_time_hours=rng.choice([4, 8, 12]))
+            for _ in range(requests)
+        ]
+        for name, pair in pairs.items()
+    }
+
+
+def run_workload(client, url, queries):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies, query_counts, results = [], [], []
+    for query in queries:
+        with CaptureQueriesContext(connection) as captured:
+            start = perf_counter()
+            response = client.get(url, query)
+            latencies.append((perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.content
+        query_counts.append(len(captured.captured_queries))
+        results.append(len(json.loads(response.content)))
+
+    latencies.sort()
+    return {
+        'requests': len(queries),
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': sum(latencies) / len(latencies),
+        'queries_per_request': sum(query_counts) / len(query_counts),
+        'max_queries': max(query_counts),
+        'journeys_per_request': sum(results) / len(results),
+    }
+
+
+def peak_memory(client, url, queries):
+    from apps.journeys.graph import invalidate_flight_graph
+
+    invalidate_flight_graph()
+    tracemalloc.start()
+    try:
+        for query in queries:
+            client.get(url, query)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument('--hubs', type=int, default=8)
+    parser.add_argument('--flights-per-day', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=300, help='Requests per workload.')
+    parser.add_argument('--engine', choices=['graph', 'connections'], default='graph')
+    parser.add_argument('--cache', action='store_true', help='Keep the search cache enabled.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+
+    from apps.journeys.connections import rebuild_connections
+    from benchmarks.synthetic import generate_network
+
+    settings.JOURNEYS_SEARCH_ENGINE = args.engine
+    if not args.cache:
+        settings.JOURNEYS_CACHE_TIMEOUT = 0
+    start_date = '2025-03-01'
+
+    destroy = create_benchmark_database()
+    try:
+        start = perf_counter()
+        network = generate_network(
+            cities=args.cities,
+            hubs=args.hubs,
+            flights_per_day=args.flights_per_day,
+            days=args.days,
+            start=start_date,
+            seed=args.seed,
+        )
+        if args.engine == 'connections':
+            rebuild_connections()
+        print(f'Generated {args.flights_per_day * args.days} flight events in {perf_counter() - start:.1f}s.')
+
+        client = Client()
+        url = reverse('journey-search')
+        workloads = build_workloads(network, args.requests, args.days, start_date, args.seed)
+        memory = peak_memory(client, url, workloads['hub'][:20])
+        # Warm up (loads the in-memory timetable and the city registry).
+        client.get(url, workloads['direct'][0])
+
+        results = {}
+        for name, queries in workloads.items():
+            results[name] = stats = run_workload(client, url, queries)
+            print(
+                f'{name:<10} p50={stats["p50_ms"]:.2f}ms p95={stats["p95_ms"]:.2f}ms '
+                f'p99={stats["p99_ms"]:.2f}ms queries={stats["queries_per_request"]:.2f} '
+                f'journeys={stats["journeys_per_request"]:.1f}'
+            )
+        print(f'peak memory {memory / 2 ** 20:.1f}MiB')
+    finally:
+        destroy()
+
+    commit = git_commit()
+    output = args.output or Path(f'benchmarks/results/search-{commit or "local"}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'commit': commit,
+        'parameters': {
+            name: value for name, value in vars(args).items() if name != 'output'
+        },
+        'peak_memory_bytes': memory,
+        'workloads': results,
+    }, indent=2) + '\n')
+    print(f'Results saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
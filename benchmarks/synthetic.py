@@ -0,0 +1,159 @@
+import random
+from datetime import datetime, timedelta
+from itertools import combinations, product
+from string import ascii_uppercase
+from typing import List, NamedTuple, Set, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.journeys.models import City, Country, Flight, FlightEvent
+
+
+def city_codes(count: int):
+    codes = (''.join(letters) for letters in product(ascii_uppercase, repeat=3))
+    return [next(codes) for _ in range(count)]
+
+
+def flight_numbers(count: int):
+    prefixes = (''.join(letters) for letters in product(ascii_uppercase, repeat=2))
+    numbers = (f'{prefix}{number:04d}' for prefix in prefixes for number in range(1, 10000))
+    return [next(numbers) for _ in range(count)]
+
+
+@transaction.atomic
+def generate_timetable(
+    cities: int = 200,
+    events: int = 1_000_000,
+    days: int = 30,
+    start: str = '2025-03-01',
+    seed: int = 0,
+    batch_size: int = 10_000,
+):
+    """
+        Fills the database with a random timetable: `events` flight events between `cities` cities,
+            departing uniformly over `days` days from `start`, lasting 30 minutes to 14 hours.
+        ---
+        Returns:
+            The list of generated `City` objects.
+    """
+    rng = random.Random(seed)
+    country = Country.objects.create(code='ZZ', name='Synthetic')
+    city_objects = City.objects.bulk_create([
+        City(code=code, name=f'City {code}', country=country)
+        for code in city_codes(cities)
+    ])
+    city_ids = [city.id for city in city_objects]
+    flight_ids = [
+        flight.id
+        for flight in Flight.objects.bulk_create([
+            Flight(number=number) for number in flight_numbers(min(events, cities * 20))
+        ])
+    ]
+
+    first_departure = timezone.make_aware(datetime.strptime(start, '%Y-%m-%d'))
+    window = days * 24 * 60
+    batch = []
+    for _ in range(events):
+        departure_city, arrival_city = rng.sample(city_ids, 2)
+        departure_time = first_departure + timedelta(minutes=rng.randrange(0, window, 5))
+        batch.append(FlightEvent(
+            flight_id=rng.choice(flight_ids),
+            departure_city_id=departure_city,
+            arrival_city_id=arrival_city,
+            departure_time=departure_time,
+            arrival_time=departure_time + timedelta(minutes=rng.randrange(30, 14 * 60, 5)),
+        ))
+        if len(batch) >= batch_size:
+            FlightEvent.objects.bulk_create(batch)
+            batch = []
+    FlightEvent.objects.bulk_create(batch)
+    return city_objects
+
+
+class Network(NamedTuple):
+    hubs: List[City]
+    spokes: List[City]
+    isolated: List[City]
+    routes: Set[Tuple[str, str]]
+
+
+@transaction.atomic
+def generate_network(
+    cities: int = 200,
+    hubs: int = 8,
+    flights_per_day: int = 2000,
+    days: int = 30,
+    start: str = '2025-03-01',
+    seed: int = 0,
+    isolated: int = 5,
+    batch_size: int = 10_000,
+) -> Network:
+    """
+        Fills the database with a hub-and-spoke timetable: every flight flies the same route at the
+            same time every day, for `days` days from `start`.
+        ---
+        Parameters:
+            - cities: Number of cities with flights. The first `hubs` ones are hubs, the rest spokes.
+            - flights_per_day: Number of flights (and so of flight events per day).
+            - isolated: Number of extra cities without any flight (destinations of no-result searches).
+        Returns:
+            The generated `Network`: cities by role and the (from, to) codes of every route.
+        ---
+        Routes link every pair of hubs and every spoke with one to three hubs (both ways), plus a few
+        spoke to spoke routes. Flights are spread over the routes weighted by their traffic (hub to hub
+        routes get the most), with departures between 06:00 and 23:00 and durations growing with a
+        random route distance.
+    """
+    rng = random.Random(seed)
+    country = Country.objects.create(code='ZZ', name='Synthetic')
+    city_objects = City.objects.bulk_create([
+        City(code=code, name=f'City {code}', country=country)
+        for code in city_codes(cities + isolated)
+    ])
+    hub_cities, spoke_cities = city_objects[:hubs], city_objects[hubs:cities]
+
+    weights = {}
+    for first, second in combinations(hub_cities, 2):
+        weights[first, second] = weights[second, first] = 10
+    for spoke in spoke_cities:
+        for hub in rng.sample(hub_cities, rng.randint(1, min(3, len(hub_cities)))):
+            weights[spoke, hub] = weights[hub, spoke] = 3
+    for _ in range(len(spoke_cities) // 4):
+        first, second = rng.sample(spoke_cities, 2)
+        weights[first, second] = weights[second, first] = 1
+
+    routes = list(weights)
+    durations = {route: rng.randrange(45, 12 * 60, 5) for route in routes}
+    for first, second in routes:
+        # The same duration both ways.
+        durations[second, first] = durations[first, second]
+    schedule = rng.choices(routes, weights=[weights[route] for route in routes], k=flights_per_day)
+    numbers = flight_numbers(flights_per_day)
+    flight_ids = [flight.id for flight in Flight.objects.bulk_create([Flight(number=number) for number in numbers])]
+    departures = [rng.randrange(6 * 60, 23 * 60, 5) for _ in schedule]
+
+    first_day = timezone.make_aware(datetime.strptime(start, '%Y-%m-%d'))
+    batch = []
+    for day in range(days):
+        midnight = first_day + timedelta(days=day)
+        for flight_id, (departure_city, arrival_city), departure in zip(flight_ids, schedule, departures):
+            departure_time = midnight + timedelta(minutes=departure)
+            batch.append(FlightEvent(
+                flight_id=flight_id,
+                departure_city_id=departure_city.id,
+                arrival_city_id=arrival_city.id,
+                departure_time=departure_time,
+                arrival_time=departure_time + timedelta(minutes=durations[departure_city, arrival_city]),
+            ))
+            if len(batch) >= batch_size:
+                FlightEvent.objects.bulk_create(batch)
+                batch = []
+    FlightEvent.objects.bulk_create(batch)
+
+    return Network(
+        hubs=hub_cities,
+        spokes=spoke_cities,
+        isolated=city_objects[cities:],
+        routes={(departure_city.code, arrival_city.code) for departure_city, arrival_city in set(schedule)},
+    )
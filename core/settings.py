@@ -51,12 +51,16 @@ INSTALLED_APPS = LOCAL_APPS + DJANGO_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Compresses large responses (disabled with JOURNEYS_COMPRESSION_MIN_SIZE=0).
+    'apps.journeys.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Disabled (and removed from the chain) unless JOURNEYS_INSTRUMENTATION is set.
+    'apps.journeys.instrumentation.InstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -85,6 +89,48 @@ REST_FRAMEWORK = {
     )
 }
 
+# Journeys search
+JOURNEYS_MAX_CONNECTIONS = int(os.getenv('JOURNEYS_MAX_CONNECTIONS', 4))
+# Max. wait time between flights a search can allow, in hours.
+JOURNEYS_MAX_WAIT_TIME_HOURS = int(os.getenv('JOURNEYS_MAX_WAIT_TIME_HOURS', 24))
+# 'graph' (in-memory timetable) or 'connections' (precomputed connections table, for up to 2 flights).
+JOURNEYS_SEARCH_ENGINE = os.getenv('JOURNEYS_SEARCH_ENGINE', 'graph')
+# Searches of at least this many flights also search backward from the destination to prune the
+# forward search (0 disables it).
+JOURNEYS_BIDIRECTIONAL_MIN_LEGS = int(os.getenv('JOURNEYS_BIDIRECTIONAL_MIN_LEGS', 3))
+# Searches of up to 2 flights with at least this many first flights pair them with NumPy, if it's installed
+# (0 disables it).
+JOURNEYS_VECTORIZED_MIN_FLIGHTS = int(os.getenv('JOURNEYS_VECTORIZED_MIN_FLIGHTS', 8))
+# Processes per worker running the searches of batches and the days of calendars in parallel, over the
+# timetable snapshot (0 or no `JOURNEYS_SNAPSHOT_PATH` disables them).
+JOURNEYS_PARALLEL_WORKERS = int(os.getenv('JOURNEYS_PARALLEL_WORKERS', 0))
+# Min. number of searches (or calendar days) to run them in parallel, smaller ones stay in-process.
+JOURNEYS_PARALLEL_MIN_SEARCHES = int(os.getenv('JOURNEYS_PARALLEL_MIN_SEARCHES', 8))
+# Search results are cached for this many seconds (0 disables the cache).
+JOURNEYS_CACHE_ALIAS = 'default'
+JOURNEYS_CACHE_TIMEOUT = int(os.getenv('JOURNEYS_CACHE_TIMEOUT', 300))
+# Concurrent identical searches run once and share the result.
+JOURNEYS_COALESCING = os.getenv('JOURNEYS_COALESCING', 'True').lower() == 'true'
+# Seconds clients and shared caches can reuse a search response before revalidating its ETag.
+JOURNEYS_HTTP_MAX_AGE = int(os.getenv('JOURNEYS_HTTP_MAX_AGE', 0))
+# Responses of at least this many bytes are compressed with brotli or gzip (0 disables compression).
+JOURNEYS_COMPRESSION_MIN_SIZE = int(os.getenv('JOURNEYS_COMPRESSION_MIN_SIZE', 1024))
+# Flight events fetched per query when streaming the listing.
+JOURNEYS_STREAM_CHUNK_SIZE = int(os.getenv('JOURNEYS_STREAM_CHUNK_SIZE', 2000))
+# Max. number of searches per batch request.
+JOURNEYS_BATCH_MAX_QUERIES = int(os.getenv('JOURNEYS_BATCH_MAX_QUERIES', 50))
+# Max. number of journeys a search can be limited to.
+JOURNEYS_SEARCH_MAX_LIMIT = int(os.getenv('JOURNEYS_SEARCH_MAX_LIMIT', 1000))
+# Max. number of days before and after the date of a calendar search.
+JOURNEYS_CALENDAR_MAX_WINDOW = int(os.getenv('JOURNEYS_CALENDAR_MAX_WINDOW', 7))
+# Server-Timing headers and request histograms (at /journeys/metrics).
+JOURNEYS_INSTRUMENTATION = os.getenv('JOURNEYS_INSTRUMENTATION', 'False').lower() == 'true'
+# Binary snapshot of the in-memory timetable, shared by the worker processes (empty disables it).
+JOURNEYS_SNAPSHOT_PATH = os.getenv('JOURNEYS_SNAPSHOT_PATH', '')
+# Seconds between the checks of the timetable in the database, for changes made by other processes that
+# don't share the cache (e.g. management commands with the in-process cache) or by SQL (0 checks every search).
+JOURNEYS_TIMETABLE_CHECK_INTERVAL = int(os.getenv('JOURNEYS_TIMETABLE_CHECK_INTERVAL', 5))
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -97,6 +143,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# In-process (LRU) by default; set CACHE_BACKEND/CACHE_LOCATION to share it between workers (e.g. Redis).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'airlink'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
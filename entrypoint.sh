@@ -13,4 +13,9 @@ if [ "${LOAD_FIXTURES:-}" = "True" ]; then
     python manage.py loaddata data/fixtures/journeys/data.json
 fi
 
+if [ -n "${JOURNEYS_SNAPSHOT_PATH:-}" ]; then
+    # Workers map the timetable snapshot instead of each loading it from the database.
+    python manage.py build_timetable_snapshot
+fi
+
 python -m gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker -b=0.0.0.0:8000
\ No newline at end of file
@@ -1,5 +1,9 @@
 import pytest
+from django.core.cache import cache
+from django.core.management import call_command
 
+from apps.journeys import graph as graph_module
+from apps.journeys.graph import invalidate_flight_graph
 from apps.journeys.models import Country, City, Flight
 
 
@@ -18,3 +22,21 @@ def basic_flight_data(db):
         'city_2': city_2,
         'flight': flight,
     }
+
+
+@pytest.fixture(autouse=True)
+def reset_flight_graph(monkeypatch):
+    # The in-memory timetable and the cache outlive the test transaction, so each test starts with fresh ones
+    # (and checks the fingerprint of its own database on its first search).
+    monkeypatch.setattr(graph_module, '_fingerprint', None)
+    monkeypatch.setattr(graph_module, '_fingerprint_checked_at', float('-inf'))
+    invalidate_flight_graph()
+    cache.clear()
+    yield
+    invalidate_flight_graph()
+    cache.clear()
+
+
+@pytest.fixture
+def fixture_data(db):
+    call_command('loaddata', 'data/fixtures/journeys/data.json', verbosity=0)
@@ -0,0 +1,43 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+QUERIES = [
+    {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL'},
+    {'date': '2025-03-05', 'from': 'bue', 'to': 'mil', 'max_wait_time_hours': '12'},
+    {'date': '2025-03-04', 'from': 'MVD', 'to': 'MIL', 'max_connections': '1'},
+]
+
+
+class TestAsyncJourneyView:
+    # The test client runs async views in an event loop, like the ASGI handler.
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('engine', ['graph', 'connections'])
+    def test_same_response_as_sync_view(self, client, fixture_data, settings, engine):
+        # Should return the same bytes as the DRF view, with either search engine.
+        settings.JOURNEYS_SEARCH_ENGINE = engine
+        call_command('rebuild_connections', verbosity=0)
+        for query in QUERIES:
+            response = client.get(reverse('journey-search-async'), query)
+            expected = client.get(reverse('journey-search'), query)
+            assert response.status_code == 200
+            assert response['Content-Type'] == 'application/json'
+            assert response.content == expected.content
+
+    @pytest.mark.django_db
+    def test_invalid_params(self, client, fixture_data):
+        url = reverse('journey-search-async')
+        for query, error in [
+            ({'date': '2025-03-05', 'from': 'BUE'}, 'The date, from and to parameters are required.'),
+            ({'date': 'invalid-date', 'from': 'BUE', 'to': 'MIL'}, 'Invalid date format. Should be %Y-%m-%d.'),
+            ({'date': '2025-03-05', 'from': 'XYZ', 'to': 'ABC'}, 'City with code "XYZ" does not exist.'),
+            ({'date': '2025-03-05', 'from': 'BUE', 'to': 'ABC'}, 'City with code "ABC" does not exist.'),
+            ({'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'max_connections': '9'},
+             'Invalid max_connections. Should be between 1 and 4.'),
+            ({'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'limit': '99999999999999999999999'},
+             'Invalid limit. Should be between 1 and 1000.'),
+        ]:
+            response = client.get(url, query)
+            assert response.status_code == 400
+            assert response.json() == {'error': error}
@@ -0,0 +1,111 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apps.journeys.graph import get_flight_graph
+from apps.journeys.registry import get_city_registry
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+QUERIES = [
+    {'date': date, 'from': from_city, 'to': to_city, 'max_wait_time_hours': max_wait}
+    for date in ['2025-03-04', '2025-03-05']
+    for from_city, to_city in [('BUE', 'MIL'), ('bue', 'mad'), ('MVD', 'MIL'), ('SCL', 'BUE')]
+    for max_wait in [4, 12]
+]
+
+
+class TestJourneyBatchAPIView:
+    def search(self, client, query):
+        response = client.get(reverse('journey-search'), query)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('engine', ['graph', 'connections'])
+    def test_same_results_as_single_searches(self, client, fixture_data, settings, engine):
+        # Each result should be the same as running the search on its own.
+        settings.JOURNEYS_SEARCH_ENGINE = engine
+        call_command('rebuild_connections', verbosity=0)
+        response = client.post(reverse('journey-search-batch'), {'queries': QUERIES}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()
+        assert len(results) == len(QUERIES)
+        for query, result in zip(QUERIES, results):
+            assert result['query']['from'] == query['from'].upper()
+            assert result['journeys'] == self.search(client, query)
+        assert any(result['journeys'] for result in results)
+
+    @pytest.mark.django_db
+    def test_arrival_anchored_searches(self, client, fixture_data, settings):
+        # Journeys arriving on the date can depart the day before, which the working set must include.
+        settings.JOURNEYS_SEARCH_ENGINE = 'connections'
+        call_command('rebuild_connections', verbosity=0)
+        queries = [
+            {**query, 'anchor': 'arrival', 'max_wait_time_hours': 24}
+            for query in QUERIES
+            if query['date'] == '2025-03-05'
+        ]
+        response = client.post(reverse('journey-search-batch'), {'queries': queries}, format='json')
+        results = response.json()
+        for query, result in zip(queries, results):
+            assert result['journeys'] == self.search(client, query)
+        assert any(
+            journey['path'][0]['departure_time'][:10] < query['date']
+            for query, result in zip(queries, results)
+            for journey in result['journeys']
+        )
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('engine, max_queries', [('graph', 0), ('connections', 3)])
+    def test_queries_do_not_grow_with_batch_size(
+        self, client, fixture_data, settings, django_assert_max_num_queries, engine, max_queries
+    ):
+        # Cities are validated in memory; flight events are in memory too, or fetched with one query
+        # (after checking no schedule applies).
+        settings.JOURNEYS_SEARCH_ENGINE = engine
+        get_flight_graph()
+        get_city_registry()
+        with django_assert_max_num_queries(max_queries):
+            client.post(reverse('journey-search-batch'), {'queries': QUERIES}, format='json')
+
+    @pytest.mark.django_db
+    def test_errors_are_inline(self, client, fixture_data):
+        # Invalid queries should get an error without failing the others.
+        queries = [
+            {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL'},
+            {'date': 'invalid-date', 'from': 'BUE', 'to': 'MIL'},
+            {'date': '2025-03-05', 'from': 'XYZ', 'to': 'MIL'},
+            {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'max_wait_time_hours': 'abc'},
+            {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'max_wait_time_hours': 10 ** 10},
+            {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'max_connections': True},
+            {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'max_connections': 1.5},
+            {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'limit': 0},
+            {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'limit': None},
+            {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'depart_after': ''},
+            {'date': '2025-03-05', 'from': 'BUE'},
+            'not a query',
+        ]
+        response = client.post(reverse('journey-search-batch'), {'queries': queries}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()
+        assert 'journeys' in results[0]
+        for query, result in zip(queries[1:], results[1:]):
+            assert result['query'] == query
+            assert 'error' in result
+        assert results[2]['error'] == 'City with code "XYZ" does not exist.'
+
+    @pytest.mark.django_db
+    def test_invalid_body(self, client, settings):
+        settings.JOURNEYS_BATCH_MAX_QUERIES = 2
+        url = reverse('journey-search-batch')
+        for body in [{}, {'queries': 'BUE'}, {'queries': QUERIES[:3]}]:
+            response = client.post(url, body, format='json')
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert 'error' in response.json()
@@ -0,0 +1,92 @@
+from datetime import datetime
+from unittest import mock
+
+import pytest
+from django.db import transaction
+from django.utils import timezone
+
+from apps.journeys import utils
+from apps.journeys.models import FlightEvent
+from apps.journeys.utils import get_journeys
+
+
+@pytest.fixture
+def flight_event(basic_flight_data):
+    return FlightEvent.objects.create(
+        flight=basic_flight_data['flight'],
+        departure_time=timezone.make_aware(datetime(2025, 3, 3, 10, 0, 0)),
+        arrival_time=timezone.make_aware(datetime(2025, 3, 3, 14, 0, 0)),
+        departure_city=basic_flight_data['city_1'],
+        arrival_city=basic_flight_data['city_2']
+    )
+
+
+def count_searches():
+    return mock.patch.object(utils, 'find_journeys', wraps=utils.find_journeys)
+
+
+class TestSearchCache:
+    @pytest.mark.django_db
+    def test_identical_searches_are_cached(self, flight_event):
+        # Equivalent searches (e.g. lowercase codes) should only run once.
+        with count_searches() as find_journeys:
+            first = get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+            second = get_journeys('2025-03-03', 'bue', 'mad', '4')
+        assert first == second
+        assert find_journeys.call_count == 1
+
+    @pytest.mark.django_db
+    def test_event_changes_invalidate_their_day(self, flight_event, basic_flight_data):
+        # A change on a day should invalidate that day (and the day before), but not the others.
+        get_journeys('2025-03-02', 'BUE', 'MAD', 4)
+        get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+        get_journeys('2025-03-05', 'BUE', 'MAD', 4)
+
+        flight_event.arrival_time = timezone.make_aware(datetime(2025, 3, 3, 15, 0, 0))
+        flight_event.save()
+        with count_searches() as find_journeys:
+            journeys = get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+            get_journeys('2025-03-02', 'BUE', 'MAD', 4)
+            get_journeys('2025-03-05', 'BUE', 'MAD', 4)
+        assert journeys[0]['path'][0]['arrival_time'] == '2025-03-03 15:00'
+        assert find_journeys.call_count == 2
+
+    @pytest.mark.django_db
+    def test_moving_an_event_invalidates_its_previous_day(self, flight_event):
+        # Moving an event to another day should invalidate the day it left too.
+        assert len(get_journeys('2025-03-03', 'BUE', 'MAD', 4)) == 1
+        flight_event.departure_time = timezone.make_aware(datetime(2025, 3, 10, 10, 0, 0))
+        flight_event.arrival_time = timezone.make_aware(datetime(2025, 3, 10, 14, 0, 0))
+        flight_event.save()
+        assert get_journeys('2025-03-03', 'BUE', 'MAD', 4) == []
+
+    @pytest.mark.django_db
+    def test_city_changes_invalidate_everything(self, flight_event, basic_flight_data):
+        # City codes are part of every result, so any city change should invalidate all the searches.
+        get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+        basic_flight_data['city_2'].name = 'Madrid'
+        basic_flight_data['city_2'].save()
+        with count_searches() as find_journeys:
+            get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+        assert find_journeys.call_count == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_searches_cached_before_commit_are_invalidated(self, flight_event):
+        # A search cached while the change wasn't committed yet should be invalidated on commit.
+        with transaction.atomic():
+            flight_event.arrival_time = timezone.make_aware(datetime(2025, 3, 3, 15, 0, 0))
+            flight_event.save()
+            get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+        with count_searches() as find_journeys:
+            journeys = get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+        assert journeys[0]['path'][0]['arrival_time'] == '2025-03-03 15:00'
+        assert find_journeys.call_count == 1
+
+    @pytest.mark.django_db
+    def test_cache_can_be_disabled(self, flight_event, settings):
+        # With a timeout of 0, every search should run.
+        settings.JOURNEYS_CACHE_TIMEOUT = 0
+        with count_searches() as find_journeys:
+            get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+            get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+        assert find_journeys.call_count == 2
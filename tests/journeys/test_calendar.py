@@ -0,0 +1,106 @@
+from datetime import date, timedelta
+from itertools import product
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apps.journeys.calendar import get_calendar
+from apps.journeys.graph import get_flight_graph
+from apps.journeys.models import City
+from apps.journeys.registry import get_city_registry
+from apps.journeys.utils import get_journeys
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+def expected_calendar(day, from_city, to_city, window, max_wait_time_hours, max_connections):
+    # Reference: one search per day.
+    calendar = []
+    for offset in range(-window, window + 1):
+        other_day = (date.fromisoformat(day) + timedelta(days=offset)).isoformat()
+        journeys = get_journeys(other_day, from_city, to_city, max_wait_time_hours, max_connections)
+        shortest = get_journeys(
+            other_day, from_city, to_city, max_wait_time_hours, max_connections, sort='duration', limit=1
+        )
+        calendar.append((other_day, len(journeys), shortest[0] if shortest else None))
+    return calendar
+
+
+class TestCalendar:
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('engine, max_connections', [('graph', 2), ('graph', 3), ('connections', 2)])
+    def test_matches_daily_searches(self, fixture_data, settings, engine, max_connections):
+        call_command('rebuild_connections', verbosity=0)
+        settings.JOURNEYS_SEARCH_ENGINE = engine
+        settings.JOURNEYS_CACHE_TIMEOUT = 0
+        codes = list(City.objects.values_list('code', flat=True))
+        for from_city, to_city in product(codes, codes):
+            if from_city == to_city:
+                continue
+            calendar = get_calendar('2025-03-04', from_city, to_city, 2, 12, max_connections)
+            assert [
+                (day['date'], day['journeys'], day['shortest']) for day in calendar
+            ] == expected_calendar('2025-03-04', from_city, to_city, 2, 12, max_connections)
+
+    @pytest.mark.django_db
+    def test_duration(self, fixture_data):
+        for day in get_calendar('2025-03-04', 'BUE', 'MIL', 1):
+            if day['shortest'] is None:
+                assert day['duration_minutes'] is None
+                continue
+            path = day['shortest']['path']
+            departure = date.fromisoformat(path[0]['departure_time'][:10])
+            assert day['date'] == departure.isoformat()
+            assert day['duration_minutes'] > 0
+
+
+class TestJourneyCalendarAPIView:
+    @pytest.mark.django_db
+    def test_get_calendar(self, client, fixture_data):
+        get_city_registry()
+        get_flight_graph()
+        url = reverse('journey-search-calendar')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, {'date': '2025-03-04', 'from': 'bue', 'to': 'mil', 'window': 1})
+        assert response.status_code == status.HTTP_200_OK
+        # The days are searched at once, on the in-memory timetable.
+        assert len(queries) == 0
+        assert [day['date'] for day in response.json()] == ['2025-03-03', '2025-03-04', '2025-03-05']
+        calendar = get_calendar('2025-03-04', 'BUE', 'MIL', 1)
+        assert [day['journeys'] for day in response.json()] == [day['journeys'] for day in calendar]
+        # The shortest journeys are in the same format as the search.
+        for day in response.json():
+            search = client.get(
+                reverse('journey-search'),
+                {'date': day['date'], 'from': 'BUE', 'to': 'MIL', 'sort': 'duration', 'limit': 1},
+            )
+            assert day['shortest'] == (search.json()[0] if search.json() else None)
+
+    @pytest.mark.django_db
+    def test_get_calendar_validation(self, client, fixture_data, settings):
+        url = reverse('journey-search-calendar')
+        params = {'date': '2025-03-04', 'from': 'BUE', 'to': 'MIL'}
+        response = client.get(url, {'date': '2025-03-04', 'from': 'BUE'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        for window in ['-1', str(settings.JOURNEYS_CALENDAR_MAX_WINDOW + 1), 'week']:
+            response = client.get(url, {**params, 'window': window})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert 'window' in response.json()['error']
+        for date in ['0001-01-04', '9999-12-27']:
+            response = client.get(url, {**params, 'date': date})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert response.json() == {'error': 'Invalid date. Should be between 0001-01-05 and 9999-12-26.'}
+        for date in ['0001-01-05', '9999-12-26']:
+            assert client.get(url, {**params, 'date': date}).status_code == status.HTTP_200_OK
+        response = client.get(url, {**params, 'date': '0001-01-01', 'window': 0})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = client.get(url, {**params, 'from': 'XYZ'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from datetime import date
+
+import pytest
+from django.urls import reverse
+
+from apps.journeys import coalescing
+from apps.journeys.cache import acached_search, cached_search
+from apps.journeys.coalescing import acoalesce, coalesce, get_counters, reset_counters
+
+CALLERS = 5
+
+
+@pytest.fixture(autouse=True)
+def counters():
+    reset_counters()
+    yield
+    reset_counters()
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def run_concurrently(call, release):
+    # The first caller runs the search, and is only released once the others are waiting for it.
+    results = [None] * CALLERS
+
+    def caller(index):
+        try:
+            results[index] = call()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=caller, args=(index,)) for index in range(CALLERS)]
+    threads[0].start()
+    wait_until(lambda: coalescing._calls)
+    for thread in threads[1:]:
+        thread.start()
+    wait_until(lambda: get_counters()['coalesced'] == CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestCoalescing:
+    def test_concurrent_calls_share_the_result(self):
+        release = threading.Event()
+        runs = []
+
+        def search():
+            release.wait()
+            runs.append(1)
+            return ['journey']
+
+        results = run_concurrently(lambda: coalesce('key', search), release)
+        assert len(runs) == 1
+        assert all(result is results[0] for result in results)
+        assert get_counters() == {'executed': 1, 'coalesced': CALLERS - 1}
+        assert coalescing._calls == {}
+        # Calls after it finished run it again.
+        assert coalesce('key', search) == ['journey']
+        assert get_counters()['executed'] == 2
+
+    def test_errors_are_shared(self):
+        release = threading.Event()
+
+        def search():
+            release.wait()
+            raise ValueError('Search failed.')
+
+        results = run_concurrently(lambda: coalesce('key', search), release)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert coalescing._calls == {}
+
+    @pytest.mark.parametrize('timeout', [0, 300])
+    def test_cached_search(self, settings, timeout):
+        settings.JOURNEYS_CACHE_TIMEOUT = timeout
+        release = threading.Event()
+
+        def search():
+            release.wait()
+            return ['journey']
+
+        results = run_concurrently(lambda: cached_search(date(2025, 3, 5), ['search'], search), release)
+        assert results == [['journey']] * CALLERS
+        assert get_counters() == {'executed': 1, 'coalesced': CALLERS - 1}
+
+    def test_async_calls_share_the_result(self):
+        runs = []
+
+        async def search():
+            await asyncio.sleep(0.01)
+            runs.append(1)
+            return ['journey']
+
+        async def main():
+            return await asyncio.gather(*(acoalesce('key', search) for _ in range(CALLERS)))
+
+        results = asyncio.run(main())
+        assert len(runs) == 1
+        assert all(result is results[0] for result in results)
+        assert get_counters() == {'executed': 1, 'coalesced': CALLERS - 1}
+        assert coalescing._futures == {}
+
+    def test_async_errors_and_cancellations(self):
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError('Search failed.')
+
+        async def search():
+            await asyncio.sleep(0.01)
+            return ['journey']
+
+        async def main():
+            results = await asyncio.gather(*(acoalesce('key', failing) for _ in range(CALLERS)), return_exceptions=True)
+            assert all(isinstance(result, ValueError) for result in results)
+
+            # Cancelling the running call hands the search over to a waiting one.
+            leader = asyncio.ensure_future(acoalesce('key', search))
+            await asyncio.sleep(0)
+            waiters = [asyncio.ensure_future(acoalesce('key', search)) for _ in range(2)]
+            await asyncio.sleep(0)
+            leader.cancel()
+            assert await asyncio.gather(*waiters) == [['journey'], ['journey']]
+            # Cancelling a waiting call doesn't cancel the search.
+            leader = asyncio.ensure_future(acoalesce('key', search))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(acoalesce('key', search))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            assert await leader == ['journey']
+
+        asyncio.run(main())
+        assert coalescing._futures == {}
+
+    def test_async_cached_search(self, settings):
+        settings.JOURNEYS_CACHE_TIMEOUT = 0
+
+        async def search():
+            await asyncio.sleep(0.01)
+            return ['journey']
+
+        async def main():
+            return await asyncio.gather(*(acached_search(date(2025, 3, 5), ['search'], search) for _ in range(CALLERS)))
+
+        assert asyncio.run(main()) == [['journey']] * CALLERS
+        assert get_counters() == {'executed': 1, 'coalesced': CALLERS - 1}
+
+    def test_disabled(self, settings):
+        settings.JOURNEYS_COALESCING = False
+        settings.JOURNEYS_CACHE_TIMEOUT = 0
+        assert cached_search(date(2025, 3, 5), ['search'], lambda: ['journey']) == ['journey']
+        assert get_counters() == {'executed': 0, 'coalesced': 0}
+
+    @pytest.mark.django_db
+    def test_metrics(self, client, fixture_data):
+        # The counters don't need the instrumentation.
+        client.get(reverse('journey-search'), {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL'})
+        assert client.get(reverse('journey-metrics')).json()['searches'] == {'executed': 1, 'coalesced': 0}
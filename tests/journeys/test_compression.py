@@ -0,0 +1,98 @@
+import gzip
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from apps.journeys.compression import accepted_encodings, brotli
+
+SEARCH = {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL', 'max_wait_time_hours': 24}
+
+
+def expand(compact):
+    # Back to the regular format, from the compact one.
+    legs = compact['legs']
+    return [
+        {
+            'connections': 0 if len(journey) == 1 else len(journey),
+            'path': [
+                {
+                    'arrival_time': legs['arrival_time'][index],
+                    'departure_time': legs['departure_time'][index],
+                    'flight_number': legs['flight_number'][index],
+                    'from': legs['from'][index],
+                    'to': legs['to'][index],
+                }
+                for index in journey
+            ],
+        }
+        for journey in compact['journeys']
+    ]
+
+
+class TestCompression:
+    def test_accepted_encodings(self):
+        assert accepted_encodings('gzip, deflate, br') == {'gzip', 'deflate', 'br'}
+        assert accepted_encodings('br;q=0, GZIP;q=0.5') == {'gzip'}
+        assert accepted_encodings('') == set()
+
+    @pytest.mark.django_db
+    def test_large_responses_are_compressed(self, client, fixture_data, settings):
+        settings.JOURNEYS_COMPRESSION_MIN_SIZE = 1024
+        url = reverse('journey-search')
+        plain = client.get(url)
+        assert len(plain.content) >= 1024
+        assert not plain.has_header('Content-Encoding')
+
+        response = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response['Vary']
+        assert gzip.decompress(response.content) == plain.content
+        assert int(response['Content-Length']) == len(response.content) < len(plain.content)
+
+    @pytest.mark.django_db
+    def test_small_responses_are_not_compressed(self, client, fixture_data, settings):
+        settings.JOURNEYS_COMPRESSION_MIN_SIZE = 1024
+        response = client.get(reverse('journey-search'), SEARCH, HTTP_ACCEPT_ENCODING='gzip')
+        assert len(response.content) < 1024
+        assert not response.has_header('Content-Encoding')
+
+        settings.JOURNEYS_COMPRESSION_MIN_SIZE = 0
+        response = client.get(reverse('journey-search'), HTTP_ACCEPT_ENCODING='gzip')
+        assert not response.has_header('Content-Encoding')
+
+    @pytest.mark.django_db
+    def test_streamed_responses_are_compressed(self, client, fixture_data):
+        url = reverse('journey-search')
+        plain = b''.join(client.get(url, {'format': 'ndjson'}).streaming_content)
+        response = client.get(url, {'format': 'ndjson'}, HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(b''.join(response.streaming_content)) == plain
+
+    @pytest.mark.django_db
+    @pytest.mark.skipif(brotli is None, reason='brotli is not installed')
+    def test_brotli_is_preferred(self, client, fixture_data):
+        url = reverse('journey-search')
+        plain = client.get(url)
+        response = client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        assert response['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.content) == plain.content
+
+
+class TestCompactFormat:
+    @pytest.mark.django_db
+    def test_compact_search(self, client, fixture_data):
+        url = reverse('journey-search')
+        journeys = client.get(url, SEARCH).json()
+        response = client.get(url, {**SEARCH, 'format': 'compact'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/vnd.airlink.compact+json'
+        compact = response.json()
+        assert expand(compact) == journeys
+        # Another representation, another ETag.
+        assert response['ETag'] != client.get(url, SEARCH)['ETag']
+
+    @pytest.mark.django_db
+    def test_compact_listing_is_rejected(self, client, fixture_data):
+        response = client.get(reverse('journey-search'), {'format': 'compact'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from apps.journeys import views
+from apps.journeys.models import FlightEvent
+
+SEARCH = {'date': '2025-03-04', 'from': 'BUE', 'to': 'MIL'}
+
+
+class TestConditionalSearch:
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('url_name', ['journey-search', 'journey-search-async'])
+    def test_etag_and_cache_control(self, client, fixture_data, settings, url_name):
+        settings.JOURNEYS_HTTP_MAX_AGE = 60
+        response = client.get(reverse(url_name), SEARCH)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'].startswith('"')
+        assert response['Cache-Control'] == 'public, max-age=60'
+        assert 'Accept' in response['Vary']
+        # Same search, same ETag; another search, another one.
+        assert client.get(reverse(url_name), SEARCH)['ETag'] == response['ETag']
+        assert client.get(reverse(url_name), {**SEARCH, 'max_wait_time_hours': 12})['ETag'] != response['ETag']
+        assert client.get(reverse(url_name), {**SEARCH, 'date': '2025-03-05'})['ETag'] != response['ETag']
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('url_name', ['journey-search', 'journey-search-async'])
+    def test_not_modified_skips_the_search(self, client, fixture_data, monkeypatch, url_name):
+        etag = client.get(reverse(url_name), SEARCH)['ETag']
+
+        def search(*args, **kwargs):
+            raise AssertionError('The search should not run.')
+
+        monkeypatch.setattr(views, 'get_journeys', search)
+        monkeypatch.setattr(views, 'aget_journeys', search)
+        response = client.get(reverse(url_name), SEARCH, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+        assert response.content == b''
+
+    @pytest.mark.django_db
+    def test_timetable_changes_change_the_etag(self, client, fixture_data):
+        url = reverse('journey-search')
+        etag = client.get(url, SEARCH)['ETag']
+        # Events departing on other days don't affect the search.
+        flight_event = FlightEvent.objects.filter(departure_time__date='2025-03-03').first()
+        flight_event.arrival_time += timedelta(minutes=5)
+        flight_event.save()
+        assert client.get(url, SEARCH, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        flight_event = FlightEvent.objects.filter(departure_time__date='2025-03-04').first()
+        flight_event.arrival_time += timedelta(minutes=5)
+        flight_event.save()
+        response = client.get(url, SEARCH, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
@@ -0,0 +1,74 @@
+from datetime import datetime
+from itertools import product
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from apps.journeys.models import City, Connection, FlightEvent
+from apps.journeys.utils import get_journeys
+
+
+@pytest.fixture
+def connections_engine(settings):
+    settings.JOURNEYS_SEARCH_ENGINE = 'connections'
+
+
+class TestConnections:
+    @pytest.mark.django_db
+    def test_rebuild_matches_graph_search(self, fixture_data, settings):
+        # The connections table should answer the same as the in-memory graph.
+        codes = list(City.objects.values_list('code', flat=True))
+        queries = [
+            (date, from_city, to_city, max_wait)
+            for date, from_city, to_city, max_wait in product(
+                ['2025-03-03', '2025-03-04', '2025-03-05'], codes, codes, [4, 12]
+            )
+            if from_city != to_city
+        ]
+        expected = [get_journeys(*query) for query in queries]
+
+        call_command('rebuild_connections', verbosity=0)
+        settings.JOURNEYS_SEARCH_ENGINE = 'connections'
+        assert Connection.objects.exists()
+        assert [get_journeys(*query) for query in queries] == expected
+
+    @pytest.mark.django_db
+    def test_incremental_update_matches_rebuild(self, connections_engine, fixture_data):
+        # Connections maintained from the signals should be the same as a full rebuild.
+        def pairs():
+            return set(Connection.objects.values_list('first_leg_id', 'second_leg_id', 'wait_time'))
+
+        incremental = pairs()
+        call_command('rebuild_connections', verbosity=0)
+        assert incremental == pairs()
+
+    @pytest.mark.django_db
+    def test_connections_follow_flight_event_changes(self, connections_engine, basic_flight_data):
+        country = basic_flight_data['country_2']
+        rome = City.objects.create(code='ROM', name='Rome', country=country)
+        first_leg = FlightEvent.objects.create(
+            flight=basic_flight_data['flight'],
+            departure_time=timezone.make_aware(datetime(2025, 3, 3, 10, 0, 0)),
+            arrival_time=timezone.make_aware(datetime(2025, 3, 3, 14, 0, 0)),
+            departure_city=basic_flight_data['city_1'],
+            arrival_city=basic_flight_data['city_2']
+        )
+        second_leg = FlightEvent.objects.create(
+            flight=basic_flight_data['flight'],
+            departure_time=timezone.make_aware(datetime(2025, 3, 3, 16, 0, 0)),
+            arrival_time=timezone.make_aware(datetime(2025, 3, 3, 18, 0, 0)),
+            departure_city=basic_flight_data['city_2'],
+            arrival_city=rome
+        )
+        assert len(get_journeys('2025-03-03', 'BUE', 'ROM', 4)) == 1
+
+        # Moving the second flight out of the wait time (but within 24 hours) keeps the connection.
+        second_leg.departure_time = timezone.make_aware(datetime(2025, 3, 3, 20, 0, 0))
+        second_leg.arrival_time = timezone.make_aware(datetime(2025, 3, 3, 22, 0, 0))
+        second_leg.save()
+        assert get_journeys('2025-03-03', 'BUE', 'ROM', 4) == []
+        assert len(get_journeys('2025-03-03', 'BUE', 'ROM', 6)) == 1
+
+        first_leg.delete()
+        assert not Connection.objects.exists()
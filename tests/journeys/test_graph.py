@@ -0,0 +1,409 @@
+from datetime import datetime, timedelta
+from itertools import product
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.journeys.graph import FlightGraph, get_flight_graph, numpy
+from apps.journeys.models import City, FlightEvent
+from apps.journeys.utils import SORTS, get_journeys, parse_journey
+from benchmarks.synthetic import generate_network
+
+
+def orm_journeys(date, from_city, to_city, max_wait_time_hours):
+    # Reference implementation: the original per-leg ORM search.
+    start_date = timezone.make_aware(datetime.strptime(date, '%Y-%m-%d'))
+    max_wait_time = timedelta(hours=int(max_wait_time_hours))
+    journeys = []
+    initial_flights = FlightEvent.objects.filter(
+        departure_time__date=start_date,
+        departure_city__code=from_city
+    )
+    for flight in initial_flights.filter(arrival_city__code=to_city):
+        if flight.get_duration() <= timedelta(hours=24):
+            journeys.append([flight])
+    for flight1 in initial_flights.exclude(arrival_city__code=to_city):
+        potential_connections = FlightEvent.objects.filter(
+            departure_city=flight1.arrival_city,
+            arrival_city__code=to_city,
+            departure_time__gt=flight1.arrival_time,
+        )
+        for flight2 in potential_connections:
+            wait_time = flight2.departure_time - flight1.arrival_time
+            total_duration = flight2.arrival_time - flight1.departure_time
+            if wait_time <= max_wait_time and total_duration <= timedelta(hours=24):
+                journeys.append([flight1, flight2])
+    return parse_journey(journeys)
+
+
+class TestFlightGraph:
+    @pytest.mark.django_db
+    def test_matches_orm_search(self, fixture_data):
+        # Should return the same journeys, in the same order, as the per-leg ORM search.
+        codes = list(City.objects.values_list('code', flat=True))
+        for date, max_wait in product(['2025-03-03', '2025-03-04', '2025-03-05'], [1, 4, 12]):
+            for from_city, to_city in product(codes, codes):
+                if from_city == to_city:
+                    continue
+                expected = orm_journeys(date, from_city, to_city, max_wait)
+                assert get_journeys(date, from_city, to_city, max_wait) == expected
+
+    @pytest.mark.django_db
+    def test_search_runs_without_queries(self, fixture_data):
+        # Once loaded, the graph should answer searches without hitting the database.
+        get_flight_graph()
+        with CaptureQueriesContext(connection) as queries:
+            get_journeys('2025-03-05', 'BUE', 'MIL', 4)
+        assert len(queries) == 0
+
+    @pytest.mark.django_db
+    def test_graph_reloads_on_changes(self, basic_flight_data):
+        # Should see flight events created after the graph was loaded.
+        assert get_journeys('2025-03-03', 'BUE', 'MAD', 4) == []
+        FlightEvent.objects.create(
+            flight=basic_flight_data['flight'],
+            departure_time=timezone.make_aware(datetime(2025, 3, 3, 10, 0, 0)),
+            arrival_time=timezone.make_aware(datetime(2025, 3, 3, 14, 0, 0)),
+            departure_city=basic_flight_data['city_1'],
+            arrival_city=basic_flight_data['city_2']
+        )
+        journeys = get_journeys('2025-03-03', 'BUE', 'MAD', 4)
+        assert len(journeys) == 1
+        assert journeys[0]['path'][0]['departure_time'] == '2025-03-03 10:00'
+
+
+@pytest.fixture
+def network(basic_flight_data):
+    # BUE -> MAD -> ROM -> PAR, plus a slower BUE -> SCL -> ROM alternative and a loop back to BUE.
+    country = basic_flight_data['country_2']
+    cities = {
+        'BUE': basic_flight_data['city_1'],
+        'MAD': basic_flight_data['city_2'],
+        'ROM': City.objects.create(code='ROM', name='Rome', country=country),
+        'PAR': City.objects.create(code='PAR', name='Paris', country=country),
+        'SCL': City.objects.create(code='SCL', name='Santiago', country=country),
+    }
+    legs = [
+        ('BUE', 'MAD', (3, 1), (3, 4)),
+        ('MAD', 'ROM', (3, 5), (3, 7)),
+        ('ROM', 'PAR', (3, 8), (3, 9)),
+        ('BUE', 'SCL', (3, 1), (3, 2)),
+        ('SCL', 'ROM', (3, 3), (3, 7)),
+        ('MAD', 'BUE', (3, 5), (3, 6)),
+        ('BUE', 'PAR', (3, 7), (3, 12)),
+    ]
+    for from_city, to_city, (day, departure), (arrival_day, arrival) in legs:
+        FlightEvent.objects.create(
+            flight=basic_flight_data['flight'],
+            departure_time=timezone.make_aware(datetime(2025, 3, day, departure, 0, 0)),
+            arrival_time=timezone.make_aware(datetime(2025, 3, arrival_day, arrival, 0, 0)),
+            departure_city=cities[from_city],
+            arrival_city=cities[to_city]
+        )
+
+
+class TestMultiHopSearch:
+    @staticmethod
+    def routes(journeys):
+        return [[leg['_from'] for leg in journey['path']] + [journey['path'][-1]['to']] for journey in journeys]
+
+    @pytest.mark.django_db
+    def test_default_search_stops_at_two_flights(self, network):
+        # Without max_connections, only direct and 2-flight journeys should be returned.
+        journeys = get_journeys('2025-03-03', 'BUE', 'PAR', 4)
+        assert self.routes(journeys) == [['BUE', 'PAR']]
+
+    @pytest.mark.django_db
+    def test_three_flight_journeys(self, network):
+        # Should find 3-flight journeys, sorted by number of flights.
+        journeys = get_journeys('2025-03-03', 'BUE', 'PAR', 4, max_connections=3)
+        assert self.routes(journeys) == [['BUE', 'PAR'], ['BUE', 'MAD', 'ROM', 'PAR'], ['BUE', 'SCL', 'ROM', 'PAR']]
+        assert journeys[1]['connections'] == 3
+
+    @pytest.mark.django_db
+    def test_dominated_paths_are_pruned(self, network, basic_flight_data):
+        # A later BUE -> MAD flight catches the same MAD -> ROM flight: the BUE -> MAD -> ROM path
+        # departing at 01:00 isn't extended, but the 2-flight journey itself is still returned.
+        FlightEvent.objects.create(
+            flight=basic_flight_data['flight'],
+            departure_time=timezone.make_aware(datetime(2025, 3, 3, 2, 0, 0)),
+            arrival_time=timezone.make_aware(datetime(2025, 3, 3, 4, 0, 0)),
+            departure_city=basic_flight_data['city_1'],
+            arrival_city=basic_flight_data['city_2'],
+        )
+        journeys = get_journeys('2025-03-03', 'BUE', 'ROM', 4, max_connections=3)
+        assert self.routes(journeys) == [['BUE', 'MAD', 'ROM'], ['BUE', 'SCL', 'ROM'], ['BUE', 'MAD', 'ROM']]
+        journeys = get_journeys('2025-03-03', 'BUE', 'PAR', 4, max_connections=3)
+        # BUE -> SCL -> ROM arrives as late as BUE -> MAD -> ROM, but through another city: it's extended too.
+        assert self.routes(journeys) == [['BUE', 'PAR'], ['BUE', 'SCL', 'ROM', 'PAR'], ['BUE', 'MAD', 'ROM', 'PAR']]
+        assert journeys[2]['path'][0]['departure_time'] == '2025-03-03 02:00'
+
+    @pytest.mark.django_db
+    def test_earlier_arrivals_dont_dominate(self, basic_flight_data, settings):
+        # OOO -> XAA -> YYY arrives earlier than OOO -> XBB -> YYY, but too early for the only flight
+        # to DDD within the max. wait: the later arrival must still be extended.
+        settings.JOURNEYS_BIDIRECTIONAL_MIN_LEGS = 0
+        country = basic_flight_data['country_1']
+        cities = {
+            code: City.objects.create(code=code, name=code, country=country)
+            for code in ['OOO', 'XAA', 'XBB', 'YYY', 'DDD']
+        }
+        legs = [
+            ('OOO', 'XAA', 8, 9),
+            ('XAA', 'YYY', 9.5, 10),
+            ('OOO', 'XBB', 7, 8),
+            ('XBB', 'YYY', 11, 13),
+            ('YYY', 'DDD', 16, 17),
+        ]
+        for from_city, to_city, departure, arrival in legs:
+            FlightEvent.objects.create(
+                flight=basic_flight_data['flight'],
+                departure_time=timezone.make_aware(datetime(2025, 3, 3) + timedelta(hours=departure)),
+                arrival_time=timezone.make_aware(datetime(2025, 3, 3) + timedelta(hours=arrival)),
+                departure_city=cities[from_city],
+                arrival_city=cities[to_city]
+            )
+        journeys = get_journeys('2025-03-03', 'OOO', 'DDD', 4, max_connections=3)
+        assert self.routes(journeys) == [['OOO', 'XBB', 'YYY', 'DDD']]
+
+    @pytest.mark.django_db
+    def test_cities_are_not_revisited(self, network):
+        # BUE -> MAD -> BUE -> PAR should never be returned.
+        journeys = get_journeys('2025-03-03', 'BUE', 'PAR', 12, max_connections=4)
+        assert all(len(set(route)) == len(route) for route in self.routes(journeys))
+
+    @pytest.mark.django_db
+    def test_max_connections_one_returns_direct_flights(self, network):
+        journeys = get_journeys('2025-03-03', 'BUE', 'ROM', 4, max_connections=1)
+        assert journeys == []
+
+
+class TestTimeConstrainedSearch:
+    @staticmethod
+    def constrained(journeys, depart_after, depart_before, arrive_by):
+        # Reference: the unconstrained results, filtered by the client (times are 'YYYY-MM-DD HH:MM').
+        return [
+            journey
+            for journey in journeys
+            if depart_after <= journey['path'][0]['departure_time'] < depart_before
+            and journey['path'][-1]['arrival_time'] <= arrive_by
+        ]
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('engine', ['graph', 'connections'])
+    def test_matches_filtered_search(self, fixture_data, settings, engine):
+        call_command('rebuild_connections', verbosity=0)
+        settings.JOURNEYS_SEARCH_ENGINE = engine
+        codes = list(City.objects.values_list('code', flat=True))
+        windows = [
+            ('00:00', '12:00', '2025-03-05 00:00'),
+            ('06:30', '23:59', '2025-03-04 18:00'),
+            ('10:00', '10:00', '23:00'),
+        ]
+        for (depart_after, depart_before, arrive_by), from_city, to_city in product(windows, codes, codes):
+            if from_city == to_city:
+                continue
+            journeys = get_journeys('2025-03-04', from_city, to_city, 12)
+            absolute = [
+                value if ' ' in value else f'2025-03-04 {value}' for value in [depart_after, depart_before, arrive_by]
+            ]
+            assert get_journeys(
+                '2025-03-04', from_city, to_city, 12,
+                depart_after=depart_after, depart_before=depart_before, arrive_by=arrive_by,
+            ) == self.constrained(journeys, *absolute)
+
+    @pytest.mark.django_db
+    def test_arrive_by_prunes_connections(self, network):
+        # BUE -> MAD -> ROM -> PAR arrives at 09:00: an earlier deadline rules out the whole path.
+        routes = TestMultiHopSearch.routes
+        assert routes(get_journeys('2025-03-03', 'BUE', 'PAR', 4, max_connections=3, arrive_by='09:00')) == [
+            ['BUE', 'MAD', 'ROM', 'PAR'], ['BUE', 'SCL', 'ROM', 'PAR']
+        ]
+        assert get_journeys('2025-03-03', 'BUE', 'PAR', 4, max_connections=3, arrive_by='08:59') == []
+        # Narrowing the departure window leaves out the 01:00 departures.
+        assert routes(get_journeys('2025-03-03', 'BUE', 'PAR', 4, max_connections=3, depart_after='02:00')) == [
+            ['BUE', 'PAR']
+        ]
+
+
+class TestRankedSearch:
+    @staticmethod
+    def rank(sort, journey):
+        departure = datetime.strptime(journey['path'][0]['departure_time'], '%Y-%m-%d %H:%M')
+        arrival = datetime.strptime(journey['path'][-1]['arrival_time'], '%Y-%m-%d %H:%M')
+        return {
+            'departure': departure,
+            'arrival': arrival,
+            'duration': arrival - departure,
+            'connections': len(journey['path']),
+        }[sort], len(journey['path'])
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('engine', ['graph', 'connections'])
+    def test_matches_sorted_search(self, fixture_data, settings, engine):
+        call_command('rebuild_connections', verbosity=0)
+        settings.JOURNEYS_SEARCH_ENGINE = engine
+        codes = list(City.objects.values_list('code', flat=True))
+        for sort, from_city, to_city in product(SORTS, codes, codes):
+            if from_city == to_city:
+                continue
+            journeys = get_journeys('2025-03-04', from_city, to_city, 12)
+            ranked = get_journeys('2025-03-04', from_city, to_city, 12, sort=sort)
+            assert sorted(map(str, ranked)) == sorted(map(str, journeys))
+            assert [self.rank(sort, journey) for journey in ranked] == sorted(
+                self.rank(sort, journey) for journey in journeys
+            )
+            # The top K are the first K of the whole order, ties included.
+            for limit in [1, 2, 3]:
+                assert get_journeys('2025-03-04', from_city, to_city, 12, sort=sort, limit=limit) == ranked[:limit]
+
+    @pytest.mark.django_db
+    def test_top_k_prunes_by_arrival(self, network):
+        routes = TestMultiHopSearch.routes
+        journeys = get_journeys('2025-03-03', 'BUE', 'PAR', 4, max_connections=3, sort='arrival')
+        assert routes(journeys) == [['BUE', 'MAD', 'ROM', 'PAR'], ['BUE', 'SCL', 'ROM', 'PAR'], ['BUE', 'PAR']]
+        assert get_journeys('2025-03-03', 'BUE', 'PAR', 4, max_connections=3, sort='arrival', limit=1) == journeys[:1]
+        # Without a sort, the limit keeps the first journeys by number of flights.
+        assert routes(get_journeys('2025-03-03', 'BUE', 'PAR', 4, max_connections=3, limit=1)) == [['BUE', 'PAR']]
+
+
+class TestBidirectionalSearch:
+    @pytest.mark.django_db
+    def test_legs_to(self, network):
+        graph = get_flight_graph()
+        city = graph.code_index
+        events = {
+            (graph.city_codes[graph.departure_cities[event]], graph.city_codes[graph.arrival_cities[event]]): event
+            for event in range(len(graph))
+        }
+        start = int(timezone.make_aware(datetime(2025, 3, 3)).timestamp())
+        legs = graph.legs_to(city['PAR'], start, start + 2 * 86400, 4 * 3600, 3)
+        assert legs == {
+            events['ROM', 'PAR']: 1,
+            events['BUE', 'PAR']: 1,
+            events['MAD', 'ROM']: 2,
+            events['SCL', 'ROM']: 2,
+            # A lower bound: revisiting BUE is only ruled out by the forward search.
+            events['MAD', 'BUE']: 2,
+            events['BUE', 'MAD']: 3,
+            events['BUE', 'SCL']: 3,
+        }
+        # Nothing lands within 30 minutes of a departure to PAR.
+        assert graph.legs_to(city['PAR'], start, start + 2 * 86400, 1800, 3) == {
+            events['ROM', 'PAR']: 1,
+            events['BUE', 'PAR']: 1,
+        }
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('max_legs', [3, 4])
+    def test_matches_forward_search(self, fixture_data, max_legs):
+        graph = get_flight_graph()
+        codes = list(City.objects.values_list('code', flat=True))
+        for from_city, to_city in product(codes, codes):
+            arguments = (from_city, to_city, 0, 2 ** 40, 12 * 3600, max_legs)
+            assert graph.search(*arguments, bidirectional=True) == graph.search(*arguments)
+
+    @pytest.mark.django_db
+    def test_matches_forward_search_with_dominated_paths(self, monkeypatch):
+        # A hub-and-spoke network, where many paths catch the same flights at the hubs.
+        network = generate_network(cities=24, hubs=3, flights_per_day=300, days=2, isolated=0)
+        graph = get_flight_graph()
+        dropped = []
+        prune_dominated = graph._prune_dominated
+
+        def counting_prune_dominated(paths, *args):
+            kept = prune_dominated(paths, *args)
+            dropped.append(len(paths) - len(kept))
+            return kept
+
+        monkeypatch.setattr(graph, '_prune_dominated', counting_prune_dominated)
+        start = int(timezone.make_aware(datetime(2025, 3, 1)).timestamp())
+        codes = [city.code for city in network.hubs + network.spokes]
+        for from_city, to_city, max_legs in product(codes, codes, [3, 4]):
+            arguments = (from_city, to_city, start, start + 86400, 4 * 3600, max_legs)
+            assert graph.search(*arguments, bidirectional=True) == graph.search(*arguments)
+        assert sum(dropped) > 0
+
+    @pytest.mark.django_db
+    def test_is_used_from_min_legs(self, network, settings, monkeypatch):
+        graph = get_flight_graph()
+        calls = []
+        legs_to = graph.legs_to
+        monkeypatch.setattr(graph, 'legs_to', lambda *args: calls.append(args) or legs_to(*args))
+        settings.JOURNEYS_BIDIRECTIONAL_MIN_LEGS = 3
+        assert TestMultiHopSearch.routes(get_journeys('2025-03-03', 'BUE', 'PAR', 4, max_connections=3)) == [
+            ['BUE', 'PAR'], ['BUE', 'MAD', 'ROM', 'PAR'], ['BUE', 'SCL', 'ROM', 'PAR']
+        ]
+        get_journeys('2025-03-03', 'BUE', 'ROM', 4, max_connections=2)
+        assert len(calls) == 1
+
+
+class TestArrivalAnchoredSearch:
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('engine', ['graph', 'connections'])
+    def test_matches_departure_searches(self, fixture_data, settings, engine):
+        call_command('rebuild_connections', verbosity=0)
+        settings.JOURNEYS_SEARCH_ENGINE = engine
+        codes = list(City.objects.values_list('code', flat=True))
+        for from_city, to_city in product(codes, codes):
+            if from_city == to_city:
+                continue
+            # Reference: the journeys departing on the day before or on the date, arriving on the date.
+            expected = [
+                journey
+                for date in ['2025-03-04', '2025-03-05']
+                for journey in get_journeys(date, from_city, to_city, 12, sort='arrival')
+                if journey['path'][-1]['arrival_time'].startswith('2025-03-05')
+            ]
+            journeys = get_journeys('2025-03-05', from_city, to_city, 12, sort='arrival', anchor='arrival')
+            assert sorted(map(str, journeys)) == sorted(map(str, expected))
+            arrive_by = get_journeys(
+                '2025-03-05', from_city, to_city, 12, sort='arrival', anchor='arrival', arrive_by='12:00'
+            )
+            assert arrive_by == [
+                journey for journey in journeys if journey['path'][-1]['arrival_time'] <= '2025-03-05 12:00'
+            ]
+
+
+@pytest.mark.skipif(numpy is None, reason='numpy is not installed')
+class TestVectorizedPairing:
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('snapshot', [False, True])
+    def test_matches_pair_by_pair_search(self, fixture_data, settings, tmp_path, snapshot):
+        graph = get_flight_graph()
+        if snapshot:
+            path = str(tmp_path / 'timetable.snapshot')
+            graph.save_snapshot(path)
+            graph = FlightGraph.from_snapshot(path)
+        codes = list(City.objects.values_list('code', flat=True))
+        day = int(timezone.make_aware(datetime(2025, 3, 5)).timestamp())
+        searches = [
+            {},
+            {'arrive_by': day + 12 * 3600},
+            {'arrive_after': day + 86400, 'arrive_by': day + 86400 + 12 * 3600},
+            {'sort': 'duration', 'limit': 2},
+        ]
+        for from_city, to_city, max_wait, options in product(codes, codes, [3600, 12 * 3600], searches):
+            arguments = (from_city, to_city, day - 86400, day + 86400, max_wait)
+            settings.JOURNEYS_VECTORIZED_MIN_FLIGHTS = 0
+            expected = graph.search(*arguments, **options)
+            settings.JOURNEYS_VECTORIZED_MIN_FLIGHTS = 1
+            assert graph.search(*arguments, **options) == expected
+
+    @pytest.mark.django_db
+    def test_is_used_from_min_flights(self, fixture_data, settings, monkeypatch):
+        graph = get_flight_graph()
+        calls = []
+        pair_legs = graph._pair_legs
+        monkeypatch.setattr(graph, '_pair_legs', lambda *args: calls.append(args) or pair_legs(*args))
+        settings.JOURNEYS_VECTORIZED_MIN_FLIGHTS = 1
+        assert get_journeys('2025-03-05', 'BUE', 'MIL', 24) != []
+        get_journeys('2025-03-05', 'BUE', 'MIL', 24, max_connections=3)
+        assert len(calls) == 1
+
+        settings.JOURNEYS_VECTORIZED_MIN_FLIGHTS = 0
+        get_journeys('2025-03-05', 'BUE', 'MIL', 12)
+        assert len(calls) == 1
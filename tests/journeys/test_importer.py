@@ -0,0 +1,154 @@
+import csv
+import json
+from io import StringIO
+from itertools import product
+
+import pytest
+from django.core.management import call_command
+from django.db import DatabaseError
+
+from apps.journeys import graph as graph_module
+from apps.journeys.graph import get_flight_graph
+from apps.journeys.importer import TimetableImporter
+from apps.journeys.models import City, Flight, FlightEvent
+from apps.journeys.utils import get_journeys
+
+FIELDS = ['flight_number', 'from', 'to', 'departure_time', 'arrival_time']
+
+
+def export_rows():
+    return [
+        {
+            'flight_number': event.flight.number,
+            'from': event.departure_city.code,
+            'to': event.arrival_city.code,
+            'departure_time': event.departure_time.isoformat(),
+            'arrival_time': event.arrival_time.isoformat(),
+        }
+        for event in FlightEvent.objects.select_related('flight', 'departure_city', 'arrival_city').order_by('id')
+    ]
+
+
+class TestImportTimetable:
+    @pytest.mark.django_db
+    def test_import_matches_fixture_search(self, fixture_data, tmp_path):
+        # Re-importing the fixture timetable (into new flights) should give the same search results.
+        codes = list(City.objects.values_list('code', flat=True))
+        queries = [
+            (date, from_city, to_city, 12)
+            for date, from_city, to_city in product(['2025-03-03', '2025-03-04'], codes, codes)
+            if from_city != to_city
+        ]
+        expected = [get_journeys(*query) for query in queries]
+
+        rows = export_rows()
+        path = tmp_path / 'timetable.csv'
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        FlightEvent.objects.all().delete()
+        Flight.objects.all().delete()
+
+        out = StringIO()
+        call_command('import_timetable', str(path), batch_size=7, stdout=out)
+        assert f'Imported {len(rows)} flight events' in out.getvalue()
+        assert FlightEvent.objects.count() == len(rows)
+        assert [get_journeys(*query) for query in queries] == expected
+
+    @pytest.mark.django_db
+    def test_import_rejects_invalid_rows(self, basic_flight_data, tmp_path):
+        rows = [
+            ['AA1234', 'BUE', 'MAD', '2025-03-03T10:00', '2025-03-03T20:00'],
+            ['BB5678', 'MAD', 'BUE', '2025-03-04T10:00', '2025-03-04T20:00'],
+            ['AA1234', 'BUE', 'MAD', '2025-03-03T10:00', '2025-03-03T10:00'],
+            ['AA1234', 'BUE', 'MAD', '2025-03-03T10:00', '2025-03-04T11:00'],
+            ['AA1234', 'BUE', 'MAD', '2025-03-03T10:00', '2025-03-03T09:00'],
+            ['AA1234', 'BUE', 'XXX', '2025-03-03T10:00', '2025-03-03T20:00'],
+            ['A1234', 'BUE', 'MAD', '2025-03-03T10:00', '2025-03-03T20:00'],
+            ['AA1234', 'BUE', 'MAD', 'tomorrow', '2025-03-03T20:00'],
+        ]
+        path = tmp_path / 'timetable.ndjson'
+        path.write_text(
+            '\n'.join(json.dumps(dict(zip(FIELDS, row))) for row in rows) + '\n{"flight_number": "AA1234"}\n'
+        )
+
+        out = StringIO()
+        call_command('import_timetable', str(path), stdout=out)
+        output = out.getvalue()
+        assert 'Imported 2 flight events' in output
+        assert 'rejected 7' in output
+        for reason in [
+            'zero duration', 'duration over 24 hours', 'departure after arrival',
+            'unknown city', 'invalid flight number', 'invalid time', 'missing fields',
+        ]:
+            assert f'{reason}: 1' in output
+        assert Flight.objects.filter(number='BB5678').exists()
+
+    @pytest.mark.django_db
+    def test_import_invalidates_searches(self, basic_flight_data, tmp_path):
+        # bulk_create sends no signals, the import itself must invalidate the timetable and the cache.
+        assert get_journeys('2025-03-03', 'BUE', 'MAD', 12) == []
+
+        path = tmp_path / 'timetable.csv'
+        path.write_text(
+            ','.join(FIELDS) + '\nAA1234,BUE,MAD,2025-03-03T10:00,2025-03-03T20:00\n'
+        )
+        call_command('import_timetable', str(path), stdout=StringIO())
+        assert len(get_journeys('2025-03-03', 'BUE', 'MAD', 12)) == 1
+
+    @pytest.mark.django_db
+    def test_import_in_another_process(self, basic_flight_data, tmp_path, settings, monkeypatch):
+        # The command runs in a process of its own, with its own in-process cache and timetable.
+        settings.CACHES = {
+            **settings.CACHES,
+            'command': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'command'},
+        }
+        settings.JOURNEYS_TIMETABLE_CHECK_INTERVAL = 0
+        assert get_journeys('2025-03-03', 'BUE', 'MAD', 12) == []
+        graph = get_flight_graph()
+
+        path = tmp_path / 'timetable.csv'
+        path.write_text(
+            ','.join(FIELDS) + '\nAA1234,BUE,MAD,2025-03-03T10:00,2025-03-03T20:00\n'
+        )
+        settings.JOURNEYS_CACHE_ALIAS = 'command'
+        call_command('import_timetable', str(path), stdout=StringIO())
+        settings.JOURNEYS_CACHE_ALIAS = 'default'
+        monkeypatch.setattr(graph_module, '_graph', graph)
+
+        # The server still has its graph and its cached search, but sees the new rows in the database.
+        assert len(get_journeys('2025-03-03', 'BUE', 'MAD', 12)) == 1
+
+    @pytest.mark.django_db
+    def test_import_skips_byte_order_mark(self, basic_flight_data, tmp_path):
+        # Spreadsheets save CSVs with a BOM, which shouldn't end up in the first header.
+        path = tmp_path / 'timetable.csv'
+        path.write_text(
+            ','.join(FIELDS) + '\nAA1234,BUE,MAD,2025-03-03T10:00,2025-03-03T20:00\n', encoding='utf-8-sig'
+        )
+        out = StringIO()
+        call_command('import_timetable', str(path), stdout=out)
+        assert 'Imported 1 flight events' in out.getvalue()
+
+    @pytest.mark.django_db
+    def test_failed_import_invalidates_imported_chunks(self, basic_flight_data, monkeypatch):
+        # The chunks imported before a failing one stay committed: their searches must see them.
+        assert get_journeys('2025-03-03', 'BUE', 'MAD', 12) == []
+        rows = [
+            dict(zip(FIELDS, ['AA1234', 'BUE', 'MAD', '2025-03-03T10:00', '2025-03-03T20:00'])),
+            dict(zip(FIELDS, ['AA1234', 'MAD', 'BUE', '2025-03-04T10:00', '2025-03-04T20:00'])),
+        ]
+        importer = TimetableImporter(batch_size=1)
+        import_chunk = importer.import_chunk
+
+        def failing_import_chunk(chunk):
+            if importer.imported:
+                raise DatabaseError('Connection lost.')
+            import_chunk(chunk)
+
+        monkeypatch.setattr(importer, 'import_chunk', failing_import_chunk)
+        with pytest.raises(DatabaseError):
+            importer.run(rows)
+        assert FlightEvent.objects.count() == 1
+        assert len(get_journeys('2025-03-03', 'BUE', 'MAD', 12)) == 1
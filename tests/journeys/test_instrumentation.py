@@ -0,0 +1,77 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from apps.journeys.instrumentation import reset_histograms
+
+SEARCH = {'date': '2025-03-03', 'from': 'BUE', 'to': 'MAD'}
+
+
+@pytest.fixture
+def instrumentation(settings):
+    settings.JOURNEYS_INSTRUMENTATION = True
+    reset_histograms()
+    yield
+    reset_histograms()
+
+
+def server_timing(response):
+    return {
+        metric.split(';')[0]: metric
+        for metric in response['Server-Timing'].split(', ')
+    }
+
+
+class TestInstrumentation:
+    @pytest.mark.django_db
+    def test_disabled_by_default(self, client, fixture_data):
+        response = client.get(reverse('journey-search'), SEARCH)
+        assert response.status_code == 200
+        assert 'Server-Timing' not in response
+        # The metrics endpoint only returns the search counters.
+        assert list(client.get(reverse('journey-metrics')).json()) == ['searches']
+
+    @pytest.mark.django_db
+    def test_server_timing(self, client, fixture_data, instrumentation):
+        response = client.get(reverse('journey-search'), SEARCH)
+        journeys = response.json()
+        metrics = server_timing(response)
+        # The first search checks the database fingerprint (with the in-process cache), and loads the city
+        # registry and the in-memory timetable (its fingerprint, cities, events and schedules).
+        assert {'db', 'fetch', 'pairing', 'serialize', 'results', 'total'} <= set(metrics)
+        assert metrics['results'] == f'results;desc="{len(journeys)}"'
+        assert '"6 queries"' in metrics['db']
+
+        # The next one doesn't query the database (cities come from the registry).
+        metrics = server_timing(client.get(reverse('journey-search'), {**SEARCH, 'date': '2025-03-04'}))
+        assert '"0 queries"' in metrics['db']
+        assert 'fetch' not in metrics
+
+    @pytest.mark.django_db
+    def test_connections_engine_stages(self, client, fixture_data, instrumentation, settings):
+        call_command('rebuild_connections', verbosity=0)
+        settings.JOURNEYS_SEARCH_ENGINE = 'connections'
+        metrics = server_timing(client.get(reverse('journey-search'), SEARCH))
+        assert {'fetch', 'pairing', 'parse', 'serialize'} <= set(metrics)
+        # The database fingerprint, the city registry, the schedules (none, or the graph would search them),
+        # the direct flights and the connections.
+        assert '"5 queries"' in metrics['db']
+
+    @pytest.mark.django_db
+    def test_async_view(self, client, fixture_data, instrumentation):
+        response = client.get(reverse('journey-search-async'), SEARCH)
+        assert response.status_code == 200
+        assert server_timing(response)['results'] == f'results;desc="{len(response.json())}"'
+
+    @pytest.mark.django_db
+    def test_metrics_histograms(self, client, fixture_data, instrumentation):
+        for _ in range(3):
+            client.get(reverse('journey-search'), SEARCH)
+        client.get(reverse('journey-search'), {**SEARCH, 'from': 'XXX'})
+
+        histograms = client.get(reverse('journey-metrics')).json()['journey-search']
+        assert histograms['total_ms']['count'] == 4
+        assert sum(histograms['total_ms']['counts']) == 4
+        # Cached searches and invalid ones have no results.
+        assert histograms['results']['count'] == 1
+        assert histograms['queries']['buckets'][-1] == 'inf'
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apps.journeys import parallel
+from apps.journeys.calendar import get_calendar
+from apps.journeys.graph import get_flight_graph
+from apps.journeys.models import FlightEvent
+from apps.journeys.parallel import shutdown_executor, split
+
+QUERIES = [
+    {'date': date, 'from': from_city, 'to': to_city, 'max_wait_time_hours': 12, 'max_connections': max_connections}
+    for date in ['2025-03-04', '2025-03-05']
+    for from_city, to_city in [('BUE', 'MIL'), ('MVD', 'MIL'), ('SCL', 'BUE'), ('BUE', 'MAD')]
+    for max_connections in [2, 3]
+]
+
+
+@pytest.fixture
+def parallel_settings(settings, tmp_path):
+    settings.JOURNEYS_SNAPSHOT_PATH = str(tmp_path / 'timetable.snapshot')
+    settings.JOURNEYS_PARALLEL_WORKERS = 2
+    settings.JOURNEYS_PARALLEL_MIN_SEARCHES = 4
+    yield settings
+    shutdown_executor()
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    # Chunks run by the worker processes.
+    runs = []
+    run_parallel = parallel.run_parallel
+    monkeypatch.setattr(
+        parallel, 'run_parallel', lambda *args: runs.append(args[2]) or run_parallel(*args)
+    )
+    return runs
+
+
+class TestParallelSearch:
+    def test_split(self):
+        assert split([1, 2, 3, 4, 5], 2) == [[1, 2, 3], [4, 5]]
+        assert split([1, 2], 4) == [[1], [2]]
+        assert split(range(7), 3) == [range(0, 3), range(3, 5), range(5, 7)]
+
+    @pytest.mark.django_db
+    def test_batch_matches_in_process_search(self, fixture_data, parallel_settings, runs):
+        client = APIClient()
+        parallel_settings.JOURNEYS_CACHE_TIMEOUT = 0
+        parallel_settings.JOURNEYS_PARALLEL_WORKERS = 0
+        expected = client.post(reverse('journey-search-batch'), {'queries': QUERIES}, format='json').content
+
+        parallel_settings.JOURNEYS_PARALLEL_WORKERS = 2
+        response = client.post(reverse('journey-search-batch'), {'queries': QUERIES}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == expected
+        assert [len(chunk) for chunk in runs[-1]] == [8, 8]
+        # Small batches stay in-process.
+        client.post(reverse('journey-search-batch'), {'queries': QUERIES[:3]}, format='json')
+        assert len(runs) == 1
+
+    @pytest.mark.django_db
+    def test_only_cache_misses_are_searched(self, fixture_data, parallel_settings, runs):
+        client = APIClient()
+        for query in QUERIES[:6]:
+            client.get(reverse('journey-search'), query)
+        client.post(reverse('journey-search-batch'), {'queries': QUERIES}, format='json')
+        assert sum(len(chunk) for chunk in runs[-1]) == len(QUERIES) - 6
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('max_connections', [2, 3])
+    def test_calendar_matches_in_process_search(self, fixture_data, parallel_settings, runs, max_connections):
+        parallel_settings.JOURNEYS_CACHE_TIMEOUT = 0
+        arguments = ('2025-03-04', 'BUE', 'MIL', 3, 12, max_connections)
+        parallel_settings.JOURNEYS_PARALLEL_WORKERS = 0
+        expected = get_calendar(*arguments)
+        parallel_settings.JOURNEYS_PARALLEL_WORKERS = 2
+        assert get_calendar(*arguments) == expected
+        assert any(day['journeys'] for day in expected)
+        assert len(runs) == 1
+
+    @pytest.mark.django_db
+    def test_outdated_snapshot_falls_back_to_in_process(self, fixture_data, parallel_settings, runs):
+        parallel_settings.JOURNEYS_CACHE_TIMEOUT = 0
+        graph = get_flight_graph()
+        # The workers map the snapshot of the new timetable, the graph is the old one.
+        flight_event = FlightEvent.objects.first()
+        flight_event.arrival_time += timedelta(minutes=5)
+        flight_event.save()
+        get_flight_graph()
+        arguments = ('BUE', 'MIL', [1741046400 + day * 86400 for day in range(8)], 12 * 3600, 2)
+        assert parallel.parallel_calendar(graph, *arguments) is None
+        assert len(runs) == 1
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from itertools import product
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from apps.journeys.graph import get_flight_graph
+from apps.journeys.models import City, FlightEvent
+from apps.journeys.reachability import get_reachable
+from apps.journeys.registry import get_city_registry
+from apps.journeys.utils import get_journeys
+
+
+class TestReachability:
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('max_connections', [1, 2, 3])
+    def test_matches_searches_by_destination(self, fixture_data, max_connections):
+        # Reference: one search per destination, keeping the journey arriving first.
+        codes = list(City.objects.values_list('code', flat=True))
+        for date, from_city, max_wait in product(['2025-03-04', '2025-03-05'], codes, [4, 12]):
+            expected = {}
+            for to_city in codes:
+                if to_city != from_city:
+                    journeys = get_journeys(date, from_city, to_city, max_wait, max_connections, sort='arrival', limit=1)
+                    if journeys:
+                        expected[to_city] = journeys[0]
+            reachable = get_reachable(date, from_city, max_wait, max_connections)
+            assert {city['to']: city['journey'] for city in reachable} == expected
+            for city in reachable:
+                assert city['legs'] == len(city['journey']['path'])
+                assert city['arrival_time'] == city['journey']['path'][-1]['arrival_time']
+            assert reachable == sorted(reachable, key=lambda city: (city['arrival_time'], city['to']))
+
+    @pytest.mark.django_db
+    def test_single_sweep(self, fixture_data, monkeypatch):
+        graph = get_flight_graph()
+        calls = []
+        departures = graph.departures
+        monkeypatch.setattr(graph, 'departures', lambda *args: calls.append(args) or departures(*args))
+        get_reachable('2025-03-05', 'BUE', 12, 2)
+        # The first flights are only looked up once.
+        assert len([call for call in calls if call[0] == graph.code_index['BUE']]) == 1
+
+    @pytest.mark.django_db
+    def test_earlier_arrivals_dont_dominate(self, basic_flight_data):
+        # OOO -> XAA -> YYY arrives earlier than OOO -> XBB -> YYY, but too early for the only flight
+        # to DDD within the max. wait: DDD is still reachable through XBB.
+        country = basic_flight_data['country_1']
+        cities = {
+            code: City.objects.create(code=code, name=code, country=country)
+            for code in ['OOO', 'XAA', 'XBB', 'YYY', 'DDD']
+        }
+        legs = [
+            ('OOO', 'XAA', 8, 9),
+            ('XAA', 'YYY', 9.5, 10),
+            ('OOO', 'XBB', 7, 8),
+            ('XBB', 'YYY', 11, 13),
+            ('YYY', 'DDD', 16, 17),
+        ]
+        for from_city, to_city, departure, arrival in legs:
+            FlightEvent.objects.create(
+                flight=basic_flight_data['flight'],
+                departure_time=timezone.make_aware(datetime(2025, 3, 3) + timedelta(hours=departure)),
+                arrival_time=timezone.make_aware(datetime(2025, 3, 3) + timedelta(hours=arrival)),
+                departure_city=cities[from_city],
+                arrival_city=cities[to_city]
+            )
+        reachable = {city['to']: city for city in get_reachable('2025-03-03', 'OOO', 4, 3)}
+        assert list(reachable) == ['XBB', 'XAA', 'YYY', 'DDD']
+        assert [leg['to'] for leg in reachable['DDD']['journey']['path']] == ['XBB', 'YYY', 'DDD']
+
+
+class TestJourneyReachableAPIView:
+    @pytest.mark.django_db
+    def test_get_reachable(self, client, fixture_data):
+        get_city_registry()
+        get_flight_graph()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('journey-search-reachable'), {'date': '2025-03-05', 'from': 'bue'})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(queries) == 0
+        reachable = response.json()
+        assert reachable
+        for city in reachable:
+            journey = client.get(
+                reverse('journey-search'),
+                {'date': '2025-03-05', 'from': 'BUE', 'to': city['to'], 'sort': 'arrival', 'limit': 1},
+            ).json()[0]
+            assert city['journey'] == journey
+
+    @pytest.mark.django_db
+    def test_get_reachable_validation(self, client, fixture_data):
+        url = reverse('journey-search-reachable')
+        for query in [
+            {'date': '2025-03-05'},
+            {'date': '2025-03-05', 'from': 'XYZ'},
+            {'date': '05-03-2025', 'from': 'BUE'},
+            {'date': '2025-03-05', 'from': 'BUE', 'max_connections': '9'},
+        ]:
+            response = client.get(url, query)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert 'error' in response.json()
@@ -0,0 +1,50 @@
+import pytest
+from django.core.exceptions import ValidationError
+
+from apps.journeys.cache import bump_versions
+from apps.journeys.models import City, Country
+from apps.journeys.registry import CITIES_SCOPE, get_city_registry
+from apps.journeys.validators import validate_city
+
+
+class TestCityRegistry:
+    @pytest.mark.django_db
+    def test_validation_without_queries(self, basic_flight_data, django_assert_num_queries):
+        # Once loaded, validating cities shouldn't hit the database.
+        get_city_registry()
+        with django_assert_num_queries(0):
+            validate_city('bue')
+            validate_city('MAD')
+            with pytest.raises(ValidationError, match='City with code "XYZ" does not exist.'):
+                validate_city('xyz')
+
+    @pytest.mark.django_db
+    def test_registry_maps_codes_to_ids_and_countries(self, basic_flight_data):
+        city = get_city_registry().get('MAD')
+        assert city.id == basic_flight_data['city_2'].id
+        assert city.country_code == 'ES'
+
+    @pytest.mark.django_db
+    def test_refreshed_on_city_and_country_changes(self, basic_flight_data):
+        get_city_registry()
+        City.objects.create(code='ROM', name='Rome', country=basic_flight_data['country_2'])
+        validate_city('ROM')
+
+        basic_flight_data['city_1'].delete()
+        with pytest.raises(ValidationError):
+            validate_city('BUE')
+
+        country = basic_flight_data['country_2']
+        country.code = 'FR'
+        country.save()
+        assert get_city_registry().get('MAD').country_code == 'FR'
+
+    @pytest.mark.django_db
+    def test_refreshed_when_changed_by_another_process(self, basic_flight_data):
+        # Another worker only bumps the shared version: the registry should be reloaded anyway.
+        registry = get_city_registry()
+        Country.objects.bulk_create([Country(code='IT', name='Italy')])
+        City.objects.bulk_create([City(code='ROM', name='Rome', country=Country.objects.get(code='IT'))])
+        assert get_city_registry() is registry
+        bump_versions([CITIES_SCOPE])
+        assert 'ROM' in get_city_registry()
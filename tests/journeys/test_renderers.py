@@ -0,0 +1,89 @@
+from itertools import product
+from time import perf_counter
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from apps.journeys import renderers
+from apps.journeys.graph import get_flight_graph
+from apps.journeys.models import City
+from apps.journeys.serializers import Journeys
+from apps.journeys.utils import get_journeys
+
+
+def drf_render(journeys):
+    # Reference: the serializer + renderer path used by the view.
+    return JSONRenderer().render(Journeys(journeys, many=True).data)
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(renderers, 'orjson', None)
+    return request.param
+
+
+@pytest.fixture
+def all_journeys(fixture_data):
+    codes = list(City.objects.values_list('code', flat=True))
+    return [
+        journeys
+        for date, from_city, to_city in product(['2025-03-03', '2025-03-04', '2025-03-05'], codes, codes)
+        if from_city != to_city
+        for journeys in [get_journeys(date, from_city, to_city, 12, max_connections=3)]
+        if journeys
+    ]
+
+
+class TestRenderJourneys:
+    @pytest.mark.django_db
+    def test_same_bytes_as_serializer(self, encoder, all_journeys):
+        # The fast path should render byte-for-byte the same JSON as the DRF serializer.
+        for journeys in all_journeys:
+            assert renderers.render_journeys(journeys) == drf_render(journeys)
+        assert renderers.render_journeys([]) == drf_render([])
+
+    @pytest.mark.django_db
+    def test_graph_render_same_bytes_as_serializer(self, encoder, fixture_data):
+        graph = get_flight_graph()
+        codes = list(City.objects.values_list('code', flat=True))
+        for from_city, to_city in product(codes, codes):
+            journeys = graph.search(from_city, to_city, 0, 2 ** 40, 12 * 3600, 3)
+            assert graph.render(journeys) == drf_render(graph.parse(journeys))
+
+    @pytest.mark.django_db
+    def test_compact_journeys_deduplicate_legs(self, all_journeys):
+        journeys = [journey for search_journeys in all_journeys for journey in search_journeys]
+        compact = renderers.compact_journeys(journeys)
+        legs = list(zip(*compact['legs'].values()))
+        # Legs shared by several journeys are only sent once.
+        assert len(legs) == len(set(legs)) < sum(len(journey['path']) for journey in journeys)
+        fields = ['flight_number', '_from', 'to', 'departure_time', 'arrival_time']
+        assert [[legs[index] for index in journey] for journey in compact['journeys']] == [
+            [tuple(leg[field] for field in fields) for leg in journey['path']] for journey in journeys
+        ]
+
+    @pytest.mark.django_db
+    def test_view_same_bytes_as_serializer(self, client, fixture_data):
+        response = client.get('/journeys/search', {'date': '2025-03-05', 'from': 'BUE', 'to': 'MIL'})
+        assert response['Content-Type'] == 'application/json'
+        assert response.content == drf_render(get_journeys('2025-03-05', 'BUE', 'MIL', 4))
+
+    @pytest.mark.django_db
+    def test_faster_than_serializer(self, encoder, all_journeys):
+        # Rendering 1k journeys through the fast path should beat the DRF serializer (by far).
+        journeys = [journey for group in all_journeys for journey in group]
+        journeys = (journeys * (1000 // len(journeys) + 1))[:1000]
+
+        start = perf_counter()
+        expected = drf_render(journeys)
+        drf_time = perf_counter() - start
+
+        start = perf_counter()
+        rendered = renderers.render_journeys(journeys)
+        fast_time = perf_counter() - start
+
+        assert rendered == expected
+        assert fast_time < drf_time
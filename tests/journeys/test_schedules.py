@@ -0,0 +1,163 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.journeys.calendar import get_calendar
+from apps.journeys.graph import FlightGraph, get_flight_graph
+from apps.journeys.models import City, Flight, FlightEvent, Schedule
+from apps.journeys.utils import get_journeys
+
+
+@pytest.fixture
+def schedule(basic_flight_data):
+    # BUE -> MAD at 10:00 on Mondays, Wednesdays and Fridays of March 2025 (the 3rd is a Monday).
+    return Schedule.objects.create(
+        flight=basic_flight_data['flight'],
+        departure_city=basic_flight_data['city_1'],
+        arrival_city=basic_flight_data['city_2'],
+        departure_time=time(10, 0),
+        duration=timedelta(hours=4),
+        weekdays='135',
+        valid_from=date(2025, 3, 1),
+        valid_until=date(2025, 3, 31),
+    )
+
+
+def legs(journeys):
+    return [
+        [(leg['flight_number'], leg['departure_time'], leg['arrival_time']) for leg in journey['path']]
+        for journey in journeys
+    ]
+
+
+class TestSchedule:
+    def test_validation(self, basic_flight_data):
+        schedule = Schedule(
+            flight=basic_flight_data['flight'],
+            departure_city=basic_flight_data['city_1'],
+            arrival_city=basic_flight_data['city_2'],
+            departure_time=time(10, 0),
+            duration=timedelta(hours=25),
+            weekdays='135',
+            valid_from=date(2025, 3, 1),
+            valid_until=date(2025, 3, 31),
+        )
+        with pytest.raises(ValidationError, match='cannot exceed 24 hours'):
+            schedule.full_clean()
+        schedule.duration = timedelta(hours=4)
+        schedule.weekdays = '08'
+        with pytest.raises(ValidationError):
+            schedule.full_clean()
+        schedule.weekdays = '135'
+        schedule.valid_until = date(2025, 2, 1)
+        with pytest.raises(ValidationError, match='Valid from cannot be later'):
+            schedule.full_clean()
+
+    @pytest.mark.django_db
+    def test_search_expands_schedules(self, schedule):
+        assert legs(get_journeys('2025-03-05', 'BUE', 'MAD', 4)) == [
+            [('AA1234', '2025-03-05 10:00', '2025-03-05 14:00')]
+        ]
+        # Not on Tuesdays, nor out of its validity range.
+        assert get_journeys('2025-03-04', 'BUE', 'MAD', 4) == []
+        assert get_journeys('2025-04-02', 'BUE', 'MAD', 4) == []
+        # A single row, whatever the number of days.
+        assert Schedule.objects.count() == 1
+        assert FlightEvent.objects.count() == 0
+
+    @pytest.mark.django_db
+    def test_flight_events_override_schedules(self, schedule, basic_flight_data):
+        assert len(get_journeys('2025-03-07', 'BUE', 'MAD', 4)) == 1
+        # Delayed on the 7th: the event replaces the scheduled flight on that day only.
+        FlightEvent.objects.create(
+            flight=basic_flight_data['flight'],
+            departure_time=timezone.make_aware(datetime(2025, 3, 7, 12, 0)),
+            arrival_time=timezone.make_aware(datetime(2025, 3, 7, 16, 0)),
+            departure_city=basic_flight_data['city_1'],
+            arrival_city=basic_flight_data['city_2'],
+        )
+        assert legs(get_journeys('2025-03-07', 'BUE', 'MAD', 4)) == [
+            [('AA1234', '2025-03-07 12:00', '2025-03-07 16:00')]
+        ]
+        assert legs(get_journeys('2025-03-05', 'BUE', 'MAD', 4)) == [
+            [('AA1234', '2025-03-05 10:00', '2025-03-05 14:00')]
+        ]
+
+    @pytest.mark.django_db
+    def test_connections_with_events(self, schedule, basic_flight_data):
+        city = City.objects.create(code='ROM', name='Rome', country=basic_flight_data['country_2'])
+        FlightEvent.objects.create(
+            flight=Flight.objects.create(number='BB1234'),
+            departure_time=timezone.make_aware(datetime(2025, 3, 3, 16, 0)),
+            arrival_time=timezone.make_aware(datetime(2025, 3, 3, 18, 0)),
+            departure_city=basic_flight_data['city_2'],
+            arrival_city=city,
+        )
+        assert legs(get_journeys('2025-03-03', 'BUE', 'ROM', 4)) == [
+            [('AA1234', '2025-03-03 10:00', '2025-03-03 14:00'), ('BB1234', '2025-03-03 16:00', '2025-03-03 18:00')]
+        ]
+        assert get_journeys('2025-03-03', 'BUE', 'ROM', 1) == []
+
+    @pytest.mark.django_db
+    def test_connections_engine(self, schedule, basic_flight_data, settings, client):
+        # The connections table doesn't include the schedules, so their searches should run on the graph.
+        FlightEvent.objects.create(
+            flight=Flight.objects.create(number='BB1234'),
+            departure_time=timezone.make_aware(datetime(2025, 3, 3, 16, 0)),
+            arrival_time=timezone.make_aware(datetime(2025, 3, 3, 18, 0)),
+            departure_city=basic_flight_data['city_2'],
+            arrival_city=basic_flight_data['city_1'],
+        )
+        expected = get_journeys('2025-03-03', 'BUE', 'BUE', 4)
+        assert len(expected) == 1
+        settings.JOURNEYS_SEARCH_ENGINE = 'connections'
+        call_command('rebuild_connections', verbosity=0)
+        assert get_journeys('2025-03-03', 'BUE', 'BUE', 4) == expected
+        response = client.post(
+            reverse('journey-search-batch'),
+            {'queries': [{'date': '2025-03-03', 'from': 'BUE', 'to': 'BUE'}]},
+            content_type='application/json',
+        )
+        assert legs(response.json()[0]['journeys']) == legs(expected)
+
+    @pytest.mark.django_db
+    def test_changes_invalidate_searches(self, schedule):
+        assert len(get_journeys('2025-03-04', 'BUE', 'MAD', 4)) == 0
+        schedule.weekdays = '1234567'
+        schedule.save()
+        assert len(get_journeys('2025-03-04', 'BUE', 'MAD', 4)) == 1
+        schedule.delete()
+        assert len(get_journeys('2025-03-04', 'BUE', 'MAD', 4)) == 0
+
+    @pytest.mark.django_db
+    def test_calendar(self, schedule):
+        calendar = get_calendar('2025-03-04', 'BUE', 'MAD', window=3)
+        # From Saturday the 1st to Friday the 7th.
+        assert [day['journeys'] for day in calendar] == [0, 0, 1, 0, 1, 0, 1]
+        assert calendar[2]['duration_minutes'] == 240
+
+    @pytest.mark.django_db
+    def test_expanded_graphs_are_reused(self, schedule):
+        graph = get_flight_graph()
+        start = int(timezone.make_aware(datetime(2025, 3, 3)).timestamp())
+        expanded = graph.expand_schedules(start, start + 3 * 86400)
+        # Monday and Wednesday.
+        assert len(expanded) == 2
+        assert graph.expand_schedules(start + 3600, start + 3 * 86400 - 60) is expanded
+        assert expanded.expand_schedules(start, start + 86400) is expanded
+
+    @pytest.mark.django_db
+    def test_snapshot_keeps_schedules(self, schedule, tmp_path):
+        path = str(tmp_path / 'timetable.snapshot')
+        graph = FlightGraph.from_queryset()
+        graph.save_snapshot(path)
+        snapshot = FlightGraph.from_snapshot(path)
+        assert snapshot.schedules == graph.schedules
+        start = int(timezone.make_aware(datetime(2025, 3, 3)).timestamp())
+        arguments = ('BUE', 'MAD', start, start + 7 * 86400, 4 * 3600)
+        journeys = snapshot.expand_schedules(start, start + 8 * 86400).search(*arguments)
+        assert len(journeys) == 3
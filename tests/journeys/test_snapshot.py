@@ -0,0 +1,155 @@
+from itertools import product
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+
+from apps.journeys import graph as graph_module
+from apps.journeys.cache import bump_versions
+from apps.journeys.checks import check_shared_cache
+from apps.journeys.graph import TIMETABLE_SCOPE, FlightGraph, get_flight_graph
+from apps.journeys.models import City, FlightEvent
+from apps.journeys.snapshot import read_snapshot_version, write_snapshot
+
+
+@pytest.fixture
+def snapshot_path(settings, tmp_path):
+    settings.JOURNEYS_SNAPSHOT_PATH = str(tmp_path / 'timetable.snapshot')
+    return settings.JOURNEYS_SNAPSHOT_PATH
+
+
+def restart_worker(monkeypatch):
+    # What a new worker process starts with: no graph and no version lookup yet.
+    monkeypatch.setattr(graph_module, '_graph', None)
+    monkeypatch.setattr(graph_module, '_version_checked', False)
+
+
+class TestSnapshot:
+    @pytest.mark.django_db
+    def test_snapshot_matches_database_graph(self, fixture_data, tmp_path):
+        path = str(tmp_path / 'timetable.snapshot')
+        graph = FlightGraph.from_queryset()
+        write_snapshot(graph, path, 42)
+
+        snapshot = FlightGraph.from_snapshot(path)
+        assert snapshot.version == read_snapshot_version(path) == 42
+        assert snapshot.city_codes == graph.city_codes
+        assert snapshot.event_ids.readonly
+        codes = list(City.objects.values_list('code', flat=True))
+        for day, from_city, to_city in product([1741046400, 1741132800], codes, codes):
+            args = (from_city, to_city, day, day + 86400, 12 * 3600, 3)
+            assert snapshot.search(*args) == graph.search(*args)
+            assert snapshot.render(snapshot.search(*args)) == graph.render(graph.search(*args))
+
+    @pytest.mark.django_db
+    def test_empty_snapshot(self, db, tmp_path):
+        path = str(tmp_path / 'timetable.snapshot')
+        write_snapshot(FlightGraph.from_queryset(), path, 1)
+        snapshot = FlightGraph.from_snapshot(path)
+        assert len(snapshot) == 0
+        assert snapshot.search('BUE', 'MAD', 0, 86400, 3600) == []
+
+    def test_invalid_snapshot(self, tmp_path):
+        path = tmp_path / 'timetable.snapshot'
+        path.write_bytes(b'not a snapshot')
+        assert read_snapshot_version(str(path)) is None
+        with pytest.raises(ValueError):
+            FlightGraph.from_snapshot(str(path))
+
+    @pytest.mark.django_db
+    def test_workers_start_from_snapshot(self, fixture_data, snapshot_path, monkeypatch, django_assert_num_queries):
+        # The first load saves the snapshot, at the current timetable version.
+        graph = get_flight_graph()
+        assert read_snapshot_version(snapshot_path) == graph.version
+
+        # A new worker sharing the cache maps it without querying the timetable.
+        restart_worker(monkeypatch)
+        with django_assert_num_queries(0):
+            restarted = get_flight_graph()
+        assert restarted is not graph
+        assert isinstance(restarted.event_ids, memoryview)
+        assert restarted.version == graph.version
+
+        # So does a new worker with its own (empty) in-process cache, once it checked the snapshot has the
+        # fingerprint of the database.
+        restart_worker(monkeypatch)
+        cache.clear()
+        with django_assert_num_queries(1):
+            assert get_flight_graph().version == graph.version
+
+    @pytest.mark.django_db
+    def test_outdated_snapshot_is_not_used(self, fixture_data, snapshot_path, monkeypatch):
+        graph = get_flight_graph()
+        # Events added by another process, without signals (e.g. a bulk import with its own cache).
+        event = FlightEvent.objects.first()
+        event.pk = None
+        FlightEvent.objects.bulk_create([event])
+
+        restart_worker(monkeypatch)
+        cache.clear()
+        restarted = get_flight_graph()
+        assert len(restarted) == len(graph) + 1
+        assert not isinstance(restarted.event_ids, memoryview)
+        assert read_snapshot_version(snapshot_path) == restarted.version
+
+    @pytest.mark.django_db
+    def test_changes_remove_the_snapshot(self, fixture_data, snapshot_path, monkeypatch):
+        # Changes to existing rows don't change the fingerprint: a new worker mustn't start from the snapshot.
+        graph = get_flight_graph()
+        city = City.objects.get(code='MAD')
+        city.code = 'MAX'
+        city.save()
+        assert read_snapshot_version(snapshot_path) is None
+
+        restart_worker(monkeypatch)
+        cache.clear()
+        assert 'MAX' in get_flight_graph().city_codes
+        assert read_snapshot_version(snapshot_path) != graph.version
+
+    @pytest.mark.django_db
+    def test_timetable_change_in_another_process(self, fixture_data, settings):
+        # Rows added by a process that doesn't share the cache are seen by the next check.
+        settings.JOURNEYS_TIMETABLE_CHECK_INTERVAL = 3600
+        graph = get_flight_graph()
+        event = FlightEvent.objects.first()
+        event.pk = None
+        FlightEvent.objects.bulk_create([event])
+        assert get_flight_graph() is graph
+
+        settings.JOURNEYS_TIMETABLE_CHECK_INTERVAL = 0
+        reloaded = get_flight_graph()
+        assert len(reloaded) == len(graph) + 1
+        assert get_flight_graph() is reloaded
+
+    @pytest.mark.django_db
+    def test_timetable_change_in_another_worker(self, fixture_data, snapshot_path):
+        graph = get_flight_graph()
+        assert get_flight_graph() is graph
+
+        # Another worker changed the timetable: this one reloads it, and saves the new snapshot.
+        bump_versions([TIMETABLE_SCOPE])
+        reloaded = get_flight_graph()
+        assert reloaded is not graph
+        assert reloaded.version != graph.version
+        assert read_snapshot_version(snapshot_path) == reloaded.version
+
+    @pytest.mark.django_db
+    def test_build_timetable_snapshot_command(self, fixture_data, snapshot_path, monkeypatch):
+        graph = get_flight_graph()
+        out = StringIO()
+        call_command('build_timetable_snapshot', stdout=out)
+        assert f'Saved a snapshot of {len(graph)} flight events' in out.getvalue()
+
+        # Running workers sharing the cache switch to the new snapshot.
+        version = read_snapshot_version(snapshot_path)
+        assert version != graph.version
+        assert get_flight_graph().version == version
+        assert isinstance(get_flight_graph().event_ids, memoryview)
+
+    def test_warns_about_caches_not_shared_between_processes(self, settings):
+        # Even with a single worker, as the management commands run in processes of their own.
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        assert [warning.id for warning in check_shared_cache(None)] == ['journeys.W001']
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        assert check_shared_cache(None) == []
@@ -1,6 +1,9 @@
+import json
 from datetime import datetime
 
 import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APIClient
@@ -107,6 +110,21 @@ class TestJourneyAPIView:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert 'error' in response.json()
 
+    @pytest.mark.django_db
+    def test_get_journeys_at_the_date_limits(self, client, setup_data):
+        # The days around the first and last dates can't be searched: a 400, not an overflow.
+        url = reverse('journey-search')
+        for date in ['0001-01-01', '9999-12-31']:
+            for view in ['journey-search', 'journey-search-async']:
+                response = client.get(reverse(view), {'date': date, 'from': 'BUE', 'to': 'MAD'})
+                assert response.status_code == status.HTTP_400_BAD_REQUEST
+                assert response.json() == {'error': 'Invalid date. Should be between 0001-01-02 and 9999-12-29.'}
+        for date in ['0001-01-02', '9999-12-29']:
+            for anchor in ['departure', 'arrival']:
+                response = client.get(url, {'date': date, 'from': 'BUE', 'to': 'MAD', 'anchor': anchor})
+                assert response.status_code == status.HTTP_200_OK
+                assert response.json() == []
+
     @pytest.mark.django_db
     def test_get_journeys_with_invalid_city(self, client, setup_data):
         # Should return a 400 error if any city is invalid.
@@ -144,3 +162,153 @@ class TestJourneyAPIView:
         }
         response = client.get(url, params)
         assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.django_db
+    def test_get_journeys_with_invalid_max_wait_time(self, client, setup_data):
+        # Should return a 400 error (and not overflow) if max_wait_time_hours is out of range.
+        url = reverse('journey-search')
+        for max_wait_time_hours in ['abc', '-1', '25', '10000000000']:
+            params = {
+                'date': '2025-03-03',
+                'from': 'BUE',
+                'to': 'MAD',
+                'max_wait_time_hours': max_wait_time_hours
+            }
+            response = client.get(url, params)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert 'error' in response.json()
+
+    @pytest.mark.django_db
+    def test_get_journeys_with_invalid_max_connections(self, client, setup_data):
+        # Should return a 400 error if max_connections is not a valid number of flights.
+        url = reverse('journey-search')
+        for max_connections in ['abc', '-1', '0', '99']:
+            params = {
+                'date': '2025-03-03',
+                'from': 'BUE',
+                'to': 'MAD',
+                'max_connections': max_connections
+            }
+            response = client.get(url, params)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert 'error' in response.json()
+
+    @pytest.mark.django_db
+    def test_get_journeys_with_time_filters(self, client, setup_data):
+        # Should validate the time filters, and only return the journeys within them.
+        url = reverse('journey-search')
+        params = {'date': '2025-03-03', 'from': 'BUE', 'to': 'MAD'}
+        for name in ['depart_after', 'depart_before', 'arrive_by']:
+            response = client.get(url, {**params, name: '25:00'})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert name in response.json()['error']
+        response = client.get(url, {**params, 'anchor': 'landing'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'anchor' in response.json()['error']
+
+        journeys = client.get(url, params).json()
+        assert journeys
+        departure = journeys[0]['path'][0]['departure_time']
+        arrival = journeys[0]['path'][-1]['arrival_time']
+        assert client.get(url, {**params, 'depart_after': departure[11:]}).json() == journeys
+        assert client.get(url, {**params, 'depart_before': departure[11:]}).json() == []
+        assert client.get(url, {**params, 'arrive_by': arrival}).json() == journeys
+        assert client.get(url, {**params, 'arrive_by': '2025-03-03 00:00'}).json() == []
+
+    def test_get_journeys_sorted_and_limited(self, client, setup_data):
+        # Should validate the sort and limit, and return the first journeys in that order.
+        url = reverse('journey-search')
+        params = {'date': '2025-03-03', 'from': 'BUE', 'to': 'MAD'}
+        for name, value in [('sort', 'price'), ('limit', '0'), ('limit', 'all'), ('limit', '99999999999999999999999')]:
+            response = client.get(url, {**params, name: value})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert name in response.json()['error']
+
+        journeys = client.get(url, {**params, 'sort': 'arrival'}).json()
+        assert journeys
+        arrivals = [journey['path'][-1]['arrival_time'] for journey in journeys]
+        assert arrivals == sorted(arrivals)
+        assert client.get(url, {**params, 'sort': 'arrival', 'limit': 1}).json() == journeys[:1]
+
+
+class TestFlightEventListing:
+    @pytest.fixture
+    def client(self):
+        return APIClient()
+
+    @pytest.fixture
+    def flight_events(self, basic_flight_data):
+        # Five events, two of them departing at the same time to exercise the (departure_time, id) order.
+        hours = [12, 10, 10, 8, 14]
+        return [
+            FlightEvent.objects.create(
+                flight=basic_flight_data['flight'],
+                departure_time=timezone.make_aware(datetime(2025, 3, 3, hour, 0, 0)),
+                arrival_time=timezone.make_aware(datetime(2025, 3, 3, hour + 4, 0, 0)),
+                departure_city=basic_flight_data['city_1'],
+                arrival_city=basic_flight_data['city_2']
+            )
+            for hour in hours
+        ]
+
+    @staticmethod
+    def expected(flight_events):
+        flight_events = sorted(flight_events, key=lambda event: (event.departure_time, event.id))
+        return FlightEventModelSerializer(flight_events, many=True).data
+
+    @pytest.mark.django_db
+    def test_cursor_pagination(self, client, flight_events):
+        # Should walk through all the events, ordered by departure time, following the next links.
+        url = reverse('journey-search')
+        response = client.get(url, {'page_size': 2})
+        results = []
+        pages = 0
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            data = response.json()
+            results += data['results']
+            pages += 1
+            if not data['next']:
+                break
+            response = client.get(data['next'])
+        assert pages == 3
+        assert results == self.expected(flight_events)
+
+    @pytest.mark.django_db
+    def test_invalid_cursor(self, client, flight_events):
+        url = reverse('journey-search')
+        for params in [{'cursor': 'invalid'}, {'page_size': 0}, {'page_size': 'abc'}]:
+            response = client.get(url, params)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert 'error' in response.json()
+
+    @pytest.mark.django_db
+    def test_ndjson_stream(self, client, flight_events):
+        # Should stream one JSON event per line, ordered by departure time.
+        url = reverse('journey-search')
+        response = client.get(url, {'format': 'ndjson'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert response.streaming
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        assert [json.loads(line) for line in lines] == self.expected(flight_events)
+
+    @pytest.mark.django_db
+    def test_ndjson_stream_asgi(self, flight_events):
+        # Under ASGI, the events should be streamed by an async iterator (a sync one is buffered whole).
+        async def stream():
+            response = await AsyncClient().get(reverse('journey-search'), {'format': 'ndjson'})
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        response, content = async_to_sync(stream)()
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert response.is_async
+        assert [json.loads(line) for line in content.decode().splitlines()] == self.expected(flight_events)
+
+    @pytest.mark.django_db
+    def test_listing_queries_do_not_grow_with_events(self, client, flight_events, django_assert_max_num_queries):
+        # Related flights and cities should be fetched with the events, not once per event.
+        url = reverse('journey-search')
+        with django_assert_max_num_queries(1):
+            client.get(url)